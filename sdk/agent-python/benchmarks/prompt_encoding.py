@@ -0,0 +1,47 @@
+"""Benchmark packing and encoding a large namespace.
+
+Run with ``python benchmarks/prompt_encoding.py [entries] [rounds]``.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+
+from codex_agent_protocol import (
+    InMemoryContextStore,
+    PromptPackOptions,
+    encode_prompt_package,
+    pack_prompt,
+)
+
+
+def _measure(store: InMemoryContextStore, rounds: int, pre_encode: bool) -> float:
+    options = PromptPackOptions(namespace="session", pre_encode=pre_encode)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        package = pack_prompt(store, options)
+        if pre_encode:
+            encode_prompt_package(package)
+        else:
+            json.dumps(package.__dict__)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def main(entries: int = 5000, rounds: int = 20) -> None:
+    store = InMemoryContextStore()
+    for index in range(entries):
+        store.set(
+            "session",
+            f"file:{index}",
+            {"path": f"src/module_{index}.py", "lines": ["x = 1"] * 20, "score": index / 7},
+        )
+    _measure(store, 1, pre_encode=True)
+    baseline = _measure(store, rounds, pre_encode=False)
+    cached = _measure(store, rounds, pre_encode=True)
+    print(f"{entries} entries: json.dumps {baseline:.2f} ms, pre-encoded {cached:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -3,12 +3,18 @@
 from .types import (
     AgentDefinition,
     AgentId,
+    AgentRegistryChange,
     AgentRegistryEntry,
     AgentRuntimeState,
     AgentStatus,
+    AuthorizationPlan,
+    AuthorizationToken,
     Capability,
+    CapabilityMask,
     CodexCommand,
     CodexResult,
+    ContextChange,
+    ContextDelta,
     ContextSnapshot,
     ContextStoreProtocol,
     IntegrationAdapter,
@@ -18,41 +24,80 @@ from .types import (
     PromptPackage,
     SecurityDescriptor,
     SessionRecord,
+    Span,
+    SpanContext,
     TelemetryEvent,
     TelemetrySink,
     WorkflowContext,
     WorkflowExecutionOptions,
     WorkflowNodeDefinition,
+    WorkflowNodeTiming,
     WorkflowRunSummary,
     WorkflowTaskHandler,
 )
-from .agent_registry import AgentRegistry
+from .agent_registry import AgentRegistry, LivenessChecker
+from .pool import AgentPool, AgentPoolOptions
+from .blobs import BlobRef, BlobStore
 from .process import CodexClient, CodexClientOptions, ProcessSupervisor
 from .messaging import MessageBus, SessionStore
-from .context import InMemoryContextStore, PromptPackOptions, pack_prompt
+from .context import (
+    ContextWatch,
+    ContextWatchIterator,
+    InMemoryContextStore,
+    PromptPackOptions,
+    encode_prompt_package,
+    estimate_tokens,
+    pack_prompt,
+)
+from .metrics import Counter, Gauge, Histogram, MetricsRegistry
+from .persistence import SqliteContextStore
 from .telemetry import Telemetry, TelemetryOptions
+from .tracing import OtlpJsonFileSink, Tracer, current_span_context
 from .security import SecurityGuard
-from .integration import IntegrationHost
-from .workflow import WorkflowEngine
+from .integration import IntegrationHost, IntegrationPolicy
+from .workflow import WorkflowEngine, WorkflowStream
+from .profiling import chrome_trace, write_chrome_trace
+from .distributed import DistributedWorkerOptions, DistributedWorkflowEngine, SqliteTaskQueue
 
 __all__ = [
     "AgentDefinition",
     "AgentId",
+    "AgentPool",
+    "AgentPoolOptions",
+    "AgentRegistryChange",
     "AgentRegistryEntry",
     "AgentRegistry",
     "AgentRuntimeState",
     "AgentStatus",
+    "BlobRef",
+    "BlobStore",
+    "AuthorizationPlan",
+    "AuthorizationToken",
     "Capability",
+    "CapabilityMask",
     "CodexClient",
     "CodexClientOptions",
     "CodexCommand",
     "CodexResult",
+    "ContextChange",
+    "ContextDelta",
     "ContextSnapshot",
     "ContextStoreProtocol",
+    "ContextWatch",
+    "ContextWatchIterator",
+    "Counter",
+    "DistributedWorkerOptions",
+    "DistributedWorkflowEngine",
+    "Gauge",
+    "Histogram",
     "IntegrationAdapter",
     "IntegrationHost",
     "IntegrationInvocation",
+    "IntegrationPolicy",
+    "LivenessChecker",
     "MessageBus",
+    "MetricsRegistry",
+    "OtlpJsonFileSink",
     "ProcessSupervisor",
     "ProcessLaunchOptions",
     "PromptPackOptions",
@@ -61,16 +106,28 @@ __all__ = [
     "SecurityGuard",
     "SessionRecord",
     "SessionStore",
+    "Span",
+    "SpanContext",
+    "SqliteContextStore",
+    "SqliteTaskQueue",
     "Telemetry",
     "TelemetryEvent",
     "TelemetryOptions",
     "TelemetrySink",
+    "Tracer",
     "WorkflowContext",
     "WorkflowEngine",
     "WorkflowExecutionOptions",
     "WorkflowNodeDefinition",
+    "WorkflowNodeTiming",
     "WorkflowRunSummary",
+    "WorkflowStream",
     "WorkflowTaskHandler",
+    "chrome_trace",
+    "current_span_context",
+    "encode_prompt_package",
+    "estimate_tokens",
     "pack_prompt",
+    "write_chrome_trace",
     "InMemoryContextStore",
 ]
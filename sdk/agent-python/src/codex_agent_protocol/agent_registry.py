@@ -4,21 +4,63 @@ from __future__ import annotations
 
 import threading
 import time
-from collections import defaultdict
-from typing import Callable, Dict, List, MutableMapping
+from collections import defaultdict, deque
+from dataclasses import replace
+from itertools import islice
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
 
-from .types import AgentDefinition, AgentId, AgentRegistryEntry, AgentRuntimeState, AgentStatus
+from .types import (
+    AgentDefinition,
+    AgentId,
+    AgentRegistryChange,
+    AgentRegistryEntry,
+    AgentRuntimeState,
+    AgentStatus,
+    Capability,
+)
 
 EventHandler = Callable[..., None]
 
+_Index = Dict[Hashable, Dict[AgentId, None]]
+
+_TIMED_OUT = "Heartbeat timed out."
+_INACTIVE = (AgentStatus.OFFLINE, AgentStatus.STOPPED)
+
 
 class AgentRegistry:
-    """In-memory registry mirroring the TypeScript implementation."""
+    """In-memory registry mirroring the TypeScript implementation.
 
-    def __init__(self) -> None:
+    Entries are indexed by status, capability, status and capability
+    together, and by the tags listed in ``metadata["tags"]``, so ``find``
+    and ``pick`` do not scan the registry. Every change is appended to a
+    versioned feed of the last ``change_log_size`` changes that consumers
+    read with ``changes(since)``; event handlers run after the registry
+    lock is released.
+    """
+
+    def __init__(self, change_log_size: int = 4096) -> None:
         self._entries: MutableMapping[AgentId, AgentRegistryEntry] = {}
         self._handlers: Dict[str, List[EventHandler]] = defaultdict(list)
         self._lock = threading.RLock()
+        self._by_status: _Index = defaultdict(dict)
+        self._by_capability: _Index = defaultdict(dict)
+        self._by_status_capability: _Index = defaultdict(dict)
+        self._by_tag: _Index = defaultdict(dict)
+        self._version = 0
+        self._changes: Deque[AgentRegistryChange] = deque(maxlen=max(1, change_log_size))
+        self._change_floor = 0
+        self._heartbeats: Dict[AgentId, float] = {}
 
     def register(self, definition: AgentDefinition) -> AgentRegistryEntry:
         with self._lock:
@@ -30,18 +72,25 @@ class AgentRegistry:
                 status=AgentStatus.OFFLINE,
                 updated_at=time.time() * 1000,
             )
+            if existing:
+                self._unindex(existing)
             entry = AgentRegistryEntry(definition=definition, state=state)
             self._entries[definition.id] = entry
-            self._emit("registered", entry)
-            return entry
+            self._index(entry)
+            self._record("registered", definition.id, entry)
+        self._emit("registered", entry)
+        return entry
 
     def unregister(self, agent_id: AgentId) -> bool:
         with self._lock:
             deleted = self._entries.pop(agent_id, None)
-            if deleted:
-                self._emit("unregistered", agent_id)
-                return True
-            return False
+            if not deleted:
+                return False
+            self._unindex(deleted)
+            self._heartbeats.pop(agent_id, None)
+            self._record("unregistered", agent_id, None)
+        self._emit("unregistered", agent_id)
+        return True
 
     def update_state(self, agent_id: AgentId, **state: object) -> AgentRuntimeState:
         with self._lock:
@@ -54,16 +103,60 @@ class AgentRegistry:
                 error=state.get("error", entry.state.error),
                 resource_usage=state.get("resource_usage", entry.state.resource_usage),
             )
-            entry.state = merged
-            self._emit("stateChanged", agent_id, merged)
-            return merged
+            self._set_state(entry, merged)
+        self._emit("stateChanged", agent_id, merged)
+        return merged
 
     def set_status(self, agent_id: AgentId, status: AgentStatus, error: str | None = None) -> AgentRuntimeState:
         return self.update_state(agent_id, status=status, error=error)
 
+    def set_statuses(
+        self,
+        agent_ids: Iterable[AgentId],
+        status: AgentStatus,
+        error: str | None = None,
+        unless: Iterable[AgentStatus] = (),
+    ) -> List[AgentId]:
+        """Moves several agents to ``status`` under one lock acquisition.
+
+        Unknown agents and agents currently in one of the ``unless``
+        statuses are skipped. Returns the ids that changed.
+        """
+
+        skip = set(unless)
+        changed: List[Tuple[AgentId, AgentRuntimeState]] = []
+        now = time.time() * 1000
+        with self._lock:
+            for agent_id in agent_ids:
+                entry = self._entries.get(agent_id)
+                if entry is None or entry.state.status in skip:
+                    continue
+                state = replace(entry.state, status=status, error=error, updated_at=now)
+                self._set_state(entry, state)
+                changed.append((agent_id, state))
+        for agent_id, state in changed:
+            self._emit("stateChanged", agent_id, state)
+        return [agent_id for agent_id, _ in changed]
+
     def update_resources(self, agent_id: AgentId, usage: Dict[str, object]) -> AgentRuntimeState:
         return self.update_state(agent_id, resource_usage=usage)
 
+    def heartbeat(self, agent_id: AgentId) -> None:
+        """Records that ``agent_id`` is alive and emits ``heartbeat``.
+
+        Heartbeats do not change the agent's state or version.
+        """
+
+        at = time.time() * 1000
+        with self._lock:
+            if agent_id not in self._entries:
+                raise KeyError(f"Agent {agent_id} is not registered.")
+            self._heartbeats[agent_id] = at
+        self._emit("heartbeat", agent_id, at)
+
+    def last_heartbeat(self, agent_id: AgentId) -> float | None:
+        return self._heartbeats.get(agent_id)
+
     def get(self, agent_id: AgentId) -> AgentRegistryEntry | None:
         with self._lock:
             return self._entries.get(agent_id)
@@ -76,10 +169,274 @@ class AgentRegistry:
         with self._lock:
             return agent_id in self._entries
 
+    def find(
+        self,
+        status: Optional[AgentStatus] = None,
+        capability: Optional[Capability] = None,
+        tag: Optional[str] = None,
+    ) -> List[AgentRegistryEntry]:
+        """Returns the entries matching every given filter, using the smallest index."""
+
+        with self._lock:
+            return [self._entries[agent_id] for agent_id in self._matching(status, capability, tag)]
+
+    def pick(
+        self,
+        status: Optional[AgentStatus] = None,
+        capability: Optional[Capability] = None,
+        tag: Optional[str] = None,
+    ) -> AgentRegistryEntry | None:
+        """Returns the first entry matching the filters without building the full result."""
+
+        with self._lock:
+            for agent_id in self._matching(status, capability, tag):
+                return self._entries[agent_id]
+            return None
+
+    def count(self, status: AgentStatus) -> int:
+        with self._lock:
+            return len(self._by_status.get(status, ()))
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def changes(self, since: int = 0) -> Tuple[List[AgentRegistryChange], int]:
+        """Returns the changes after version ``since`` and the current version.
+
+        Raises ``ValueError`` when changes after ``since`` have already
+        been dropped from the feed; callers should resynchronize with
+        ``list`` and continue from the returned version.
+        """
+
+        with self._lock:
+            if since < self._change_floor:
+                raise ValueError(f"Changes after version {since} are no longer retained.")
+            version = self._version
+            if not self._changes or since >= version:
+                return [], version
+            skip = max(0, since + 1 - self._changes[0].version)
+            return list(islice(self._changes, skip, None)), version
+
     def on(self, event: str, handler: EventHandler) -> None:
         self._handlers[event].append(handler)
 
+    def _matching(
+        self,
+        status: Optional[AgentStatus],
+        capability: Optional[Capability],
+        tag: Optional[str],
+    ) -> Iterator[AgentId]:
+        candidates: List[Dict[AgentId, None]] = []
+        if status is not None and capability is not None:
+            candidates.append(self._by_status_capability.get((status, capability), {}))
+        elif status is not None:
+            candidates.append(self._by_status.get(status, {}))
+        elif capability is not None:
+            candidates.append(self._by_capability.get(capability, {}))
+        if tag is not None:
+            candidates.append(self._by_tag.get(tag, {}))
+        if not candidates:
+            return iter(list(self._entries))
+        candidates.sort(key=len)
+        smallest, rest = candidates[0], candidates[1:]
+        return (agent_id for agent_id in smallest if all(agent_id in other for other in rest))
+
+    def _set_state(self, entry: AgentRegistryEntry, state: AgentRuntimeState) -> None:
+        agent_id = entry.definition.id
+        if state.status != entry.state.status:
+            self._unindex_status(agent_id, entry)
+            entry.state = state
+            self._index_status(agent_id, entry)
+        else:
+            entry.state = state
+        self._record("stateChanged", agent_id, entry)
+
+    def _index(self, entry: AgentRegistryEntry) -> None:
+        agent_id = entry.definition.id
+        for capability in entry.definition.capabilities:
+            self._by_capability[capability][agent_id] = None
+        for tag in _tags(entry.definition):
+            self._by_tag[tag][agent_id] = None
+        self._index_status(agent_id, entry)
+
+    def _unindex(self, entry: AgentRegistryEntry) -> None:
+        agent_id = entry.definition.id
+        for capability in entry.definition.capabilities:
+            _discard(self._by_capability, capability, agent_id)
+        for tag in _tags(entry.definition):
+            _discard(self._by_tag, tag, agent_id)
+        self._unindex_status(agent_id, entry)
+
+    def _index_status(self, agent_id: AgentId, entry: AgentRegistryEntry) -> None:
+        status = entry.state.status
+        self._by_status[status][agent_id] = None
+        for capability in entry.definition.capabilities:
+            self._by_status_capability[(status, capability)][agent_id] = None
+
+    def _unindex_status(self, agent_id: AgentId, entry: AgentRegistryEntry) -> None:
+        status = entry.state.status
+        _discard(self._by_status, status, agent_id)
+        for capability in entry.definition.capabilities:
+            _discard(self._by_status_capability, (status, capability), agent_id)
+
+    def _record(self, kind: str, agent_id: AgentId, entry: Optional[AgentRegistryEntry]) -> None:
+        self._version += 1
+        if len(self._changes) == self._changes.maxlen:
+            self._change_floor = self._changes[0].version
+        if entry is not None:
+            entry = AgentRegistryEntry(definition=entry.definition, state=entry.state)
+        self._changes.append(AgentRegistryChange(self._version, kind, agent_id, entry))
+
     def _emit(self, event: str, *args: object) -> None:
         for handler in list(self._handlers.get(event, [])):
             handler(*args)
 
+
+def _tags(definition: AgentDefinition) -> List[str]:
+    tags = (definition.metadata or {}).get("tags")
+    if isinstance(tags, str):
+        return [tags]
+    return [tag for tag in tags or () if isinstance(tag, Hashable)]
+
+
+def _discard(index: _Index, key: Hashable, agent_id: AgentId) -> None:
+    members = index.get(key)
+    if members is not None:
+        members.pop(agent_id, None)
+        if not members:
+            del index[key]
+
+
+class LivenessChecker:
+    """Moves agents whose heartbeats stop to ``OFFLINE``.
+
+    Agents are tracked from their first heartbeat or from the moment they
+    are registered in, or move to, an active status, so an agent that never
+    sends a heartbeat still expires. A heartbeat from an agent this checker
+    moved offline restores the status it had before. Each one sits in a
+    timing-wheel slot for the tick at which it expires; a heartbeat moves
+    it to a later slot in O(1), and advancing the wheel only visits the
+    slots that came due, so the work per tick is proportional to the
+    agents expiring then rather than to the registry size. Expired agents
+    are switched in one ``set_statuses`` call, which emits
+    ``stateChanged`` for each of them. Agents already ``OFFLINE`` or
+    ``STOPPED`` are left alone.
+    """
+
+    def __init__(self, registry: AgentRegistry, timeout_ms: float, tick_ms: float = 100) -> None:
+        self._registry = registry
+        self._tick = tick_ms / 1000
+        self._timeout = timeout_ms / 1000
+        self._slots: List[Dict[AgentId, None]] = [
+            {} for _ in range(int(timeout_ms // tick_ms) + 2)
+        ]
+        self._deadlines: Dict[AgentId, int] = {}
+        self._expired: Dict[AgentId, AgentStatus] = {}
+        self._lock = threading.Lock()
+        self._current = self._tick_at(time.monotonic())
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        registry.on("heartbeat", self._on_heartbeat)
+        registry.on("registered", lambda entry: self._on_state(entry.definition.id, entry.state))
+        registry.on("stateChanged", self._on_state)
+        registry.on("unregistered", self.forget)
+
+    def track(self, agent_id: AgentId, now: Optional[float] = None) -> None:
+        """Pushes ``agent_id``'s deadline to ``timeout_ms`` from now."""
+
+        now = time.monotonic() if now is None else now
+        deadline = max(self._tick_at(now + self._timeout) + 1, self._current + 1)
+        with self._lock:
+            previous = self._deadlines.get(agent_id)
+            if previous is not None:
+                self._slots[previous % len(self._slots)].pop(agent_id, None)
+            self._deadlines[agent_id] = deadline
+            self._slots[deadline % len(self._slots)][agent_id] = None
+
+    def forget(self, agent_id: AgentId) -> None:
+        with self._lock:
+            self._expired.pop(agent_id, None)
+            deadline = self._deadlines.pop(agent_id, None)
+            if deadline is not None:
+                self._slots[deadline % len(self._slots)].pop(agent_id, None)
+
+    def advance(self, now: Optional[float] = None) -> List[AgentId]:
+        """Expires every agent whose deadline has passed and returns those moved offline."""
+
+        target = self._tick_at(time.monotonic() if now is None else now)
+        expired: List[AgentId] = []
+        with self._lock:
+            if target <= self._current:
+                return []
+            first = max(self._current + 1, target - len(self._slots) + 1)
+            for tick in range(first, target + 1):
+                slot = self._slots[tick % len(self._slots)]
+                for agent_id in [a for a in slot if self._deadlines[a] <= target]:
+                    del slot[agent_id]
+                    del self._deadlines[agent_id]
+                    expired.append(agent_id)
+            self._current = target
+        expired = [agent_id for agent_id in expired if agent_id not in self._deadlines]
+        if not expired:
+            return []
+        previous = {}
+        for agent_id in expired:
+            entry = self._registry.get(agent_id)
+            if entry is not None:
+                previous[agent_id] = entry.state.status
+        with self._lock:
+            self._expired.update(previous)
+        changed = self._registry.set_statuses(
+            expired,
+            AgentStatus.OFFLINE,
+            error=_TIMED_OUT,
+            unless=_INACTIVE,
+        )
+        with self._lock:
+            for agent_id in set(previous).difference(changed):
+                self._expired.pop(agent_id, None)
+        return changed
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="agent-liveness", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._tick):
+            self.advance()
+
+    def _on_heartbeat(self, agent_id: AgentId, _at: float) -> None:
+        self.track(agent_id)
+        with self._lock:
+            status = self._expired.pop(agent_id, None)
+        if status is not None:
+            self._registry.set_statuses(
+                [agent_id],
+                status,
+                unless=[other for other in AgentStatus if other is not AgentStatus.OFFLINE],
+            )
+
+    def _on_state(self, agent_id: AgentId, state: AgentRuntimeState) -> None:
+        if state.status in _INACTIVE:
+            if not (state.status is AgentStatus.OFFLINE and state.error == _TIMED_OUT):
+                self.forget(agent_id)
+            return
+        with self._lock:
+            self._expired.pop(agent_id, None)
+            if agent_id in self._deadlines:
+                return
+        age = max(0.0, time.time() - state.updated_at / 1000)
+        self.track(agent_id, now=time.monotonic() - age)
+
+    def _tick_at(self, moment: float) -> int:
+        return int(moment // self._tick)
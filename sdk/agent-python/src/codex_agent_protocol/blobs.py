@@ -0,0 +1,203 @@
+"""Content-addressed blob storage for large context values."""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+_HEADER = struct.Struct(">32sQ?")
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    digest: str
+    size: int
+    text: bool = True
+
+
+class BlobStore:
+    """Deduplicating, append-only blob store backed by memory-mapped segment files.
+
+    Each record is written once per distinct SHA-256 digest, so the same
+    file content stored from many namespaces or sessions occupies a single
+    slot on disk. Reads slice the segment's memory map instead of keeping
+    the bytes on the Python heap. Reopening a directory rebuilds the index
+    by scanning the segment headers.
+
+    Nothing is reclaimed implicitly; ``gc`` rewrites the segments keeping
+    only the blobs that are still referenced.
+    """
+
+    def __init__(
+        self, directory: Optional[str] = None, segment_bytes: int = 64 * 1024 * 1024
+    ) -> None:
+        self._owned = directory is None
+        self._directory = directory or tempfile.mkdtemp(prefix="codex-blobs-")
+        os.makedirs(self._directory, exist_ok=True)
+        self._segment_bytes = segment_bytes
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        self._segments: List[str] = []
+        self._next_segment = 0
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._writer: Optional[BinaryIO] = None
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def put(self, value: Union[str, bytes]) -> BlobRef:
+        text = isinstance(value, str)
+        data = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        digest = hashlib.sha256(data).digest()
+        ref = BlobRef(digest=digest.hex(), size=len(data), text=text)
+        with self._lock:
+            if ref.digest not in self._index:
+                self._index[ref.digest] = self._append(digest, data, text)
+        return ref
+
+    def get(self, ref: BlobRef) -> Union[str, bytes]:
+        with self._lock:
+            location = self._index.get(ref.digest)
+            if location is None:
+                raise KeyError(f"Unknown blob {ref.digest}.")
+            segment, offset, length = location
+            data = self._map(segment, offset + length)[offset : offset + length]
+        return data.decode("utf-8") if ref.text else data
+
+    def __contains__(self, ref: object) -> bool:
+        return isinstance(ref, BlobRef) and ref.digest in self._index
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "blobs": len(self._index),
+                "bytes": sum(length for _, _, length in self._index.values()),
+                "segments": len(self._segments),
+            }
+
+    def gc(self, live: Iterable[BlobRef]) -> int:
+        """Drops every blob not in ``live`` and returns the number of bytes reclaimed.
+
+        Live records are copied into fresh segments and the old segment
+        files are deleted; references to dropped blobs raise ``KeyError``
+        afterwards. When several context stores share this blob store,
+        ``live`` must cover the references of all of them.
+        """
+
+        keep = {ref.digest for ref in live}
+        with self._lock:
+            dead = [digest for digest in self._index if digest not in keep]
+            if not dead:
+                return 0
+            reclaimed = sum(_HEADER.size + self._index[digest][2] for digest in dead)
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for mapped in self._maps.values():
+                mapped.close()
+            old_segments, old_index = self._segments, self._index
+            self._segments, self._maps, self._index = [], {}, {}
+            sources: Dict[int, mmap.mmap] = {}
+            try:
+                for digest, (segment, offset, length) in sorted(
+                    old_index.items(), key=lambda item: item[1]
+                ):
+                    if digest not in keep:
+                        continue
+                    source = sources.get(segment)
+                    if source is None:
+                        with open(old_segments[segment], "rb") as handle:
+                            source = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+                        sources[segment] = source
+                    _, _, text = _HEADER.unpack_from(source, offset - _HEADER.size)
+                    self._index[digest] = self._append(
+                        bytes.fromhex(digest), source[offset : offset + length], text
+                    )
+            finally:
+                for source in sources.values():
+                    source.close()
+            if self._writer is not None:
+                self._writer.flush()
+            for path in old_segments:
+                os.remove(path)
+        return reclaimed
+
+    def close(self) -> None:
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._owned:
+                shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _append(self, digest: bytes, data: bytes, text: bool) -> Tuple[int, int, int]:
+        record_size = _HEADER.size + len(data)
+        writer = self._writer
+        if writer is None or (writer.tell() and writer.tell() + record_size > self._segment_bytes):
+            writer = self._open_segment()
+        writer.write(_HEADER.pack(digest, len(data), text))
+        offset = writer.tell()
+        writer.write(data)
+        return len(self._segments) - 1, offset, len(data)
+
+    def _open_segment(self) -> BinaryIO:
+        if self._writer is not None:
+            self._writer.close()
+        path = os.path.join(self._directory, f"segment-{self._next_segment:05d}.bin")
+        self._next_segment += 1
+        self._segments.append(path)
+        self._writer = open(path, "ab")
+        return self._writer
+
+    def _map(self, segment: int, needed: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is not None and len(mapped) >= needed:
+            return mapped
+        if self._writer is not None and segment == len(self._segments) - 1:
+            self._writer.flush()
+        if mapped is not None:
+            mapped.close()
+        with open(self._segments[segment], "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[segment] = mapped
+        return mapped
+
+    def _load(self) -> None:
+        names = sorted(
+            name
+            for name in os.listdir(self._directory)
+            if name.startswith("segment-") and name.endswith(".bin")
+        )
+        for name in names:
+            segment = len(self._segments)
+            path = os.path.join(self._directory, name)
+            self._segments.append(path)
+            self._next_segment = max(self._next_segment, int(name[len("segment-") : -4]) + 1)
+            file_size = os.path.getsize(path)
+            with open(path, "rb") as handle:
+                offset = 0
+                while True:
+                    header = handle.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    digest, length, _ = _HEADER.unpack(header)
+                    offset += _HEADER.size
+                    if offset + length > file_size:
+                        break
+                    self._index.setdefault(digest.hex(), (segment, offset, length))
+                    handle.seek(length, os.SEEK_CUR)
+                    offset += length
+        if self._segments:
+            self._writer = open(self._segments[-1], "ab")
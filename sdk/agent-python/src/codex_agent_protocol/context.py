@@ -2,55 +2,709 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+import sys
 import threading
 import time
 import uuid
-from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass, fields, replace
+from types import MappingProxyType
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
-from .types import ContextSnapshot, ContextStoreProtocol, PromptPackage
+from .blobs import BlobRef, BlobStore
+from .metrics import MetricsRegistry
+from .types import ContextChange, ContextDelta, ContextSnapshot, ContextStoreProtocol, PromptPackage
 
+TokenEstimator = Callable[[object], int]
+
+
+def estimate_tokens(value: object) -> int:
+    """Cheap token estimate assuming roughly four characters per token."""
+
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return len(text) // 4 + 1
+
+
+def _approximate_bytes(key: str, value: object) -> int:
+    if isinstance(value, (str, bytes)):
+        size = len(value)
+    elif isinstance(value, BlobRef):
+        size = len(value.digest)
+    else:
+        try:
+            size = len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            # Non-string keys or reference cycles; a shallow size is good enough here.
+            size = sys.getsizeof(value)
+    return len(key) + size + _ENTRY_OVERHEAD
+
+
+_ENTRY_OVERHEAD = 64
 
-class InMemoryContextStore(ContextStoreProtocol):
-    """Thread-safe namespace-aware context store."""
+
+class _Namespace:
+    __slots__ = (
+        "data",
+        "versions",
+        "blobs",
+        "version",
+        "shared",
+        "sizes",
+        "encoded",
+        "entry_bytes",
+        "bytes",
+        "touched",
+        "referenced",
+    )
 
     def __init__(self) -> None:
-        self._namespaces: Dict[str, Dict[str, object]] = {}
+        self.data: Dict[str, object] = {}
+        self.versions: Dict[str, int] = {}
+        self.blobs: Dict[str, BlobRef] = {}
+        self.version = 0
+        self.shared = False
+        self.sizes: Dict[str, Tuple[int, int]] = {}
+        self.encoded: Dict[str, Tuple[int, str]] = {}
+        self.entry_bytes: Dict[str, int] = {}
+        self.bytes = 0
+        self.touched = time.monotonic()
+        self.referenced = False
+
+
+class _Remembered:
+    """What the snapshot history keeps of a snapshot: its key versions, not its data."""
+
+    __slots__ = ("namespace", "version", "key_versions", "blobs")
+
+    def __init__(
+        self,
+        namespace: Optional[str],
+        version: int,
+        key_versions: Mapping[str, int],
+        blobs: Mapping[str, BlobRef],
+    ) -> None:
+        self.namespace = namespace
+        self.version = version
+        self.key_versions = key_versions
+        self.blobs = blobs
+
+
+ChangeCallback = Callable[[List[ContextChange]], None]
+WatchT = TypeVar("WatchT", bound="ContextWatch")
+
+
+class ContextWatch(ABC):
+    """Subscription to changes of one namespace, optionally narrowed to a key prefix."""
+
+    def __init__(self, store: "InMemoryContextStore", namespace: str, prefix: str) -> None:
+        self.namespace = namespace
+        self.prefix = prefix
+        self._store = store
+        self.closed = False
+
+    def matches(self, change: ContextChange) -> bool:
+        return change.key.startswith(self.prefix)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._store._unwatch(self)
+
+    @abstractmethod
+    def _deliver(self, changes: List[ContextChange]) -> None:
+        """Receives the matching changes of one store operation."""
+
+
+class _CallbackWatch(ContextWatch):
+    def __init__(
+        self, store: "InMemoryContextStore", namespace: str, prefix: str, callback: ChangeCallback
+    ) -> None:
+        super().__init__(store, namespace, prefix)
+        self._callback = callback
+
+    def _deliver(self, changes: List[ContextChange]) -> None:
+        self._callback(changes)
+
+
+class ContextWatchIterator(ContextWatch):
+    """Async iterator over coalesced batches of changes.
+
+    Changes that arrive while the consumer is busy are merged per key, so
+    each batch carries only the latest change of every key, in version
+    order. Writes may come from any thread.
+    """
+
+    def __init__(self, store: "InMemoryContextStore", namespace: str, prefix: str) -> None:
+        super().__init__(store, namespace, prefix)
+        self._pending: "OrderedDict[str, ContextChange]" = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __aiter__(self) -> "ContextWatchIterator":
+        return self
+
+    async def __anext__(self) -> List[ContextChange]:
+        if self._wakeup is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            with self._pending_lock:
+                if self._pending:
+                    batch = sorted(self._pending.values(), key=lambda change: change.version)
+                    self._pending.clear()
+                    return batch
+            if self.closed:
+                raise StopAsyncIteration
+            await self._wakeup.wait()
+
+    def close(self) -> None:
+        super().close()
+        self._wake()
+
+    def _deliver(self, changes: List[ContextChange]) -> None:
+        with self._pending_lock:
+            for change in changes:
+                self._pending.pop(change.key, None)
+                self._pending[change.key] = change
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+
+class InMemoryContextStore(ContextStoreProtocol):
+    """Thread-safe namespace-aware context store.
+
+    Namespaces are copy-on-write: ``snapshot`` hands out a read-only view of
+    the current mapping in O(1) and the next write to that namespace copies
+    it once before mutating. Every write stamps the namespace with a
+    store-wide, monotonically increasing version, and each key keeps the
+    version of its last write. Token estimates for ``pack_prompt`` are
+    cached per key and recomputed only after the key changes.
+
+    The key versions of the last ``snapshot_history`` snapshots are kept so
+    ``diff`` can report which keys changed since an earlier snapshot id;
+    their data is not, and the history of an evicted or expired namespace
+    is dropped with it.
+
+    With a ``blob_store``, ``str``/``bytes`` values of at least
+    ``blob_threshold`` bytes (UTF-8 encoded for ``str``) are stored once in
+    the blob store and the namespace keeps a ``BlobRef``. ``get`` resolves
+    references; snapshots expose them as-is and ``pack_prompt`` resolves
+    them when packing. ``collect_blobs`` reclaims blobs that are no longer
+    referenced after deletes, overwrites, evictions or expirations.
+
+    ``watch`` and ``watch_async`` push changes to subscribers instead of
+    making them poll. The last ``change_log_size`` changes are retained so
+    a subscriber can resume from a version it has already seen.
+
+    Memory is bounded by ``max_bytes``, an approximate budget over every
+    namespace (string length, or JSON length for other values, plus a
+    fixed per-entry overhead; blob-backed values count only their
+    reference). Sizes are only computed, and ``stats()["bytes"]`` only
+    tracked, when a budget is set. When a write exceeds the budget, whole
+    namespaces are evicted in least-recently-used order, giving namespaces
+    read since they were last considered a second chance. Namespaces idle
+    for longer than their TTL (``set_ttl`` or ``default_ttl_ms``) read as
+    empty and are dropped by the next sweep. Evictions are reported to
+    watchers as deletions and counted in ``stats``.
+    """
+
+    def __init__(
+        self,
+        token_estimator: Optional[TokenEstimator] = None,
+        snapshot_history: int = 128,
+        blob_store: Optional[BlobStore] = None,
+        blob_threshold: int = 64 * 1024,
+        change_log_size: int = 1024,
+        max_bytes: Optional[int] = None,
+        default_ttl_ms: Optional[float] = None,
+        sweep_interval_ms: float = 1000,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self._namespaces: "OrderedDict[str, _Namespace]" = OrderedDict()
         self._lock = threading.RLock()
+        self._version = 0
+        self._history: "OrderedDict[str, _Remembered]" = OrderedDict()
+        self._history_limit = snapshot_history
+        self._partial: Set[str] = set()
+        self.token_estimator: TokenEstimator = token_estimator or estimate_tokens
+        self._blobs = blob_store
+        self._blob_threshold = blob_threshold
+        self._watchers: Dict[str, List[ContextWatch]] = {}
+        self._changes: Deque[ContextChange] = deque(maxlen=max(1, change_log_size))
+        self._change_floor = 0
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._default_ttl = default_ttl_ms / 1000 if default_ttl_ms is not None else None
+        self._ttls: Dict[str, Optional[float]] = {}
+        self._sweep_interval = sweep_interval_ms / 1000
+        self._next_sweep = time.monotonic() + self._sweep_interval
+        self._stats = {"evictions": 0, "expirations": 0, "evicted_keys": 0, "evicted_bytes": 0}
+        if metrics is not None:
+            self._register_metrics(metrics)
 
     def set(self, namespace: str, key: str, value: object) -> None:  # type: ignore[override]
+        content = value
+        if self._blobs is not None and self._is_large(value):
+            value = self._blobs.put(value)  # type: ignore[arg-type]
         with self._lock:
-            store = self._namespaces.setdefault(namespace, {})
-            store[key] = value
+            if isinstance(value, BlobRef) and value not in self._blobs:
+                # A concurrent ``collect_blobs`` reclaimed it before it was referenced.
+                value = self._blobs.put(content)  # type: ignore[arg-type, union-attr]
+            watchers = self._sweep_expired()
+            store = self._namespaces.get(namespace)
+            if store is None or self._expired(namespace, store, time.monotonic()):
+                if store is not None:
+                    self._stats["expirations"] += 1
+                    watchers.extend(self._drop_namespace(namespace, store))
+                store = self._namespaces[namespace] = _Namespace()
+            else:
+                self._namespaces.move_to_end(namespace)
+                store.touched = time.monotonic()
+            store.version = self._next_version()
+            self._writable(store)[key] = value
+            store.versions[key] = store.version
+            if isinstance(value, BlobRef):
+                store.blobs[key] = value
+            else:
+                store.blobs.pop(key, None)
+            if self._max_bytes is not None:
+                size = _approximate_bytes(key, value)
+                delta = size - store.entry_bytes.get(key, 0)
+                store.entry_bytes[key] = size
+                store.bytes += delta
+                self._bytes += delta
+            watchers.extend(self._record_change(ContextChange(namespace, key, store.version)))
+            if self._max_bytes is not None and self._bytes > self._max_bytes:
+                watchers.extend(self._evict(keep=namespace))
+        self._notify(watchers)
 
     def get(self, namespace: str, key: str) -> object | None:  # type: ignore[override]
+        store = self._live(namespace)
+        if store is None:
+            return None
+        return self.resolve(store.data.get(key))
+
+    def live_blobs(self) -> Set[BlobRef]:
+        """Returns the blob references held by namespaces or remembered snapshots."""
+
         with self._lock:
-            store = self._namespaces.get(namespace)
-            if not store:
-                return None
-            return store.get(key)
+            mappings = [store.blobs for store in self._namespaces.values()]
+            mappings.extend(remembered.blobs for remembered in self._history.values())
+            return {
+                value
+                for mapping in mappings
+                for value in mapping.values()
+                if isinstance(value, BlobRef)
+            }
+
+    def collect_blobs(self) -> int:
+        """Reclaims blobs this store no longer references; returns the bytes freed.
+
+        Only use this when the blob store is not shared with other stores;
+        otherwise pass the union of their ``live_blobs`` to ``BlobStore.gc``.
+        """
+
+        if self._blobs is None:
+            return 0
+        with self._lock:
+            return self._blobs.gc(self.live_blobs())
+
+    def resolve(self, value: object) -> object:
+        """Returns the stored content for a ``BlobRef`` and any other value unchanged."""
+
+        if isinstance(value, BlobRef) and self._blobs is not None:
+            return self._blobs.get(value)
+        return value
 
     def delete(self, namespace: str, key: str) -> None:  # type: ignore[override]
         with self._lock:
             store = self._namespaces.get(namespace)
-            if not store:
+            if store is None or key not in store.data:
                 return
-            store.pop(key, None)
-            if not store:
+            self._writable(store).pop(key, None)
+            store.versions.pop(key, None)
+            store.blobs.pop(key, None)
+            store.sizes.pop(key, None)
+            store.encoded.pop(key, None)
+            size = store.entry_bytes.pop(key, 0)
+            store.bytes -= size
+            self._bytes -= size
+            store.version = self._next_version()
+            if not store.data:
                 self._namespaces.pop(namespace, None)
+            change = ContextChange(namespace, key, store.version, deleted=True)
+            watchers = self._record_change(change)
+        self._notify(watchers)
 
     def snapshot(self, namespace: str) -> ContextSnapshot:  # type: ignore[override]
         with self._lock:
-            store = dict(self._namespaces.get(namespace, {}))
-        return ContextSnapshot(id=str(uuid.uuid4()), created_at=time.time() * 1000, data=store)
+            store = self._live(namespace) or _Namespace()
+            store.shared = True
+            snapshot = ContextSnapshot(
+                id=str(uuid.uuid4()),
+                created_at=time.time() * 1000,
+                data=MappingProxyType(store.data),
+                version=store.version,
+                namespace=namespace,
+                key_versions=MappingProxyType(store.versions),
+            )
+            self._remember(snapshot, store.blobs)
+        return snapshot
+
+    def carry_forward(
+        self, snapshot: ContextSnapshot, keys: Iterable[str], base_id: Optional[str] = None
+    ) -> ContextSnapshot:
+        """Returns a remembered copy of ``snapshot`` in which ``keys`` count as undelivered.
+
+        Each key keeps its version from ``base_id`` when that snapshot had it
+        and is left out otherwise, so a ``diff`` against the copy reports it
+        again.
+        """
+
+        with self._lock:
+            base = self._history.get(base_id) if base_id is not None else None
+            versions = dict(snapshot.key_versions)
+            for key in keys:
+                before = base.key_versions.get(key) if base is not None else None
+                if before is None:
+                    versions.pop(key, None)
+                else:
+                    versions[key] = before
+            derived = replace(
+                snapshot, id=str(uuid.uuid4()), key_versions=MappingProxyType(versions)
+            )
+            source = self._history.get(snapshot.id)
+            blobs = source.blobs if source is not None else _blob_refs(snapshot.data)
+            self._remember(derived, blobs, partial=True)
+        return derived
+
+    def diff(self, base_id: str, snapshot: ContextSnapshot) -> Optional[ContextDelta]:
+        """Lists keys added, changed or removed between a remembered snapshot and ``snapshot``.
+
+        Returns ``None`` when ``base_id`` is unknown, has been evicted from
+        the history or belongs to another namespace.
+        """
+
+        with self._lock:
+            base = self._history.get(base_id)
+        if base is None or base.namespace != snapshot.namespace:
+            return None
+        delta = ContextDelta(base_id=base_id, snapshot_id=snapshot.id)
+        if base.version == snapshot.version and base_id not in self._partial:
+            return delta
+        previous = base.key_versions
+        for key, version in snapshot.key_versions.items():
+            before = previous.get(key)
+            if before is None:
+                delta.added.append(key)
+            elif before != version:
+                delta.changed.append(key)
+        delta.removed = [key for key in previous if key not in snapshot.key_versions]
+        return delta
+
+    def version(self, namespace: str) -> int:
+        store = self._live(namespace)
+        return store.version if store is not None else 0
+
+    def key_version(self, namespace: str, key: str) -> int:
+        store = self._live(namespace)
+        return store.versions.get(key, 0) if store is not None else 0
+
+    def entry_tokens(self, namespace: str, key: str) -> Optional[int]:
+        """Returns the cached token estimate for a key, computing it on first use."""
+
+        with self._lock:
+            store = self._namespaces.get(namespace)
+            if store is None or key not in store.data:
+                return None
+            version = store.versions[key]
+            cached = store.sizes.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            value = store.data[key]
+        tokens = self.token_estimator(self.resolve(value))
+        with self._lock:
+            store.sizes[key] = (version, tokens)
+        return tokens
+
+    def encoded_entry(
+        self, namespace: str, key: str, version: int, entry: Mapping[str, object]
+    ) -> Optional[str]:
+        """Returns the JSON encoding of a packed entry, cached per key version.
+
+        Returns ``None`` for entries that are not JSON-serializable.
+        """
+
+        with self._lock:
+            store = self._namespaces.get(namespace)
+            cached = store.encoded.get(key) if store is not None else None
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            fragment = json.dumps(entry)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            if store is not None and store.versions.get(key) == version:
+                store.encoded[key] = (version, fragment)
+        return fragment
+
+    def watch(
+        self,
+        namespace: str,
+        callback: ChangeCallback,
+        prefix: str = "",
+        since: Optional[int] = None,
+    ) -> ContextWatch:
+        """Calls ``callback`` synchronously, on the writing thread, after each operation.
+
+        Each call carries the matching changes of one operation: a single
+        change for ``set``/``delete``, every dropped key for ``clear``, an
+        eviction or an expiry sweep. With ``since``, retained changes newer
+        than that version are replayed first as one batch holding the latest
+        change of each key. Use ``watch_async`` to merge changes across
+        operations while the consumer is busy.
+        """
+
+        return self._subscribe(_CallbackWatch(self, namespace, prefix, callback), since)
+
+    def watch_async(
+        self,
+        namespace: str,
+        prefix: str = "",
+        since: Optional[int] = None,
+    ) -> ContextWatchIterator:
+        """Returns an async iterator of coalesced change batches."""
+
+        return self._subscribe(ContextWatchIterator(self, namespace, prefix), since)
+
+    def set_ttl(self, namespace: str, ttl_ms: Optional[float]) -> None:
+        """Expires ``namespace`` after ``ttl_ms`` without reads or writes; ``None`` disables it."""
+
+        with self._lock:
+            self._ttls[namespace] = ttl_ms / 1000 if ttl_ms is not None else None
+
+    def evict_expired(self) -> int:
+        """Drops every expired namespace now and returns how many were removed."""
+
+        with self._lock:
+            before = self._stats["expirations"]
+            self._next_sweep = 0
+            notifications = self._sweep_expired()
+            removed = self._stats["expirations"] - before
+        self._notify(notifications)
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "namespaces": len(self._namespaces),
+                "bytes": self._bytes,
+                "max_bytes": self._max_bytes or 0,
+                **self._stats,
+            }
 
     def list_namespaces(self) -> List[str]:
+        now = time.monotonic()
         with self._lock:
-            return list(self._namespaces.keys())
+            return [
+                namespace
+                for namespace, store in self._namespaces.items()
+                if not self._expired(namespace, store, now)
+            ]
 
     def clear(self) -> None:
+        notifications: List[Tuple[ContextWatch, List[ContextChange]]] = []
         with self._lock:
-            self._namespaces.clear()
+            for namespace, store in list(self._namespaces.items()):
+                notifications.extend(self._drop_namespace(namespace, store))
+            self._history.clear()
+            self._partial.clear()
+        self._notify(notifications)
+
+    def _register_metrics(self, metrics: MetricsRegistry) -> None:
+        metrics.gauge(
+            "context_bytes",
+            "Approximate bytes held by the context store.",
+            function=lambda: self._bytes,
+        )
+        metrics.gauge(
+            "context_namespaces",
+            "Namespaces held by the context store.",
+            function=lambda: len(self._namespaces),
+        )
+        for name in ("evictions", "expirations", "evicted_bytes"):
+            metrics.counter(
+                f"context_{name}_total",
+                f"Context store {name.replace('_', ' ')} since start.",
+                function=lambda name=name: self._stats[name],
+            )
+
+    def _remember(
+        self, snapshot: ContextSnapshot, blobs: Mapping[str, BlobRef], partial: bool = False
+    ) -> None:
+        if self._history_limit <= 0:
+            return
+        self._history[snapshot.id] = _Remembered(
+            snapshot.namespace, snapshot.version, snapshot.key_versions, blobs
+        )
+        if partial:
+            self._partial.add(snapshot.id)
+        if len(self._history) > self._history_limit:
+            evicted, _ = self._history.popitem(last=False)
+            self._partial.discard(evicted)
+
+    def _is_large(self, value: object) -> bool:
+        threshold = self._blob_threshold
+        if isinstance(value, bytes):
+            return len(value) >= threshold
+        if not isinstance(value, str):
+            return False
+        if len(value) >= threshold:
+            return True
+        # UTF-8 uses at most four bytes per character, so only encode when it could matter.
+        return len(value) * 4 >= threshold and len(value.encode("utf-8")) >= threshold
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def _live(self, namespace: str) -> Optional[_Namespace]:
+        store = self._namespaces.get(namespace)
+        if store is None:
+            return None
+        now = time.monotonic()
+        if self._expired(namespace, store, now):
+            return None
+        store.touched = now
+        store.referenced = True
+        return store
+
+    def _expired(self, namespace: str, store: _Namespace, now: float) -> bool:
+        ttl = self._ttls.get(namespace, self._default_ttl)
+        return ttl is not None and now - store.touched > ttl
+
+    def _sweep_expired(self) -> List[Tuple[ContextWatch, List[ContextChange]]]:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return []
+        self._next_sweep = now + self._sweep_interval
+        notifications: List[Tuple[ContextWatch, List[ContextChange]]] = []
+        for namespace, store in list(self._namespaces.items()):
+            if self._expired(namespace, store, now):
+                self._stats["expirations"] += 1
+                notifications.extend(self._drop_namespace(namespace, store))
+        return notifications
+
+    def _evict(self, keep: str) -> List[Tuple[ContextWatch, List[ContextChange]]]:
+        assert self._max_bytes is not None
+        notifications: List[Tuple[ContextWatch, List[ContextChange]]] = []
+        while self._bytes > self._max_bytes:
+            namespace = next((name for name in self._namespaces if name != keep), None)
+            if namespace is None:
+                break
+            store = self._namespaces[namespace]
+            if store.referenced:
+                store.referenced = False
+                self._namespaces.move_to_end(namespace)
+                continue
+            self._stats["evictions"] += 1
+            self._stats["evicted_keys"] += len(store.data)
+            self._stats["evicted_bytes"] += store.bytes
+            notifications.extend(self._drop_namespace(namespace, store))
+        return notifications
+
+    def _drop_namespace(
+        self, namespace: str, store: _Namespace
+    ) -> List[Tuple[ContextWatch, List[ContextChange]]]:
+        self._namespaces.pop(namespace, None)
+        self._bytes -= store.bytes
+        for snapshot_id in [
+            snapshot_id
+            for snapshot_id, remembered in self._history.items()
+            if remembered.namespace == namespace
+        ]:
+            del self._history[snapshot_id]
+            self._partial.discard(snapshot_id)
+        notifications: List[Tuple[ContextWatch, List[ContextChange]]] = []
+        for key in list(store.data):
+            change = ContextChange(namespace, key, self._next_version(), deleted=True)
+            notifications.extend(self._record_change(change))
+        return notifications
+
+    def _subscribe(self, watch: WatchT, since: Optional[int]) -> WatchT:
+        with self._lock:
+            if since is not None and since < self._change_floor:
+                raise ValueError(
+                    f"Version {since} is older than the retained change log; "
+                    "take a fresh snapshot instead."
+                )
+            self._watchers.setdefault(watch.namespace, []).append(watch)
+            replay: Dict[str, ContextChange] = {}
+            if since is not None:
+                for change in self._changes:
+                    if change.version > since and change.namespace == watch.namespace:
+                        if watch.matches(change):
+                            replay[change.key] = change
+        if replay:
+            watch._deliver(sorted(replay.values(), key=lambda change: change.version))
+        return watch
+
+    def _unwatch(self, watch: ContextWatch) -> None:
+        with self._lock:
+            watchers = self._watchers.get(watch.namespace)
+            if watchers and watch in watchers:
+                watchers.remove(watch)
+                if not watchers:
+                    self._watchers.pop(watch.namespace, None)
+
+    def _record_change(
+        self, change: ContextChange
+    ) -> List[Tuple[ContextWatch, List[ContextChange]]]:
+        if len(self._changes) == self._changes.maxlen:
+            self._change_floor = self._changes[0].version
+        self._changes.append(change)
+        return [
+            (watch, [change])
+            for watch in self._watchers.get(change.namespace, ())
+            if watch.matches(change)
+        ]
+
+    @staticmethod
+    def _notify(notifications: List[Tuple[ContextWatch, List[ContextChange]]]) -> None:
+        batches: Dict[int, Tuple[ContextWatch, List[ContextChange]]] = {}
+        for watch, changes in notifications:
+            batches.setdefault(id(watch), (watch, []))[1].extend(changes)
+        for watch, changes in batches.values():
+            watch._deliver(changes)
+
+    @staticmethod
+    def _writable(store: _Namespace) -> Dict[str, object]:
+        if store.shared:
+            store.data = dict(store.data)
+            store.versions = dict(store.versions)
+            store.blobs = dict(store.blobs)
+            store.shared = False
+        return store.data
 
 
 @dataclass
@@ -59,24 +713,208 @@ class PromptPackOptions:
     keys: Optional[Iterable[str]] = None
     session_id: Optional[str] = None
     attachments: Optional[List[Dict[str, object]]] = None
+    max_tokens: Optional[int] = None
+    priorities: Optional[Dict[str, int]] = None
+    truncate: Optional[Callable[[str, object, int], Optional[object]]] = None
+    token_estimator: Optional[TokenEstimator] = None
+    since_snapshot: Optional[str] = None
+    resolve_blobs: bool = True
+    pre_encode: bool = True
 
 
 def pack_prompt(store: ContextStoreProtocol, options: PromptPackOptions) -> PromptPackage:
-    """Collects stored context data into a prompt package."""
+    """Collects stored context data into a prompt package.
 
-    entries: List[Dict[str, object]] = []
-    if not options.keys:
+    With ``max_tokens`` or ``priorities`` set, entries are ordered by
+    priority and then by recency and packed greedily into the budget.
+    Entries that do not fit are offered to ``truncate`` (which may return a
+    shorter replacement) and otherwise reported in ``dropped``.
+
+    With ``since_snapshot`` set to the ``snapshot_id`` of an earlier
+    package, only added or changed entries are packed and deleted keys are
+    listed in ``removed``. If the store cannot diff against that snapshot,
+    a full package is returned with ``base_snapshot_id`` left unset. Keys
+    dropped for the budget are not treated as delivered: when the store
+    supports ``carry_forward``, the returned ``snapshot_id`` offers them
+    again in the next delta.
+
+    ``BlobRef`` values and attachment fields are resolved through the
+    store unless ``resolve_blobs`` is disabled.
+
+    When the store can cache encoded entries (``encoded_entry``) and
+    ``pre_encode`` is set, ``encoded_entries`` carries the JSON of each
+    packed entry so ``encode_prompt_package`` only has to join them. The
+    cache holds resolved content, so it is skipped when ``resolve_blobs``
+    is disabled.
+    """
+
+    candidates: List[Tuple[str, object]] = []
+    snapshot: Optional[ContextSnapshot] = None
+    removed: Optional[List[str]] = None
+    base_snapshot_id: Optional[str] = None
+    pre_encode = options.pre_encode and options.resolve_blobs
+    encoder = getattr(store, "encoded_entry", None) if pre_encode else None
+    if not options.keys or options.since_snapshot or encoder is not None:
         snapshot = store.snapshot(options.namespace)
-        for key, value in snapshot.data.items():
-            entries.append({"key": key, "value": value})
+    delta = _delta_since(store, options.since_snapshot, snapshot)
+    if delta is not None:
+        base_snapshot_id = delta.base_id
+        wanted = set(options.keys) if options.keys else None
+        assert snapshot is not None
+        for key in [*delta.added, *delta.changed]:
+            if wanted is None or key in wanted:
+                candidates.append((key, snapshot.data[key]))
+        removed = [key for key in delta.removed if wanted is None or key in wanted]
+    elif not options.keys:
+        assert snapshot is not None
+        candidates.extend(snapshot.data.items())
     else:
         for key in options.keys:
-            value = store.get(options.namespace, key)
+            if snapshot is not None:
+                value = snapshot.data.get(key)
+            else:
+                value = store.get(options.namespace, key)
             if value is not None:
-                entries.append({"key": key, "value": value})
+                candidates.append((key, value))
+    resolve: Callable[[object], object] = getattr(store, "resolve", _identity)
+    if not options.resolve_blobs:
+        resolve = _identity
+    attachments = options.attachments
+    if attachments and resolve is not _identity:
+        attachments = [
+            {name: resolve(field) for name, field in attachment.items()}
+            for attachment in attachments
+        ]
+    if options.max_tokens is None and not options.priorities:
+        package = PromptPackage(
+            session_id=options.session_id,
+            entries=[{"key": key, "value": resolve(value)} for key, value in candidates],
+            attachments=attachments,
+        )
+    else:
+        package = _pack_within_budget(store, options, candidates, attachments, resolve)
+    if snapshot is not None:
+        package.snapshot_id = snapshot.id
+        if encoder is not None:
+            package.encoded_entries = _encode_entries(
+                encoder, options.namespace, snapshot, package
+            )
+        carry_forward = getattr(store, "carry_forward", None)
+        if package.dropped and carry_forward is not None:
+            package.snapshot_id = carry_forward(snapshot, package.dropped, base_snapshot_id).id
+    package.base_snapshot_id = base_snapshot_id
+    package.removed = removed
+    return package
+
+
+def encode_prompt_package(package: PromptPackage) -> str:
+    """Serializes ``package`` to JSON, reusing pre-encoded entries where available.
+
+    The output matches ``json.dumps`` of the package fields.
+    """
+
+    fragments = package.encoded_entries
+    parts = []
+    for item in fields(package):
+        if item.name == "encoded_entries":
+            continue
+        value = getattr(package, item.name)
+        if item.name == "entries" and fragments is not None and len(fragments) == len(value):
+            encoded = "[" + ", ".join(
+                fragment if fragment is not None else json.dumps(entry)
+                for fragment, entry in zip(fragments, value)
+            ) + "]"
+        else:
+            encoded = json.dumps(value)
+        parts.append(f"{json.dumps(item.name)}: {encoded}")
+    return "{" + ", ".join(parts) + "}"
+
+
+def _encode_entries(
+    encoder: Callable[[str, str, int, Mapping[str, object]], Optional[str]],
+    namespace: str,
+    snapshot: ContextSnapshot,
+    package: PromptPackage,
+) -> List[Optional[str]]:
+    truncated = set(package.truncated or ())
+    encoded: List[Optional[str]] = []
+    for entry in package.entries:
+        key = entry["key"]
+        version = snapshot.key_versions.get(key)
+        if version is None or key in truncated:
+            encoded.append(None)
+        else:
+            encoded.append(encoder(namespace, key, version, entry))
+    return encoded
+
+
+def _blob_refs(data: Mapping[str, object]) -> Dict[str, BlobRef]:
+    return {key: value for key, value in data.items() if isinstance(value, BlobRef)}
+
+
+def _identity(value: object) -> object:
+    return value
+
+
+def _delta_since(
+    store: ContextStoreProtocol,
+    base_id: Optional[str],
+    snapshot: Optional[ContextSnapshot],
+) -> Optional[ContextDelta]:
+    diff = getattr(store, "diff", None)
+    if base_id is None or snapshot is None or diff is None:
+        return None
+    return diff(base_id, snapshot)
+
+
+def _pack_within_budget(
+    store: ContextStoreProtocol,
+    options: PromptPackOptions,
+    candidates: List[Tuple[str, object]],
+    attachments: Optional[List[Dict[str, object]]],
+    resolve: Callable[[object], object],
+) -> PromptPackage:
+    priorities = options.priorities or {}
+    key_version = getattr(store, "key_version", None)
+    cached_tokens = getattr(store, "entry_tokens", None)
+    estimator = options.token_estimator or getattr(store, "token_estimator", estimate_tokens)
+
+    def recency(key: str) -> int:
+        return key_version(options.namespace, key) if key_version else 0
+
+    def size_of(key: str, value: object) -> int:
+        if options.token_estimator is None and cached_tokens is not None:
+            tokens = cached_tokens(options.namespace, key)
+            if tokens is not None:
+                return tokens
+        return estimator(resolve(value))
+
+    ordered = sorted(candidates, key=lambda item: (-priorities.get(item[0], 0), -recency(item[0])))
+    remaining = options.max_tokens if options.max_tokens is not None else float("inf")
+    entries: List[Dict[str, object]] = []
+    dropped: List[str] = []
+    truncated: List[str] = []
+    used = 0
+    for key, value in ordered:
+        tokens = size_of(key, value)
+        if tokens > remaining and options.truncate is not None:
+            replacement = options.truncate(key, resolve(value), int(remaining))
+            if replacement is not None:
+                value, tokens = replacement, estimator(replacement)
+                if tokens <= remaining:
+                    truncated.append(key)
+        if tokens > remaining:
+            dropped.append(key)
+            continue
+        entries.append({"key": key, "value": resolve(value)})
+        remaining -= tokens
+        used += tokens
     return PromptPackage(
         session_id=options.session_id,
         entries=entries,
-        attachments=options.attachments,
+        attachments=attachments,
+        token_estimate=used,
+        dropped=dropped,
+        truncated=truncated,
     )
 
@@ -0,0 +1,457 @@
+"""Multi-process workflow execution backed by a sqlite task queue."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from .metrics import MetricsRegistry
+from .tracing import Tracer
+from .types import (
+    ContextStoreProtocol,
+    WorkflowContext,
+    WorkflowExecutionOptions,
+    WorkflowNodeDefinition,
+    WorkflowRunSummary,
+)
+from .workflow import WorkflowEngine, WorkflowStream, _maybe_await
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    assignments INTEGER NOT NULL DEFAULT 0,
+    result BLOB,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+class SqliteTaskQueue:
+    """Leased task queue shared by a coordinator and its worker processes.
+
+    A claimed task stays leased to its worker while the worker heartbeats.
+    Tasks whose lease expires, or whose worker is released, go back to the
+    queue until they have been assigned ``max_assignments`` times. The
+    connection may be used from any thread, but calls must not overlap.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def enqueue(self, task_id: str, node_id: str, payload: bytes) -> None:
+        self._conn.execute(
+            "INSERT INTO tasks (id, node_id, payload, status, created_at) "
+            "VALUES (?, ?, ?, 'queued', ?)",
+            (task_id, node_id, payload, time.time() * 1000),
+        )
+
+    def claim(self, worker_id: str, lease_ms: int) -> Optional[Tuple[str, bytes]]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT id, payload FROM tasks WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'running', worker_id = ?, lease_expires = ?, "
+                    "assignments = assignments + 1 WHERE id = ?",
+                    (worker_id, time.time() * 1000 + lease_ms, row[0]),
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return (row[0], row[1]) if row else None
+
+    def heartbeat(self, worker_id: str, lease_ms: int) -> None:
+        now = time.time() * 1000
+        self._conn.execute(
+            "INSERT INTO workers (id, pid, heartbeat_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+            (worker_id, os.getpid(), now),
+        )
+        self._conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE worker_id = ? AND status = 'running'",
+            (now + lease_ms, worker_id),
+        )
+
+    def complete(self, task_id: str, worker_id: str, status: str, result: bytes) -> bool:
+        cursor = self._conn.execute(
+            "UPDATE tasks SET status = ?, result = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (status, result, task_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        """Deletes the task and returns the worker still running it, if any."""
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT status, worker_id FROM tasks WHERE id = ?", (task_id,)
+            ).fetchone()
+            self._conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return row[1] if row and row[0] == "running" else None
+
+    def requeue_expired(self, max_assignments: int) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT DISTINCT worker_id FROM tasks WHERE status = 'running' AND lease_expires < ?",
+            (time.time() * 1000,),
+        ).fetchall()
+        for (worker_id,) in rows:
+            self.release_worker(worker_id, max_assignments, expired_only=True)
+        return [worker_id for (worker_id,) in rows]
+
+    def release_worker(
+        self, worker_id: str, max_assignments: int, expired_only: bool = False
+    ) -> None:
+        clause = "worker_id = ? AND status = 'running'"
+        params: Tuple[Any, ...] = (worker_id,)
+        if expired_only:
+            clause += " AND lease_expires < ?"
+            params += (time.time() * 1000,)
+        rows = self._conn.execute(
+            f"SELECT id, node_id, assignments FROM tasks WHERE {clause}", params
+        ).fetchall()
+        for task_id, node_id, assignments in rows:
+            if assignments >= max_assignments:
+                error = RuntimeError(
+                    f"Node {node_id} lost its worker after {assignments} assignments."
+                )
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'failed', result = ?, worker_id = NULL WHERE id = ?",
+                    (pickle.dumps(error), task_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'queued', worker_id = NULL, lease_expires = NULL "
+                    "WHERE id = ?",
+                    (task_id,),
+                )
+        self._conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def fetch_finished(self, task_ids: Iterable[str]) -> List[Tuple[str, str, bytes]]:
+        ids = list(task_ids)
+        if not ids:
+            return []
+        placeholders = ",".join("?" for _ in ids)
+        rows = self._conn.execute(
+            f"SELECT id, status, result FROM tasks "
+            f"WHERE status IN ('done', 'failed') AND id IN ({placeholders})",
+            ids,
+        ).fetchall()
+        if rows:
+            self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(row[0],) for row in rows])
+        return [(row[0], row[1], row[2]) for row in rows]
+
+
+@dataclass
+class DistributedWorkerOptions:
+    workers: int = 2
+    queue_path: Optional[str] = None
+    lease_ms: int = 10_000
+    heartbeat_ms: int = 1_000
+    poll_interval_ms: int = 20
+    max_assignments: int = 3
+    start_method: Optional[str] = "spawn"
+    context_store_factory: Optional[Callable[[], ContextStoreProtocol]] = None
+
+
+class DistributedWorkflowEngine(WorkflowEngine):
+    """``WorkflowEngine`` that runs node handlers in local worker processes.
+
+    The coordinator keeps all dependency, retry and rollback state and only
+    ships ``(run, session_id, metadata)`` to the workers through a
+    ``SqliteTaskQueue``. Workers build their own ``WorkflowContext`` around
+    a store from ``context_store_factory``, so nodes only run remotely when
+    that factory is set: it should return a store sharing state with the
+    one passed to ``run`` (pass ``InMemoryContextStore`` to accept private
+    per-worker stores whose writes never reach the coordinator). Without
+    it, every node runs in the coordinator. Handlers that cannot be
+    pickled, streaming nodes and their consumers also run in the
+    coordinator, and rollback handlers always do.
+
+    Queue access and worker management run on a dedicated coordinator
+    thread, never on the event loop. When a remote node is cancelled or
+    times out, the worker running it is terminated and replaced, because a
+    handler cannot be interrupted any other way. Workers started by ``run``
+    itself are stopped when the last concurrent run finishes. To keep them
+    across runs, call ``start``/``stop`` or use ``async with engine:``.
+    """
+
+    def __init__(
+        self,
+        options: Optional[DistributedWorkerOptions] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        super().__init__(metrics, tracer)
+        self._options = options or DistributedWorkerOptions()
+        self._queue: Optional[SqliteTaskQueue] = None
+        self._owned_dir: Optional[str] = None
+        self._processes: Dict[str, multiprocessing.process.BaseProcess] = {}
+        self._waiting: Dict[str, asyncio.Future[Tuple[str, bytes]]] = {}
+        self._poller: Optional[asyncio.Future[None]] = None
+        self._coordinator = ThreadPoolExecutor(1, thread_name_prefix="codex-coordinator")
+        self._implicit = False
+        self._active_runs = 0
+
+    async def __aenter__(self) -> "DistributedWorkflowEngine":
+        await self._in_coordinator(self.start)
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def run(
+        self,
+        nodes: Iterable[WorkflowNodeDefinition],
+        context: WorkflowContext,
+        options: Optional[WorkflowExecutionOptions] = None,
+    ) -> WorkflowRunSummary:
+        self._active_runs += 1
+        try:
+            return await super().run(nodes, context, options)
+        finally:
+            self._active_runs -= 1
+            if not self._active_runs and self._implicit:
+                await self.aclose()
+
+    async def aclose(self) -> None:
+        """Stops the poller and the workers without blocking the event loop."""
+
+        if self._poller is not None and not self._poller.done():
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+        self._implicit = False
+        await self._in_coordinator(self.stop)
+
+    def start(self) -> None:
+        if self._queue is not None:
+            return
+        path = self._options.queue_path
+        if path is None:
+            self._owned_dir = tempfile.mkdtemp(prefix="codex-workflow-")
+            path = os.path.join(self._owned_dir, "queue.sqlite3")
+        self._queue = SqliteTaskQueue(path)
+        for _ in range(max(1, self._options.workers)):
+            self._spawn_worker()
+
+    def stop(self) -> None:
+        for process in self._processes.values():
+            process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=5)
+        self._processes.clear()
+        if self._queue is not None:
+            self._queue.close()
+            self._queue = None
+        if self._owned_dir is not None:
+            shutil.rmtree(self._owned_dir, ignore_errors=True)
+            self._owned_dir = None
+
+    def worker_ids(self) -> List[str]:
+        return list(self._processes.keys())
+
+    async def _invoke(
+        self,
+        node: WorkflowNodeDefinition,
+        context: WorkflowContext,
+        outputs: List[WorkflowStream],
+    ) -> Any:
+        payload = None
+        remote = self._options.context_store_factory is not None
+        if remote and node.stream_buffer is None and not node.consumes:
+            payload = _encode_payload(node, context)
+        if payload is None:
+            return await super()._invoke(node, context, outputs)
+        if self._queue is None and await self._in_coordinator(self._start_implicitly):
+            self._implicit = True
+        task_id = str(uuid.uuid4())
+        future: asyncio.Future[Tuple[str, bytes]] = asyncio.get_running_loop().create_future()
+        self._waiting[task_id] = future
+        try:
+            await self._in_coordinator(self._enqueue, task_id, node.id, payload)
+            if self._poller is None or self._poller.done():
+                self._poller = asyncio.ensure_future(self._poll())
+            status, result = await future
+        except asyncio.CancelledError:
+            recycled = await self._in_coordinator(self._cancel_task, task_id)
+            if recycled is not None:
+                self._emit("workerRecycled", recycled)
+            raise
+        finally:
+            self._waiting.pop(task_id, None)
+        outcome = pickle.loads(result)
+        if status == "failed":
+            raise outcome
+        return outcome
+
+    async def _poll(self) -> None:
+        interval = self._options.poll_interval_ms / 1000
+        while self._waiting and self._queue is not None:
+            await asyncio.sleep(interval)
+            lost, finished = await self._in_coordinator(self._poll_queue, list(self._waiting))
+            for worker_id in lost:
+                self._emit("workerLost", worker_id)
+            for task_id, status, result in finished:
+                future = self._waiting.pop(task_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, result))
+
+    async def _in_coordinator(self, function: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._coordinator, functools.partial(function, *args))
+
+    # The methods below run on the coordinator thread.
+
+    def _start_implicitly(self) -> bool:
+        started = self._queue is None
+        self.start()
+        return started
+
+    def _enqueue(self, task_id: str, node_id: str, payload: bytes) -> None:
+        if self._queue is None:
+            raise RuntimeError("Distributed workflow engine was stopped.")
+        self._queue.enqueue(task_id, node_id, payload)
+
+    def _poll_queue(
+        self, task_ids: List[str]
+    ) -> Tuple[List[str], List[Tuple[str, str, bytes]]]:
+        if self._queue is None:
+            return [], []
+        lost = self._supervise_workers()
+        lost.extend(self._queue.requeue_expired(self._options.max_assignments))
+        return lost, self._queue.fetch_finished(task_ids)
+
+    def _cancel_task(self, task_id: str) -> Optional[str]:
+        if self._queue is None:
+            return None
+        worker_id = self._queue.cancel(task_id)
+        process = self._processes.pop(worker_id, None) if worker_id else None
+        if process is None:
+            return None
+        process.terminate()
+        process.join(timeout=5)
+        self._queue.release_worker(worker_id, self._options.max_assignments)
+        self._spawn_worker()
+        return worker_id
+
+    def _supervise_workers(self) -> List[str]:
+        assert self._queue is not None
+        lost: List[str] = []
+        for worker_id, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            process.join(timeout=0)
+            del self._processes[worker_id]
+            self._queue.release_worker(worker_id, self._options.max_assignments)
+            lost.append(worker_id)
+            self._spawn_worker()
+        return lost
+
+    def _spawn_worker(self) -> None:
+        assert self._queue is not None
+        worker_id = f"worker-{uuid.uuid4().hex[:8]}"
+        mp_context = multiprocessing.get_context(self._options.start_method)
+        process = mp_context.Process(
+            target=_worker_main,
+            args=(self._queue.path, worker_id, os.getpid(), self._options),
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+
+def _encode_payload(node: WorkflowNodeDefinition, context: WorkflowContext) -> Optional[bytes]:
+    try:
+        return pickle.dumps((node.run, context.session_id, context.metadata))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+def _worker_main(
+    queue_path: str,
+    worker_id: str,
+    parent_pid: int,
+    options: DistributedWorkerOptions,
+) -> None:
+    queue = SqliteTaskQueue(queue_path)
+    queue.heartbeat(worker_id, options.lease_ms)
+    stopped = threading.Event()
+
+    def beat() -> None:
+        beat_queue = SqliteTaskQueue(queue_path)
+        while not stopped.wait(options.heartbeat_ms / 1000):
+            beat_queue.heartbeat(worker_id, options.lease_ms)
+        beat_queue.close()
+
+    threading.Thread(target=beat, daemon=True).start()
+    assert options.context_store_factory is not None
+    store = options.context_store_factory()
+    try:
+        while os.getppid() == parent_pid:
+            claimed = queue.claim(worker_id, options.lease_ms)
+            if claimed is None:
+                time.sleep(options.poll_interval_ms / 1000)
+                continue
+            task_id, payload = claimed
+            status, result = _run_payload(payload, store)
+            queue.complete(task_id, worker_id, status, result)
+    finally:
+        stopped.set()
+        queue.close()
+
+
+def _run_payload(payload: bytes, store: ContextStoreProtocol) -> Tuple[str, bytes]:
+    try:
+        handler, session_id, metadata = pickle.loads(payload)
+        context = WorkflowContext(context_store=store, session_id=session_id, metadata=metadata)
+        value = handler(context)
+        if asyncio.iscoroutine(value) or hasattr(value, "__await__"):
+            value = asyncio.run(_maybe_await(value))
+        return "done", pickle.dumps(value)
+    except Exception as exc:  # noqa: BLE001
+        try:
+            return "failed", pickle.dumps(exc)
+        except Exception:  # noqa: BLE001
+            return "failed", pickle.dumps(RuntimeError(repr(exc)))
@@ -2,32 +2,273 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List
+import asyncio
+import contextvars
+import functools
+import inspect
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
+from .metrics import Histogram, MetricsRegistry
 from .types import IntegrationAdapter
 
 
+@dataclass
+class IntegrationPolicy:
+    """Per-adapter execution limits; every setting is off by default.
+
+    ``failure_threshold`` consecutive failures open the circuit; after
+    ``reset_timeout_ms`` up to ``half_open_max_calls`` probe calls are let
+    through, and the first probe to succeed closes it again.
+    """
+
+    max_concurrency: Optional[int] = None
+    max_waiting: Optional[int] = None
+    offload_sync: bool = False
+    timeout_ms: Optional[float] = None
+    failure_threshold: Optional[int] = None
+    reset_timeout_ms: float = 30_000
+    half_open_max_calls: int = 1
+
+
+class _AdapterRuntime:
+    __slots__ = (
+        "adapter",
+        "policy",
+        "is_async",
+        "semaphore",
+        "waiting",
+        "in_flight",
+        "state",
+        "generation",
+        "failures",
+        "opened_at",
+        "probes",
+        "calls",
+        "errors",
+        "timeouts",
+        "rejected",
+        "latency",
+    )
+
+    def __init__(self, adapter: IntegrationAdapter, policy: IntegrationPolicy) -> None:
+        self.adapter = adapter
+        self.policy = policy
+        self.is_async = inspect.iscoroutinefunction(adapter.invoke)
+        self.semaphore = (
+            asyncio.Semaphore(policy.max_concurrency) if policy.max_concurrency else None
+        )
+        self.waiting = 0
+        self.in_flight = 0
+        self.state = "closed"
+        self.generation = 0
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.latency = Histogram()
+
+    def admit(self) -> Optional[str]:
+        """Returns a rejection reason, or ``None`` and reserves a probe when half-open.
+
+        Admitted calls read ``generation`` straight after and hand it back with
+        their outcome; ``generation`` changes on every breaker transition, so
+        outcomes of calls admitted before the last transition leave the
+        breaker alone.
+        """
+
+        if self.state == "open":
+            if (time.monotonic() - self.opened_at) * 1000 < self.policy.reset_timeout_ms:
+                return "circuit open"
+            self._transition("half_open")
+            self.probes = 0
+        if self.state == "half_open":
+            if self.probes >= self.policy.half_open_max_calls:
+                return "circuit half-open"
+            self.probes += 1
+        if (
+            self.semaphore is not None
+            and self.semaphore.locked()
+            and self.policy.max_waiting is not None
+            and self.waiting >= self.policy.max_waiting
+        ):
+            return "concurrency limit reached"
+        return None
+
+    def succeeded(self, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self.failures = 0
+        if self.state == "half_open":
+            self._transition("closed")
+
+    def failed(self, generation: int) -> None:
+        self.errors += 1
+        if generation != self.generation:
+            return
+        self.failures += 1
+        threshold = self.policy.failure_threshold
+        if self.state == "half_open" or (threshold and self.failures >= threshold):
+            self._transition("open")
+            self.opened_at = time.monotonic()
+
+    def abandoned(self, generation: int) -> None:
+        """Returns the probe of a call that ended without an outcome."""
+
+        if generation == self.generation and self.state == "half_open":
+            self.probes -= 1
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency_p50_ms": self.latency.quantile(0.5),
+            "latency_p99_ms": self.latency.quantile(0.99),
+        }
+
+
 class IntegrationHost:
-    def __init__(self) -> None:
-        self._adapters: Dict[str, IntegrationAdapter] = {}
+    """Registers adapters and invokes them under their ``IntegrationPolicy``.
+
+    A policy can cap concurrent calls (a bulkhead, optionally rejecting once
+    ``max_waiting`` callers queue), run synchronous adapters on ``executor``
+    instead of the event loop, bound each call with a timeout and trip a
+    circuit breaker. Rejected calls raise ``RuntimeError`` and timeouts raise
+    ``asyncio.TimeoutError``; an offloaded call that times out keeps its
+    worker thread until the adapter returns.
+    """
 
-    def register(self, adapter: IntegrationAdapter) -> None:
+    def __init__(
+        self,
+        default_policy: Optional[IntegrationPolicy] = None,
+        executor: Optional[Executor] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self._adapters: Dict[str, _AdapterRuntime] = {}
+        self._default_policy = default_policy or IntegrationPolicy()
+        self._executor = executor
+        self._metrics = metrics
+
+    def register(
+        self, adapter: IntegrationAdapter, policy: Optional[IntegrationPolicy] = None
+    ) -> None:
         if adapter.name in self._adapters:
             raise ValueError(f"Adapter {adapter.name} already registered.")
-        self._adapters[adapter.name] = adapter
+        self._adapters[adapter.name] = _AdapterRuntime(adapter, policy or self._default_policy)
 
     def unregister(self, name: str) -> None:
         self._adapters.pop(name, None)
 
     def list(self) -> List[IntegrationAdapter]:
-        return list(self._adapters.values())
+        return [runtime.adapter for runtime in self._adapters.values()]
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Returns call, error, timeout, rejection and latency figures per adapter."""
+
+        return {
+            adapter_name: runtime.stats()
+            for adapter_name, runtime in self._adapters.items()
+            if name is None or adapter_name == name
+        }
 
     async def invoke(self, name: str, args: Any) -> Any:
-        adapter = self._adapters.get(name)
-        if not adapter:
+        runtime = self._adapters.get(name)
+        if not runtime:
             raise KeyError(f"Unknown adapter {name}.")
-        result = adapter.invoke(args)
+        reason = runtime.admit()
+        if reason is not None:
+            runtime.rejected += 1
+            self._record(name, "rejected")
+            raise RuntimeError(f"Adapter {name} rejected call: {reason}.")
+        generation = runtime.generation
+        if runtime.semaphore is None:
+            return await self._call(name, runtime, args, generation)
+        runtime.waiting += 1
+        try:
+            await runtime.semaphore.acquire()
+        except BaseException:
+            runtime.abandoned(generation)
+            raise
+        finally:
+            runtime.waiting -= 1
+        try:
+            return await self._call(name, runtime, args, generation)
+        finally:
+            runtime.semaphore.release()
+
+    async def _call(self, name: str, runtime: _AdapterRuntime, args: Any, generation: int) -> Any:
+        runtime.calls += 1
+        runtime.in_flight += 1
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            result = await self._run(runtime, args)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            runtime.abandoned(generation)
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            runtime.timeouts += 1
+            runtime.failed(generation)
+            raise
+        except Exception:
+            outcome = "error"
+            runtime.failed(generation)
+            raise
+        else:
+            runtime.succeeded(generation)
+            return result
+        finally:
+            runtime.in_flight -= 1
+            elapsed = (time.perf_counter() - started) * 1000
+            runtime.latency.observe(elapsed)
+            self._record(name, outcome, elapsed)
+
+    async def _run(self, runtime: _AdapterRuntime, args: Any) -> Any:
+        timeout_ms = runtime.policy.timeout_ms
+        invoke = runtime.adapter.invoke
+        if runtime.is_async or not runtime.policy.offload_sync:
+            result = invoke(args)
+            if not hasattr(result, "__await__"):
+                return result
+        else:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(contextvars.copy_context().run, invoke, args)
+            result = loop.run_in_executor(self._executor, call)
+        if timeout_ms is None:
+            result = await result
+        else:
+            result = await asyncio.wait_for(result, timeout_ms / 1000)
         if hasattr(result, "__await__"):
-            return await result  # type: ignore[return-value]
+            return await result
         return result
 
+    def _record(self, name: str, outcome: str, elapsed: Optional[float] = None) -> None:
+        if self._metrics is None:
+            return
+        self._metrics.counter(
+            "integration_calls_total",
+            "Integration adapter calls by outcome.",
+            {"adapter": name, "outcome": outcome},
+        ).inc()
+        if elapsed is not None:
+            self._metrics.histogram(
+                "integration_duration_ms",
+                "Integration adapter call latency in milliseconds.",
+                {"adapter": name},
+            ).observe(elapsed)
@@ -6,20 +6,41 @@ import threading
 import time
 import uuid
 from collections import defaultdict
+from contextlib import nullcontext
 from typing import Callable, Dict, Iterable, List, MutableMapping, Optional, Set
 
+from .metrics import MetricsRegistry
+from .tracing import Tracer, activate, extract, inject
 from .types import AgentId, MessageEnvelope, SessionRecord
 
 MessageHandler = Callable[[MessageEnvelope], None]
 
 
 class MessageBus:
-    """Simple in-memory pub/sub message bus."""
+    """Simple in-memory pub/sub message bus.
 
-    def __init__(self) -> None:
+    The active trace context is stamped into each envelope's ``headers``
+    and restored around its handlers; with a ``tracer``, every delivery is
+    also recorded as a ``bus.dispatch`` span.
+    """
+
+    def __init__(
+        self, metrics: Optional[MetricsRegistry] = None, tracer: Optional[Tracer] = None
+    ) -> None:
         self._topics: MutableMapping[str, Set[MessageHandler]] = defaultdict(set)
         self._direct: MutableMapping[AgentId, Set[MessageHandler]] = defaultdict(set)
         self._lock = threading.RLock()
+        self._metrics = metrics
+        self._tracer = tracer
+        if metrics is not None:
+            self._dispatch_latency = {
+                kind: metrics.histogram(
+                    "bus_dispatch_duration_ms",
+                    "Time spent delivering a message to its handlers.",
+                    {"type": kind},
+                )
+                for kind in ("broadcast", "direct")
+            }
 
     def publish(self, topic: str, payload: object, session_id: str | None = None) -> MessageEnvelope:
         envelope = MessageEnvelope(
@@ -29,6 +50,7 @@ class MessageBus:
             session_id=session_id,
             type="broadcast",
             timestamp=time.time() * 1000,
+            headers=inject(),
         )
         self._dispatch(topic, envelope)
         return envelope
@@ -41,6 +63,7 @@ class MessageBus:
             session_id=session_id,
             type="direct",
             timestamp=time.time() * 1000,
+            headers=inject(),
         )
         self._dispatch_direct(agent_id, envelope)
         return envelope
@@ -67,20 +90,39 @@ class MessageBus:
                     self._direct.pop(topic, None)
 
     def _dispatch(self, topic: str, message: MessageEnvelope) -> None:
-        for handler in list(self._topics.get(topic, set())):
-            handler(message)
+        self._deliver(list(self._topics.get(topic, set())), message)
 
     def _dispatch_direct(self, agent_id: AgentId, message: MessageEnvelope) -> None:
-        for handler in list(self._direct.get(agent_id, set())):
-            handler(message)
+        self._deliver(list(self._direct.get(agent_id, set())), message)
+
+    def _deliver(self, handlers: List[MessageHandler], message: MessageEnvelope) -> None:
+        if self._metrics is not None:
+            started = time.perf_counter()
+        parent = extract(message.headers) if message.headers else None
+        if self._tracer is not None:
+            scope = self._tracer.span(
+                "bus.dispatch", {"topic": message.topic, "type": message.type}, parent=parent
+            )
+        else:
+            scope = activate(parent) if parent is not None else nullcontext()
+        with scope:
+            for handler in handlers:
+                handler(message)
+        if self._metrics is not None:
+            latency = self._dispatch_latency[message.type]
+            latency.observe((time.perf_counter() - started) * 1000)
 
 
 class SessionStore:
     """Session metadata and context storage."""
 
-    def __init__(self) -> None:
+    def __init__(self, metrics: Optional[MetricsRegistry] = None) -> None:
         self._sessions: Dict[str, SessionRecord] = {}
         self._lock = threading.RLock()
+        if metrics is not None:
+            metrics.gauge(
+                "sessions", "Sessions currently held by the store.", function=self._count
+            )
 
     def create(self, ttl_ms: Optional[int] = None, seed_context: Optional[Dict[str, object]] = None) -> SessionRecord:
         session_id = str(uuid.uuid4())
@@ -139,6 +181,10 @@ class SessionStore:
         with self._lock:
             return list(self._sessions.values())
 
+    def _count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
     def _require(self, session_id: str) -> SessionRecord:
         session = self.get(session_id)
         if not session:
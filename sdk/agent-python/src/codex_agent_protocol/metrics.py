@@ -0,0 +1,235 @@
+"""Counters, gauges and latency histograms with Prometheus text export."""
+
+from __future__ import annotations
+
+import math
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_SUB_BUCKETS = 8
+MetricT = TypeVar("MetricT")
+
+
+class Counter:
+    __slots__ = ("value", "_lock", "_function")
+
+    def __init__(self, function: Optional[Callable[[], float]] = None) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+        self._function = function
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def read(self) -> float:
+        return self._function() if self._function is not None else self.value
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class Histogram:
+    """Log-linear histogram: each power of two is split into equal sub-buckets.
+
+    Recording is one ``frexp`` and a dict increment; relative bucket error
+    stays below ``1 / sub_buckets`` across the whole value range.
+    """
+
+    __slots__ = ("count", "sum", "_buckets", "_zero", "_lock", "_sub")
+
+    def __init__(self, sub_buckets: int = _SUB_BUCKETS) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self._buckets: Dict[int, int] = {}
+        self._zero = 0
+        self._lock = threading.Lock()
+        self._sub = sub_buckets
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            if value <= 0:
+                self._zero += 1
+                return
+            mantissa, exponent = math.frexp(value)
+            index = exponent * self._sub + int((mantissa - 0.5) * 2 * self._sub)
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def upper_bound(self, index: int) -> float:
+        exponent, step = divmod(index, self._sub)
+        return math.ldexp(0.5 + (step + 1) / (2 * self._sub), exponent)
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Returns ``(upper_bound, cumulative_count)`` pairs for non-empty buckets."""
+
+        with self._lock:
+            items = sorted(self._buckets.items())
+            running = self._zero
+        result = [(0.0, running)] if running else []
+        for index, count in items:
+            running += count
+            result.append((self.upper_bound(index), running))
+        return result
+
+    def quantile(self, q: float) -> float:
+        buckets = self.buckets()
+        if not buckets:
+            return 0.0
+        target = q * buckets[-1][1]
+        for bound, cumulative in buckets:
+            if cumulative >= target:
+                return bound
+        return buckets[-1][0]
+
+
+class MetricsRegistry:
+    """Named metrics, optionally labelled, rendered in Prometheus text format.
+
+    SDK components take an optional registry and skip all measurement when
+    none is given. Counters and gauges created with ``function`` are read
+    at collection time instead of being updated on the hot path. Asking
+    again for an existing series returns it, except that a ``function``
+    series cannot be registered twice: that raises ``ValueError`` rather
+    than silently dropping the second source, so two components reporting
+    the same series need registries of their own.
+    """
+
+    def __init__(self, prefix: str = "codex_") -> None:
+        self._prefix = prefix
+        self._metrics: Dict[str, Tuple[str, str, Dict[LabelKey, object]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(
+        self,
+        name: str,
+        help: str = "",
+        labels: Optional[Dict[str, str]] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Counter:
+        return self._get(name, "counter", help, labels, lambda: Counter(function), function)
+
+    def gauge(
+        self,
+        name: str,
+        help: str = "",
+        labels: Optional[Dict[str, str]] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Gauge:
+        return self._get(name, "gauge", help, labels, lambda: Gauge(function), function)
+
+    def histogram(
+        self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None
+    ) -> Histogram:
+        return self._get(name, "histogram", help, labels, Histogram)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = [
+                (name, kind, doc, dict(series))
+                for name, (kind, doc, series) in self._metrics.items()
+            ]
+        for name, kind, doc, series in sorted(metrics):
+            full = self._prefix + name
+            if doc:
+                lines.append(f"# HELP {full} {doc}")
+            lines.append(f"# TYPE {full} {kind}")
+            for labels, metric in sorted(series.items()):
+                lines.extend(_render_series(full, labels, metric))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically writes the current snapshot, e.g. for node_exporter's textfile collector."""
+
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        with os.fdopen(handle, "w") as output:
+            output.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+    def serve_prometheus(self, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serves ``/metrics`` from a daemon thread; call ``shutdown()`` on the result to stop."""
+
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                return
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="codex-metrics", daemon=True).start()
+        return server
+
+    def _get(
+        self,
+        name: str,
+        kind: str,
+        help: str,
+        labels: Optional[Dict[str, str]],
+        factory: Callable[[], MetricT],
+        function: Optional[Callable[[], float]] = None,
+    ) -> MetricT:
+        key: LabelKey = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            entry = self._metrics.get(name)
+            if entry is None:
+                entry = self._metrics[name] = (kind, help, {})
+            elif entry[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {entry[0]}.")
+            series = entry[2]
+            metric = series.get(key)
+            if metric is None:
+                metric = series[key] = factory()
+            elif function is not None:
+                raise ValueError(f"Metric {name}{_format_labels(key)} is already registered.")
+            return metric  # type: ignore[return-value]
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [*labels, extra] if extra is not None else list(labels)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _render_series(name: str, labels: LabelKey, metric: object) -> Iterator[str]:
+    if isinstance(metric, Histogram):
+        buckets = metric.buckets()
+        for bound, cumulative in buckets:
+            yield f"{name}_bucket{_format_labels(labels, ('le', repr(bound)))} {cumulative}"
+        yield f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {metric.count}"
+        yield f"{name}_sum{_format_labels(labels)} {metric.sum}"
+        yield f"{name}_count{_format_labels(labels)} {metric.count}"
+    else:
+        assert isinstance(metric, Counter)
+        yield f"{name}{_format_labels(labels)} {metric.read()}"
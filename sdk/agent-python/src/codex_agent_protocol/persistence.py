@@ -0,0 +1,185 @@
+"""Disk-backed context storage."""
+
+from __future__ import annotations
+
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, List, Tuple
+
+from .types import ContextSnapshot, ContextStoreProtocol
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS context_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS context_namespaces (
+    namespace TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+_DELETED = object()
+
+
+class SqliteContextStore(ContextStoreProtocol):
+    """``ContextStoreProtocol`` implementation persisted in a sqlite database.
+
+    Entries live in one WAL-mode table keyed by ``(namespace, key)`` and are
+    pickled, so only trusted processes should share a database file. Writes
+    are buffered and committed in batches of ``batch_size`` (and before any
+    read that needs the database); recently used entries stay in an LRU of
+    ``cache_size`` items. ``prefetch`` loads a whole namespace into the
+    cache, which is what ``snapshot`` uses.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024, batch_size: int = 64) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+        self._cache_size = cache_size
+        self._batch_size = max(1, batch_size)
+        self._pending: Dict[Tuple[str, str], Tuple[object, int]] = {}
+        row = self._conn.execute("SELECT MAX(version) FROM context_namespaces").fetchone()
+        self._version = row[0] or 0
+
+    def set(self, namespace: str, key: str, value: object) -> None:  # type: ignore[override]
+        with self._lock:
+            self._version += 1
+            self._pending[(namespace, key)] = (value, self._version)
+            self._remember((namespace, key), value)
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def get(self, namespace: str, key: str) -> object | None:  # type: ignore[override]
+        with self._lock:
+            pending = self._pending.get((namespace, key))
+            if pending is not None:
+                return None if pending[0] is _DELETED else pending[0]
+            cached = self._cache.get((namespace, key), _DELETED)
+            if cached is not _DELETED:
+                self._cache.move_to_end((namespace, key))
+                return cached
+            row = self._conn.execute(
+                "SELECT value FROM context_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            value = pickle.loads(row[0])
+            self._remember((namespace, key), value)
+            return value
+
+    def delete(self, namespace: str, key: str) -> None:  # type: ignore[override]
+        with self._lock:
+            self._version += 1
+            self._pending[(namespace, key)] = (_DELETED, self._version)
+            self._cache.pop((namespace, key), None)
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def prefetch(self, namespace: str) -> Dict[str, object]:
+        """Loads every entry of ``namespace`` into the hot cache and returns them."""
+
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT key, value FROM context_entries WHERE namespace = ? ORDER BY version",
+                (namespace,),
+            ).fetchall()
+            data = {key: pickle.loads(value) for key, value in rows}
+            for key, value in data.items():
+                self._remember((namespace, key), value)
+            return data
+
+    def snapshot(self, namespace: str) -> ContextSnapshot:  # type: ignore[override]
+        with self._lock:
+            data = self.prefetch(namespace)
+            version = self.version(namespace)
+        return ContextSnapshot(
+            id=str(uuid.uuid4()),
+            created_at=time.time() * 1000,
+            data=MappingProxyType(data),
+            version=version,
+            namespace=namespace,
+        )
+
+    def version(self, namespace: str) -> int:
+        with self._lock:
+            self.flush()
+            row = self._conn.execute(
+                "SELECT version FROM context_namespaces WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            return row[0] if row else 0
+
+    def list_namespaces(self) -> List[str]:
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute("SELECT DISTINCT namespace FROM context_entries").fetchall()
+            return [row[0] for row in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._cache.clear()
+            self._conn.execute("DELETE FROM context_entries")
+            self._conn.execute("DELETE FROM context_namespaces")
+
+    def flush(self) -> None:
+        """Commits buffered writes in a single transaction."""
+
+        with self._lock:
+            if not self._pending:
+                return
+            upserts = []
+            deletes = []
+            versions: Dict[str, int] = {}
+            for (namespace, key), (value, version) in self._pending.items():
+                versions[namespace] = max(version, versions.get(namespace, 0))
+                if value is _DELETED:
+                    deletes.append((namespace, key))
+                else:
+                    upserts.append((namespace, key, pickle.dumps(value), version))
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO context_entries (namespace, key, value, version) "
+                    "VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+                self._conn.executemany(
+                    "DELETE FROM context_entries WHERE namespace = ? AND key = ?", deletes
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO context_namespaces (namespace, version) VALUES (?, ?)",
+                    versions.items(),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def _remember(self, cache_key: Tuple[str, str], value: object) -> None:
+        if self._cache_size <= 0:
+            return
+        self._cache[cache_key] = value
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
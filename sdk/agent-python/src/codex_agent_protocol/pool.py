@@ -0,0 +1,182 @@
+"""Agent instance pools."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar, Union
+
+from .agent_registry import AgentRegistry
+from .types import AgentDefinition, AgentId, AgentStatus
+
+T = TypeVar("T")
+InstanceHook = Callable[[AgentId], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class AgentPoolOptions:
+    min_instances: int = 0
+    max_instances: Optional[int] = None
+    per_instance_concurrency: int = 1
+    idle_timeout_ms: float = 30_000
+    on_start: Optional[InstanceHook] = None
+    on_stop: Optional[InstanceHook] = None
+
+
+class AgentPool:
+    """Runs work on up to ``max_instances`` registered instances of one definition.
+
+    Instances are registered as ``<id>#<n>`` with ``metadata["pool"]`` set
+    to the definition id, and are ``RUNNING`` while busy and ``IDLE``
+    otherwise. ``submit`` hands work to the least-loaded instance with spare
+    capacity, starts a new instance when all are busy and the pool is below
+    its limit, and otherwise queues the work in arrival order. Instances
+    idle for ``idle_timeout_ms`` are retired down to ``min_instances``.
+    Singleton definitions never get more than one instance; otherwise the
+    limit is ``definition.max_instances``, which the options can only lower.
+    """
+
+    def __init__(
+        self,
+        registry: AgentRegistry,
+        definition: AgentDefinition,
+        options: Optional[AgentPoolOptions] = None,
+    ) -> None:
+        self._registry = registry
+        self._definition = definition
+        self._options = options or AgentPoolOptions()
+        limits = [
+            limit for limit in (self._options.max_instances, definition.max_instances) if limit
+        ]
+        limit = min(limits) if limits else 1
+        self._max = 1 if definition.singleton else max(1, limit)
+        self._capacity = max(1, self._options.per_instance_concurrency)
+        self._load: Dict[AgentId, int] = {}
+        self._idle_timers: Dict[AgentId, asyncio.TimerHandle] = {}
+        self._waiters: Deque[asyncio.Future[AgentId]] = deque()
+        self._next_index = 0
+
+    @property
+    def max_instances(self) -> int:
+        return self._max
+
+    async def start(self) -> None:
+        """Starts ``min_instances`` instances up front."""
+
+        while len(self._load) < min(self._options.min_instances, self._max):
+            self._release(await self._spawn())
+
+    async def submit(self, work: Callable[[AgentId], Union[T, Awaitable[T]]]) -> T:
+        """Runs ``work(instance_id)`` on a pooled instance and returns its result."""
+
+        instance_id = await self._acquire()
+        try:
+            result = work(instance_id)
+            if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+                return await result
+            return result  # type: ignore[return-value]
+        finally:
+            self._release(instance_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "instances": len(self._load),
+            "busy": sum(1 for load in self._load.values() if load),
+            "in_flight": sum(self._load.values()),
+            "queued": len(self._waiters),
+        }
+
+    async def close(self) -> None:
+        """Retires idle instances; busy ones are retired when their work finishes."""
+
+        self._max = 0
+        for instance_id in [i for i, load in self._load.items() if not load]:
+            await self._retire(instance_id, force=True)
+
+    async def _acquire(self) -> AgentId:
+        candidates = [item for item in self._load.items() if item[1] < self._capacity]
+        if candidates:
+            instance_id = min(candidates, key=lambda item: item[1])[0]
+            self._claim(instance_id)
+            return instance_id
+        if len(self._load) < self._max:
+            return await self._spawn()
+        if self._max == 0:
+            raise RuntimeError(f"Agent pool {self._definition.id} is closed.")
+        waiter: asyncio.Future[AgentId] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(waiter.result())
+            raise
+
+    async def _spawn(self) -> AgentId:
+        self._next_index += 1
+        instance_id = f"{self._definition.id}#{self._next_index}"
+        self._load[instance_id] = 1
+        metadata = {**(self._definition.metadata or {}), "pool": self._definition.id}
+        self._registry.register(
+            replace(self._definition, id=instance_id, singleton=False, metadata=metadata)
+        )
+        self._registry.set_status(instance_id, AgentStatus.RUNNING)
+        try:
+            await _call_hook(self._options.on_start, instance_id)
+        except BaseException:
+            self._load.pop(instance_id, None)
+            self._registry.unregister(instance_id)
+            raise
+        return instance_id
+
+    def _claim(self, instance_id: AgentId) -> None:
+        timer = self._idle_timers.pop(instance_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._load[instance_id] += 1
+        if self._load[instance_id] == 1:
+            self._registry.set_status(instance_id, AgentStatus.RUNNING)
+
+    def _release(self, instance_id: AgentId) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(instance_id)
+                return
+        self._load[instance_id] -= 1
+        if self._load[instance_id]:
+            return
+        self._registry.set_status(instance_id, AgentStatus.IDLE)
+        loop = asyncio.get_running_loop()
+        if len(self._load) > self._max:
+            loop.create_task(self._retire(instance_id, force=True))
+            return
+        self._idle_timers[instance_id] = loop.call_later(
+            self._options.idle_timeout_ms / 1000,
+            lambda: loop.create_task(self._retire(instance_id)),
+        )
+
+    async def _retire(self, instance_id: AgentId, force: bool = False) -> None:
+        if self._load.get(instance_id) != 0:
+            return
+        if not force and len(self._load) <= self._options.min_instances:
+            return
+        timer = self._idle_timers.pop(instance_id, None)
+        if timer is not None:
+            timer.cancel()
+        del self._load[instance_id]
+        self._registry.set_status(instance_id, AgentStatus.STOPPED)
+        try:
+            await _call_hook(self._options.on_stop, instance_id)
+        finally:
+            self._registry.unregister(instance_id)
+
+
+async def _call_hook(hook: Optional[InstanceHook], instance_id: AgentId) -> Any:
+    if hook is None:
+        return None
+    result = hook(instance_id)
+    if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+        return await result
+    return result
@@ -8,12 +8,16 @@ import queue
 import signal
 import subprocess
 import threading
+import time
 import uuid
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional
 
-from .types import CodexCommand, CodexResult, ProcessLaunchOptions
+from .context import encode_prompt_package
+from .metrics import MetricsRegistry
+from .tracing import TRACEPARENT, Tracer, inject
+from .types import CodexCommand, CodexResult, ProcessLaunchOptions, PromptPackage
 
 SupervisorHandler = Callable[..., None]
 
@@ -122,6 +126,8 @@ class CodexClientOptions:
     max_restarts: int = 5
     backoff_ms: int = 1000
     response_timeout_ms: int = 30_000
+    metrics: Optional[MetricsRegistry] = None
+    tracer: Optional[Tracer] = None
 
 
 class CodexClient:
@@ -143,6 +149,17 @@ class CodexClient:
         }
         self._reader_thread: Optional[threading.Thread] = None
         self._reader_lock = threading.RLock()
+        metrics = self._options.metrics
+        if metrics is not None:
+            self._exec_latency = metrics.histogram(
+                "exec_duration_ms", "Codex CLI request latency in milliseconds."
+            )
+            self._exec_outcomes = {
+                outcome: metrics.counter(
+                    "exec_total", "Codex CLI requests by outcome.", {"outcome": outcome}
+                )
+                for outcome in ("ok", "error", "timeout")
+            }
 
         self._supervisor.on("started", self._attach_child)
         self._supervisor.on(
@@ -166,22 +183,44 @@ class CodexClient:
         self._stopping = False
 
     def exec(self, command: CodexCommand) -> CodexResult:
+        """Sends ``command`` and waits for its result.
+
+        The active trace context travels in the request's ``traceparent``
+        field; with a ``tracer`` configured the call is a ``codex.exec`` span.
+        """
+
+        if self._options.tracer is None:
+            return self._exec(command)
+        with self._options.tracer.span("codex.exec", {"op": command.op}) as span:
+            result = self._exec(command)
+            if not result.ok:
+                span.error = str(result.error)
+            return result
+
+    def _exec(self, command: CodexCommand) -> CodexResult:
         if not self._supervisor.is_running():
             self.start()
         child = self._supervisor.get_child()
         if not child or not child.stdin:
             raise RuntimeError("Codex CLI process is not available.")
         request_id = str(uuid.uuid4())
-        payload = json.dumps({"id": request_id, **command.__dict__})
+        started = time.perf_counter() if self._options.metrics is not None else 0.0
+        payload = self._encode_request(request_id, command)
         result_queue: queue.Queue[CodexResult] = queue.Queue(maxsize=1)
         self._pending[request_id] = result_queue
         child.stdin.write(payload + "\n")
         child.stdin.flush()
         try:
-            return result_queue.get(timeout=(command.timeout_ms or self._response_timeout) / 1000)
+            result = result_queue.get(timeout=(command.timeout_ms or self._response_timeout) / 1000)
         except queue.Empty as exc:
             self._pending.pop(request_id, None)
+            if self._options.metrics is not None:
+                self._exec_outcomes["timeout"].inc()
             raise TimeoutError("Codex CLI response timed out.") from exc
+        if self._options.metrics is not None:
+            self._exec_latency.observe((time.perf_counter() - started) * 1000)
+            self._exec_outcomes["ok" if result.ok else "error"].inc()
+        return result
 
     def on(self, event: str, handler: Callable[..., None]) -> None:
         self._handlers[event].append(handler)
@@ -262,6 +301,25 @@ class CodexClient:
         for handler in list(self._handlers.get(event, [])):
             handler(*args)
 
+    @staticmethod
+    def _encode_request(request_id: str, command: CodexCommand) -> str:
+        args = command.args
+        trace = inject()
+        if not args or not any(isinstance(value, PromptPackage) for value in args.values()):
+            if trace is not None:
+                return json.dumps({"id": request_id, **command.__dict__, **trace})
+            return json.dumps({"id": request_id, **command.__dict__})
+        encoded_args = ", ".join(
+            f"{json.dumps(name)}: {_encode_arg(value)}" for name, value in args.items()
+        )
+        parts = [f'"id": {json.dumps(request_id)}']
+        for name, value in command.__dict__.items():
+            encoded = "{" + encoded_args + "}" if name == "args" else json.dumps(value)
+            parts.append(f"{json.dumps(name)}: {encoded}")
+        if trace is not None:
+            parts.append(f"{json.dumps(TRACEPARENT)}: {json.dumps(trace[TRACEPARENT])}")
+        return "{" + ", ".join(parts) + "}"
+
     def _coerce_error(self, error: Any) -> Exception:
         if isinstance(error, Exception):
             return error
@@ -296,3 +354,8 @@ class CodexClient:
             return node_modules
         return base_dir / cls.DEFAULT_RELATIVE_CLI_PATH
 
+
+def _encode_arg(value: object) -> str:
+    if isinstance(value, PromptPackage):
+        return encode_prompt_package(value)
+    return json.dumps(value)
@@ -0,0 +1,179 @@
+"""Workflow run profiling and trace export."""
+
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .types import WorkflowNodeTiming, WorkflowRunSummary
+
+
+def realized_critical_path(
+    timings: Mapping[str, WorkflowNodeTiming],
+    predecessors: Mapping[str, List[str]],
+) -> List[str]:
+    """Walks back from the last node to finish through its latest-finishing predecessors."""
+
+    finished = {
+        node_id: timing
+        for node_id, timing in timings.items()
+        if timing.started_at is not None and timing.finished_at is not None
+    }
+    if not finished:
+        return []
+    current = max(finished, key=lambda node_id: finished[node_id].finished_at or 0.0)
+    path = [current]
+    while True:
+        candidates = [node_id for node_id in predecessors.get(current, []) if node_id in finished]
+        if not candidates:
+            break
+        current = max(candidates, key=lambda node_id: finished[node_id].finished_at or 0.0)
+        path.append(current)
+    path.reverse()
+    return path
+
+
+def slot_utilization(summary: WorkflowRunSummary, concurrency: int) -> Optional[float]:
+    """Fraction of the run's worker slots spent executing nodes.
+
+    The window ends when the last node execution does, so rollback is not
+    counted. Stream consumers run outside ``concurrency``, so the slot count
+    is the larger of ``concurrency`` and the peak number of overlapping
+    executions, which keeps the result within ``[0, 1]``.
+    """
+
+    if summary.finished_at is None:
+        return None
+    spans = [
+        (timing.started_at, timing.finished_at)
+        for timing in summary.timings.values()
+        if timing.started_at is not None and timing.finished_at is not None
+    ]
+    if not spans:
+        return None
+    wall_ms = max(end for _, end in spans) - summary.started_at
+    if wall_ms <= 0:
+        return None
+    busy_ms = sum(end - start for start, end in spans)
+    return busy_ms / (max(1, concurrency, _peak_overlap(spans)) * wall_ms)
+
+
+def _peak_overlap(spans: List[Tuple[float, float]]) -> int:
+    edges = sorted([(start, 1) for start, _ in spans] + [(end, -1) for _, end in spans])
+    peak = active = 0
+    for _, delta in edges:
+        active += delta
+        peak = max(peak, active)
+    return peak
+
+
+def chrome_trace(summary: WorkflowRunSummary) -> Dict[str, Any]:
+    """Builds a Chrome trace event document (also accepted by Perfetto)."""
+
+    events: List[Dict[str, Any]] = [
+        {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "workflow"}},
+        {"name": "process_name", "ph": "M", "pid": 2, "args": {"name": "rollback"}},
+    ]
+    executions = [
+        (node_id, timing.started_at, timing.finished_at)
+        for node_id, timing in summary.timings.items()
+        if timing.started_at is not None and timing.finished_at is not None
+    ]
+    for node_id, lane, start, end in _assign_lanes(executions):
+        timing = summary.timings[node_id]
+        queue_wait_ms = start - timing.ready_at if timing.ready_at is not None else None
+        events.append(
+            _complete_event(
+                summary,
+                node_id,
+                "node",
+                1,
+                lane,
+                start,
+                end,
+                {
+                    "status": _status(summary, node_id),
+                    "attempts": timing.attempts,
+                    "queue_wait_ms": queue_wait_ms,
+                    "retry_sleep_ms": timing.retry_sleep_ms,
+                },
+            )
+        )
+    rollbacks = [
+        (node_id, timing.rollback_started_at, timing.rollback_finished_at)
+        for node_id, timing in summary.timings.items()
+        if timing.rollback_started_at is not None and timing.rollback_finished_at is not None
+    ]
+    for node_id, lane, start, end in _assign_lanes(rollbacks):
+        status = "failed" if node_id in summary.rollback_failed else "rolled_back"
+        events.append(
+            _complete_event(summary, node_id, "rollback", 2, lane, start, end, {"status": status})
+        )
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "critical_path": summary.critical_path,
+            "utilization": summary.utilization,
+        },
+    }
+
+
+def write_chrome_trace(summary: WorkflowRunSummary, directory: str) -> str:
+    """Writes the run's Chrome trace into ``directory`` and returns the file path."""
+
+    os.makedirs(directory, exist_ok=True)
+    filename = f"workflow-{int(summary.started_at)}-{uuid.uuid4().hex[:8]}.json"
+    path = os.path.join(directory, filename)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(chrome_trace(summary), handle, default=str)
+    return path
+
+
+def _assign_lanes(
+    spans: List[Tuple[str, Any, Any]],
+) -> List[Tuple[str, int, float, float]]:
+    lane_ends: List[float] = []
+    assigned: List[Tuple[str, int, float, float]] = []
+    for node_id, start, end in sorted(spans, key=lambda span: span[1]):
+        for lane, lane_end in enumerate(lane_ends):
+            if lane_end <= start:
+                lane_ends[lane] = end
+                break
+        else:
+            lane = len(lane_ends)
+            lane_ends.append(end)
+        assigned.append((node_id, lane, start, end))
+    return assigned
+
+
+def _complete_event(
+    summary: WorkflowRunSummary,
+    name: str,
+    category: str,
+    pid: int,
+    tid: int,
+    start: float,
+    end: float,
+    args: Dict[str, Any],
+) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "pid": pid,
+        "tid": tid,
+        "ts": (start - summary.started_at) * 1000,
+        "dur": (end - start) * 1000,
+        "args": args,
+    }
+
+
+def _status(summary: WorkflowRunSummary, node_id: str) -> str:
+    if node_id in summary.failed:
+        return "failed"
+    if node_id in summary.cancelled:
+        return "cancelled"
+    return "completed"
@@ -3,66 +3,238 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, Iterable
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
-from .types import Capability, SecurityDescriptor
+from .types import (
+    AuthorizationPlan,
+    AuthorizationToken,
+    Capability,
+    CapabilityMask,
+    SecurityDescriptor,
+)
+
+_TERMINAL = ""
+
+
+class _CompiledPolicy:
+    """Descriptor with its allow lists resolved once at registration."""
+
+    __slots__ = ("descriptor", "mask", "generation", "fs_trie", "exec_set")
+
+    def __init__(self, descriptor: SecurityDescriptor) -> None:
+        self.descriptor = descriptor
+        self.mask = CapabilityMask.of(descriptor.capabilities)
+        self.generation = 0
+        self.fs_trie: Optional[Dict[str, dict]] = None
+        if descriptor.fs_allow_list:
+            self.fs_trie = {}
+            for allowed in descriptor.fs_allow_list:
+                node = self.fs_trie
+                for part in _components(os.path.realpath(allowed)):
+                    node = node.setdefault(part, {})
+                node[_TERMINAL] = {}
+        self.exec_set: Optional[FrozenSet[str]] = None
+        if descriptor.exec_allow_list:
+            self.exec_set = frozenset(os.path.realpath(path) for path in descriptor.exec_allow_list)
+
+    def allows_path(self, resolved: str) -> bool:
+        if self.fs_trie is None:
+            return True
+        node = self.fs_trie
+        for part in _components(resolved):
+            if _TERMINAL in node:
+                return True
+            child = node.get(part)
+            if child is None:
+                return False
+            node = child
+        return _TERMINAL in node
+
+    def allows_binary(self, resolved: str) -> bool:
+        return self.exec_set is None or resolved in self.exec_set
+
+
+_BITS = {capability: CapabilityMask[capability.name] for capability in Capability}
+
+
+def _components(path: str) -> Tuple[str, ...]:
+    return tuple(part for part in path.split(os.sep) if part)
 
 
 class SecurityGuard:
-    """Applies declarative security descriptors at runtime."""
+    """Applies declarative security descriptors at runtime.
+
+    Descriptors are compiled on ``register``: filesystem allow lists become
+    a trie of resolved path components, so ``/repo`` admits ``/repo/src``
+    but not ``/repo-evil``, and exec allow lists become a set. Every check
+    resolves its path with ``realpath``, so retargeted symlinks are seen
+    immediately; decisions per resolved path are kept in an LRU of
+    ``decision_cache_size`` entries, which is cleared whenever a
+    descriptor is registered or removed.
+
+    Capabilities are held as a ``CapabilityMask`` computed once per
+    descriptor. ``authorize`` validates everything a workflow or
+    integration will need in one call and returns a token; ``check``
+    against that token is a mask test or set lookup, and tokens go stale
+    when the agent's descriptor is replaced or removed.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, decision_cache_size: int = 4096) -> None:
         self._descriptors: Dict[str, SecurityDescriptor] = {}
+        self._policies: Dict[str, _CompiledPolicy] = {}
+        self._decisions: "OrderedDict[Tuple[str, str, str], bool]" = OrderedDict()
+        self._cache_size = decision_cache_size
+        self._lock = threading.Lock()
+        self._generation = 0
 
     def register(self, descriptor: SecurityDescriptor) -> None:
-        self._descriptors[descriptor.agent_id] = descriptor
+        policy = _CompiledPolicy(descriptor)
+        with self._lock:
+            self._generation += 1
+            policy.generation = self._generation
+            self._descriptors[descriptor.agent_id] = descriptor
+            self._policies[descriptor.agent_id] = policy
+            self._decisions.clear()
 
     def unregister(self, agent_id: str) -> None:
-        self._descriptors.pop(agent_id, None)
+        with self._lock:
+            self._descriptors.pop(agent_id, None)
+            self._policies.pop(agent_id, None)
+            self._decisions.clear()
 
     def assert_capability(self, agent_id: str, capability: Capability) -> None:
-        descriptor = self._require(agent_id)
-        if capability not in descriptor.capabilities:
+        policy = self._require(agent_id)
+        if not policy.mask & _BITS[capability]:
             raise PermissionError(f"Agent {agent_id} lacks capability {capability}.")
 
+    def capability_mask(self, agent_id: str) -> CapabilityMask:
+        return self._require(agent_id).mask
+
+    def authorize(self, plan: AuthorizationPlan) -> AuthorizationToken:
+        """Validates every capability, path and binary in ``plan`` at once.
+
+        Raises ``PermissionError`` listing all violations, or returns a
+        token for ``check``.
+        """
+
+        policy = self._require(plan.agent_id)
+        descriptor = policy.descriptor
+        paths = frozenset(plan.paths)
+        binaries = frozenset(plan.binaries)
+        mask = CapabilityMask.of(plan.capabilities)
+        if paths:
+            mask |= CapabilityMask.READ_FS
+        if binaries:
+            mask |= CapabilityMask.EXEC
+        if plan.network_outbound:
+            mask |= CapabilityMask.NET_OUTBOUND
+        if plan.network_inbound:
+            mask |= CapabilityMask.NET_INBOUND
+
+        violations: List[str] = []
+        missing = mask & ~policy.mask
+        if missing:
+            names = ", ".join(str(flag.name) for flag in CapabilityMask if flag & missing)
+            violations.append(f"missing capabilities {names}")
+        if plan.network_outbound and descriptor.allow_network_outbound is False:
+            violations.append("outbound network access disabled")
+        if plan.network_inbound and descriptor.allow_network_inbound is False:
+            violations.append("inbound network access disabled")
+        for path in sorted(paths):
+            if not self._decide(policy, "fs", path):
+                violations.append(f"path {path} not permitted")
+        for binary in sorted(binaries):
+            if not self._decide(policy, "exec", binary):
+                violations.append(f"binary {binary} not permitted")
+        if violations:
+            raise PermissionError(
+                f"Authorization denied for agent {plan.agent_id}: {'; '.join(violations)}."
+            )
+        return AuthorizationToken(
+            agent_id=plan.agent_id,
+            mask=mask,
+            paths=paths,
+            binaries=binaries,
+            generation=policy.generation,
+        )
+
+    def check(
+        self,
+        token: AuthorizationToken,
+        capability: Optional[Capability] = None,
+        path: Optional[str] = None,
+        binary: Optional[str] = None,
+    ) -> None:
+        """Raises ``PermissionError`` unless ``token`` covers the requested access."""
+
+        policy = self._policies.get(token.agent_id)
+        if policy is None or policy.generation != token.generation:
+            raise PermissionError(f"Authorization for agent {token.agent_id} is no longer valid.")
+        if capability is not None and not token.mask & _BITS[capability]:
+            raise PermissionError(f"Capability {capability} was not authorized.")
+        if path is not None and path not in token.paths:
+            raise PermissionError(f"Path {path} was not authorized.")
+        if binary is not None and binary not in token.binaries:
+            raise PermissionError(f"Binary {binary} was not authorized.")
+
     def assert_fs_access(self, agent_id: str, target_path: str) -> None:
-        descriptor = self._require(agent_id)
         self.assert_capability(agent_id, Capability.READ_FS)
-        allow_list = descriptor.fs_allow_list or []
-        if not allow_list:
-            return
-        normalized_target = os.path.realpath(target_path)
-        for allowed in allow_list:
-            if normalized_target.startswith(os.path.realpath(allowed)):
-                return
-        raise PermissionError(f"Path {target_path} is not permitted for agent {agent_id}.")
+        if not self._decide(self._require(agent_id), "fs", target_path):
+            raise PermissionError(f"Path {target_path} is not permitted for agent {agent_id}.")
+
+    def check_paths(self, agent_id: str, paths: Iterable[str]) -> Dict[str, bool]:
+        """Returns whether each path is readable by ``agent_id``.
+
+        Raises ``PermissionError`` if the agent lacks ``READ_FS`` altogether.
+        """
+
+        self.assert_capability(agent_id, Capability.READ_FS)
+        policy = self._require(agent_id)
+        return {path: self._decide(policy, "fs", path) for path in paths}
 
     def assert_exec(self, agent_id: str, binary_path: str) -> None:
-        descriptor = self._require(agent_id)
         self.assert_capability(agent_id, Capability.EXEC)
-        allow_list = descriptor.exec_allow_list or []
-        if not allow_list:
-            return
-        normalized_binary = os.path.realpath(binary_path)
-        if any(normalized_binary == os.path.realpath(path) for path in allow_list):
-            return
-        raise PermissionError(f"Binary {binary_path} is not permitted for agent {agent_id}.")
+        if not self._decide(self._require(agent_id), "exec", binary_path):
+            raise PermissionError(f"Binary {binary_path} is not permitted for agent {agent_id}.")
 
     def assert_network_outbound(self, agent_id: str) -> None:
-        descriptor = self._require(agent_id)
+        descriptor = self._require(agent_id).descriptor
         self.assert_capability(agent_id, Capability.NET_OUTBOUND)
         if descriptor.allow_network_outbound is False:
             raise PermissionError(f"Outbound network access disabled for agent {agent_id}.")
 
     def assert_network_inbound(self, agent_id: str) -> None:
-        descriptor = self._require(agent_id)
+        descriptor = self._require(agent_id).descriptor
         self.assert_capability(agent_id, Capability.NET_INBOUND)
         if descriptor.allow_network_inbound is False:
             raise PermissionError(f"Inbound network access disabled for agent {agent_id}.")
 
-    def _require(self, agent_id: str) -> SecurityDescriptor:
-        descriptor = self._descriptors.get(agent_id)
-        if not descriptor:
-            raise KeyError(f"Security descriptor missing for agent {agent_id}.")
-        return descriptor
+    def _decide(self, policy: _CompiledPolicy, kind: str, path: str) -> bool:
+        if (policy.fs_trie if kind == "fs" else policy.exec_set) is None:
+            return True
+        # Resolve on every call: the filesystem may change under a cached raw path.
+        resolved = os.path.realpath(path)
+        cacheable = self._cache_size > 0
+        key = (policy.descriptor.agent_id, kind, resolved)
+        if cacheable:
+            with self._lock:
+                cached = self._decisions.get(key)
+                if cached is not None:
+                    self._decisions.move_to_end(key)
+                    return cached
+        allowed = policy.allows_path(resolved) if kind == "fs" else policy.allows_binary(resolved)
+        if cacheable:
+            with self._lock:
+                if self._policies.get(key[0]) is policy:
+                    self._decisions[key] = allowed
+                    if len(self._decisions) > self._cache_size:
+                        self._decisions.popitem(last=False)
+        return allowed
 
+    def _require(self, agent_id: str) -> _CompiledPolicy:
+        policy = self._policies.get(agent_id)
+        if not policy:
+            raise KeyError(f"Security descriptor missing for agent {agent_id}.")
+        return policy
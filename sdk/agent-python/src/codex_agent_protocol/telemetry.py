@@ -2,13 +2,25 @@
 
 from __future__ import annotations
 
+import atexit
 import logging
+import random
+import threading
 import time
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import weakref
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Deque, Dict, List, Optional, Tuple
 
 from .types import TelemetryEvent, TelemetrySink
 
+_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+}
+
 
 @dataclass
 class TelemetryOptions:
@@ -16,12 +28,240 @@ class TelemetryOptions:
     bindings: Optional[Dict[str, object]] = None
     sinks: Optional[List[TelemetrySink]] = None
     logger: Optional[logging.Logger] = None
+    async_dispatch: bool = False
+    buffer_size: int = 8192
+    batch_size: int = 256
+    overflow: str = "drop"
+    flush_interval_ms: float = 50
+    sample_rates: Optional[Dict[str, float]] = None
+    rate_limits: Optional[Dict[str, float]] = None
+    summary_interval_ms: float = 10_000
+    keep_levels: Tuple[str, ...] = ("error",)
+    keep_slower_than_ms: Optional[float] = None
+    duration_field: str = "duration_ms"
+
+
+class _DispatchPipeline:
+    """Bounded event buffer drained by a background thread.
+
+    Events are handed to sinks in batches: sinks with a ``handle_batch``
+    method get the whole batch, others get one ``handle`` call per event.
+    When the buffer is full, the ``"drop"`` policy discards the new event
+    and counts it, while ``"block"`` makes the producer wait for space.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        batch_size: int,
+        overflow: str,
+        flush_interval_ms: float,
+    ) -> None:
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"Unknown telemetry overflow policy {overflow!r}.")
+        self._capacity = max(1, buffer_size)
+        self._batch_size = max(1, batch_size)
+        self._block = overflow == "block"
+        self._interval = flush_interval_ms / 1000
+        self._buffer: Deque[tuple] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._in_flight = 0
+        self._stats = {"enqueued": 0, "dispatched": 0, "dropped": 0, "sink_errors": 0}
+
+    def submit(
+        self,
+        logger: logging.Logger,
+        levelno: int,
+        event: TelemetryEvent,
+        sinks: List[TelemetrySink],
+    ) -> None:
+        with self._cond:
+            if self._closed:
+                self._stats["dropped"] += 1
+                return
+            while len(self._buffer) >= self._capacity:
+                if not self._block:
+                    self._stats["dropped"] += 1
+                    return
+                self._cond.wait()
+            self._buffer.append((logger, levelno, event, sinks))
+            self._stats["enqueued"] += 1
+            if self._thread is None:
+                self._start()
+            if len(self._buffer) >= self._batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every buffered event reached the sinks."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._buffer or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {**self._stats, "queued": len(self._buffer)}
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._drain, name="codex-telemetry", daemon=True)
+        self._thread.start()
+        atexit.register(_close_at_exit, weakref.ref(self))
+
+    def _drain(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._buffer) < self._batch_size and not self._closed:
+                    self._cond.wait(self._interval)
+                if not self._buffer:
+                    if self._closed:
+                        return
+                    continue
+                count = min(self._batch_size, len(self._buffer))
+                batch = [self._buffer.popleft() for _ in range(count)]
+                self._in_flight = count
+                self._cond.notify_all()
+            self._dispatch(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._stats["dispatched"] += len(batch)
+                self._cond.notify_all()
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        groups: Dict[int, Tuple[List[TelemetrySink], List[TelemetryEvent]]] = {}
+        for logger, levelno, event, sinks in batch:
+            args = (event.name, event.payload)
+            record = logger.makeRecord(logger.name, levelno, "", 0, "%s | %s", args, None)
+            record.created = event.timestamp / 1000
+            record.msecs = event.timestamp % 1000
+            logger.handle(record)
+            groups.setdefault(id(sinks), (sinks, []))[1].append(event)
+        for sinks, events in groups.values():
+            self._deliver(list(sinks), events)
+
+    def _deliver(self, sinks: List[TelemetrySink], events: List[TelemetryEvent]) -> None:
+        for sink in sinks:
+            handle_batch = getattr(sink, "handle_batch", None)
+            try:
+                if handle_batch is not None:
+                    handle_batch(events)
+                else:
+                    for event in events:
+                        sink.handle(event)
+            except Exception:  # noqa: BLE001
+                self._stats["sink_errors"] += 1
+
+
+class _Sampler:
+    """Per-event-name sampling and token-bucket rate limiting.
+
+    Events at a ``keep_levels`` level, or whose ``duration_field`` payload
+    value reaches ``keep_slower_than_ms``, bypass both. Suppressed events
+    are counted per name and reported through ``take_summary`` at most
+    once per ``summary_interval_ms``.
+    """
+
+    def __init__(self, options: TelemetryOptions) -> None:
+        self._rates = dict(options.sample_rates or {})
+        self._limits = dict(options.rate_limits or {})
+        self._keep_levels = frozenset(options.keep_levels)
+        self._slow_ms = options.keep_slower_than_ms
+        self._duration_field = options.duration_field
+        self._interval = options.summary_interval_ms / 1000
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._next_summary = time.monotonic() + self._interval
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._rates or self._limits)
+
+    def admit(self, level: str, name: str, payload: Optional[Dict[str, object]]) -> bool:
+        rate = self._rates.get(name)
+        limit = self._limits.get(name)
+        if rate is None and limit is None:
+            return True
+        if level in self._keep_levels or self._is_slow(payload):
+            return True
+        with self._lock:
+            admitted = (rate is None or self._random.random() < rate) and (
+                limit is None or self._take_token(name, limit)
+            )
+            if not admitted:
+                self._suppressed[name] = self._suppressed.get(name, 0) + 1
+            return admitted
+
+    def take_summary(self) -> Optional[Dict[str, int]]:
+        now = time.monotonic()
+        if now < self._next_summary:
+            return None
+        with self._lock:
+            if now < self._next_summary:
+                return None
+            self._next_summary = now + self._interval
+            suppressed, self._suppressed = self._suppressed, {}
+        return suppressed or None
+
+    def _is_slow(self, payload: Optional[Dict[str, object]]) -> bool:
+        if self._slow_ms is None or not payload:
+            return False
+        duration = payload.get(self._duration_field)
+        return isinstance(duration, (int, float)) and duration >= self._slow_ms
+
+    def _take_token(self, name: str, rate: float) -> bool:
+        now = time.monotonic()
+        capacity = max(1.0, rate)
+        tokens, updated = self._buckets.get(name, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[name] = (tokens, now)
+            return False
+        self._buckets[name] = (tokens - 1, now)
+        return True
+
+
+def _close_at_exit(ref: "weakref.ref[_DispatchPipeline]") -> None:
+    pipeline = ref()
+    if pipeline is not None:
+        pipeline.close(1.0)
 
 
 class Telemetry:
-    """Lightweight logger-compatible telemetry pipeline."""
+    """Lightweight logger-compatible telemetry pipeline.
+
+    Events below the logger's level are discarded before any work is done.
+    Names listed in ``sample_rates`` or ``rate_limits`` are thinned out
+    unless a keep rule matches, and a ``telemetry.suppressed`` event
+    periodically reports how many were dropped. Children share their
+    parent's sampling state. With ``async_dispatch`` enabled, events are queued and logged and
+    delivered to sinks by a background thread instead of the caller's;
+    ``flush`` waits for the queue to drain and ``stats`` reports counters.
+    """
 
-    def __init__(self, options: Optional[TelemetryOptions] = None) -> None:
+    def __init__(
+        self,
+        options: Optional[TelemetryOptions] = None,
+        _pipeline: Optional[_DispatchPipeline] = None,
+        _sampler: Optional[_Sampler] = None,
+    ) -> None:
         options = options or TelemetryOptions()
         self._logger = options.logger or logging.getLogger("codex.agent")
         self._logger.setLevel(options.level.upper())
@@ -32,11 +272,31 @@ class Telemetry:
             self._logger.addHandler(handler)
         self._bindings = options.bindings or {}
         self._sinks: List[TelemetrySink] = list(options.sinks or [])
+        self._options = options
+        self._sampler = _sampler or _Sampler(options)
+        self._pipeline = _pipeline
+        if self._pipeline is None and options.async_dispatch:
+            self._pipeline = _DispatchPipeline(
+                options.buffer_size,
+                options.batch_size,
+                options.overflow,
+                options.flush_interval_ms,
+            )
 
     def child(self, bindings: Dict[str, object]) -> "Telemetry":
         child_bindings = {**self._bindings, **bindings}
         child_logger = self._logger.getChild(".".join(map(str, bindings.values())))
-        return Telemetry(TelemetryOptions(logger=child_logger, sinks=self._sinks, bindings=child_bindings))
+        return Telemetry(
+            replace(
+                self._options,
+                level=logging.getLevelName(self._logger.getEffectiveLevel()),
+                logger=child_logger,
+                sinks=self._sinks,
+                bindings=child_bindings,
+            ),
+            _pipeline=self._pipeline,
+            _sampler=self._sampler,
+        )
 
     def debug(self, name: str, payload: Optional[Dict[str, object]] = None) -> None:
         self._emit("debug", name, payload)
@@ -50,14 +310,45 @@ class Telemetry:
     def error(self, name: str, payload: Optional[Dict[str, object]] = None) -> None:
         self._emit("error", name, payload)
 
+    def is_enabled(self, level: str) -> bool:
+        return self._logger.isEnabledFor(_LEVELS.get(level, logging.INFO))
+
     def add_sink(self, sink: TelemetrySink) -> None:
         self._sinks.append(sink)
 
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return self._pipeline.flush(timeout) if self._pipeline is not None else True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._pipeline is not None:
+            self._pipeline.close(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        if self._pipeline is None:
+            return {"enqueued": 0, "dispatched": 0, "dropped": 0, "sink_errors": 0, "queued": 0}
+        return self._pipeline.stats()
+
     def _emit(self, level: str, name: str, payload: Optional[Dict[str, object]]) -> None:
+        levelno = _LEVELS.get(level, logging.INFO)
+        if not self._logger.isEnabledFor(levelno):
+            return
+        if self._sampler.active:
+            admitted = self._sampler.admit(level, name, payload)
+            suppressed = self._sampler.take_summary()
+            if suppressed and self._logger.isEnabledFor(logging.INFO):
+                self._dispatch("info", logging.INFO, "telemetry.suppressed", {"counts": suppressed})
+            if not admitted:
+                return
+        self._dispatch(level, levelno, name, payload)
+
+    def _dispatch(
+        self, level: str, levelno: int, name: str, payload: Optional[Dict[str, object]]
+    ) -> None:
         timestamp = time.time() * 1000
         event = TelemetryEvent(name=name, level=level, timestamp=timestamp, payload=payload)
-        log_method = getattr(self._logger, level.lower(), self._logger.info)
-        log_method("%s | %s", name, payload)
+        if self._pipeline is not None:
+            self._pipeline.submit(self._logger, levelno, event, self._sinks)
+            return
+        self._logger.log(levelno, "%s | %s", name, payload)
         for sink in self._sinks:
             sink.handle(event)
-
@@ -0,0 +1,191 @@
+"""Trace context propagation and span export."""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+from .types import Span, SpanContext, TelemetryEvent, TelemetrySink
+
+TRACEPARENT = "traceparent"
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar(
+    "codex_span_context", default=None
+)
+
+
+def current_span_context() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def inject(headers: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Adds the active span as a W3C ``traceparent`` header.
+
+    Returns ``headers`` unchanged (possibly ``None``) when no span is active.
+    """
+
+    context = _current.get()
+    if context is None:
+        return headers
+    headers = dict(headers or {})
+    headers[TRACEPARENT] = f"00-{context.trace_id}-{context.span_id}-01"
+    return headers
+
+
+def extract(headers: Optional[Mapping[str, Any]]) -> Optional[SpanContext]:
+    """Parses a ``traceparent`` header, ignoring malformed values."""
+
+    value = headers.get(TRACEPARENT) if headers else None
+    if not isinstance(value, str):
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return SpanContext(trace_id=parts[1], span_id=parts[2])
+
+
+@contextmanager
+def activate(context: Optional[SpanContext]) -> Iterator[None]:
+    """Makes ``context`` the parent of spans started inside the block."""
+
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Tracer:
+    """Creates spans linked through ``contextvars`` and hands finished ones to sinks.
+
+    Finished spans reach each sink as a ``TelemetryEvent`` named ``"span"``
+    whose payload holds the ``Span`` under ``"span"``, so sinks can be
+    shared with ``Telemetry``.
+    """
+
+    def __init__(self, sinks: Optional[List[TelemetrySink]] = None) -> None:
+        self._sinks: List[TelemetrySink] = list(sinks or [])
+
+    def add_sink(self, sink: TelemetrySink) -> None:
+        self._sinks.append(sink)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+    ) -> Iterator[Span]:
+        """Runs the block inside a new child of ``parent`` or of the active span."""
+
+        parent = parent or _current.get()
+        context = SpanContext(
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+        )
+        span = Span(
+            name=name,
+            context=context,
+            parent_span_id=parent.span_id if parent else None,
+            start_time=time.time() * 1000,
+            attributes=dict(attributes or {}),
+        )
+        token = _current.set(context)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end_time = time.time() * 1000
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        event = TelemetryEvent(
+            name="span",
+            timestamp=span.end_time or span.start_time,
+            level="info",
+            payload={"span": span},
+        )
+        for sink in self._sinks:
+            try:
+                sink.handle(event)
+            except Exception:  # noqa: BLE001
+                pass
+
+
+class OtlpJsonFileSink:
+    """Appends spans to a file in the OTLP/JSON file-exporter format.
+
+    Each line is an ``ExportTraceServiceRequest`` (``resourceSpans``), as
+    written by the OpenTelemetry Collector's file exporter, so the file can
+    be replayed into a collector or loaded by trace viewers. Events other
+    than spans are ignored.
+    """
+
+    def __init__(self, path: str, service_name: str = "codex-agent") -> None:
+        self._path = path
+        self._resource = {
+            "attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]
+        }
+        self._lock = threading.Lock()
+
+    def handle(self, event: TelemetryEvent) -> None:
+        self.handle_batch([event])
+
+    def handle_batch(self, events: List[TelemetryEvent]) -> None:
+        spans = [
+            _otlp_span(event.payload["span"])
+            for event in events
+            if event.name == "span" and isinstance((event.payload or {}).get("span"), Span)
+        ]
+        if not spans:
+            return
+        line = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": self._resource,
+                        "scopeSpans": [
+                            {"scope": {"name": "codex_agent_protocol"}, "spans": spans}
+                        ],
+                    }
+                ]
+            }
+        )
+        with self._lock, open(self._path, "a", encoding="utf-8") as output:
+            output.write(line + "\n")
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded: Dict[str, Any] = {
+        "traceId": span.context.trace_id,
+        "spanId": span.context.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(int(span.start_time * 1_000_000)),
+        "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1_000_000)),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()
+        ],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_span_id:
+        encoded["parentSpanId"] = span.parent_span_id
+    return encoded
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
@@ -3,8 +3,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from enum import Enum
-from typing import Any, Awaitable, Callable, Dict, Iterable, List, MutableMapping, Optional, Protocol, Set, Tuple, TypeVar, Union
+from enum import Enum, IntFlag
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Mapping, MutableMapping, Optional, Protocol, Set, Tuple, TypeVar, Union
 
 AgentId = str
 
@@ -27,6 +27,22 @@ class Capability(str, Enum):
     NET_INBOUND = "netInbound"
 
 
+class CapabilityMask(IntFlag):
+    NONE = 0
+    READ_FS = 1
+    WRITE_FS = 2
+    EXEC = 4
+    NET_OUTBOUND = 8
+    NET_INBOUND = 16
+
+    @classmethod
+    def of(cls, capabilities: Iterable[Capability]) -> "CapabilityMask":
+        mask = cls.NONE
+        for capability in capabilities:
+            mask |= cls[Capability(capability).name]
+        return mask
+
+
 @dataclass
 class AgentDefinition:
     id: AgentId
@@ -52,6 +68,14 @@ class AgentRegistryEntry:
     state: AgentRuntimeState
 
 
+@dataclass
+class AgentRegistryChange:
+    version: int
+    kind: str
+    agent_id: AgentId
+    entry: Optional[AgentRegistryEntry] = None
+
+
 @dataclass
 class ProcessLaunchOptions:
     command: str
@@ -122,22 +146,52 @@ class WorkflowNodeDefinition:
     rollback: Optional["WorkflowTaskHandler"] = None
     depends_on: Optional[List[str]] = None
     retry: Optional[Dict[str, Union[int, float]]] = None
+    priority: int = 0
+    estimated_cost_ms: Optional[float] = None
+    timeout_ms: Optional[int] = None
+    resources: Optional[Dict[str, Union[int, float]]] = None
+    fan_out: Optional[Callable[[Any], Iterable["WorkflowNodeDefinition"]]] = None
+    stream_buffer: Optional[int] = None
+    consumes: Optional[List[str]] = None
 
 
 @dataclass
 class WorkflowExecutionOptions:
     concurrency: int = 1
+    timeout_ms: Optional[int] = None
+    fail_fast: bool = True
+    rollback_concurrency: Optional[int] = None
+    resource_limits: Optional[Dict[str, Union[int, float]]] = None
+    trace_dir: Optional[str] = None
     on_task_complete: Optional[Callable[[str, Any], None]] = None
     on_task_error: Optional[Callable[[str, Any], None]] = None
 
 
+@dataclass
+class WorkflowNodeTiming:
+    ready_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    retry_sleep_ms: float = 0.0
+    rollback_started_at: Optional[float] = None
+    rollback_finished_at: Optional[float] = None
+
+
 @dataclass
 class WorkflowRunSummary:
     completed: Set[str] = field(default_factory=set)
     completed_order: List[str] = field(default_factory=list)
     failed: MutableMapping[str, Any] = field(default_factory=dict)
+    cancelled: Set[str] = field(default_factory=set)
+    rolled_back: List[str] = field(default_factory=list)
+    rollback_failed: MutableMapping[str, Any] = field(default_factory=dict)
     started_at: float = 0.0
     finished_at: Optional[float] = None
+    timings: Dict[str, WorkflowNodeTiming] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+    utilization: Optional[float] = None
+    trace_path: Optional[str] = None
 
 
 @dataclass
@@ -145,6 +199,7 @@ class WorkflowContext:
     context_store: ContextStoreProtocol
     session_id: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    streams: Optional[Dict[str, AsyncIterator[Any]]] = None
 
 
 WorkflowTaskHandler = Callable[[WorkflowContext], Union[Any, Awaitable[Any]]]
@@ -154,7 +209,27 @@ WorkflowTaskHandler = Callable[[WorkflowContext], Union[Any, Awaitable[Any]]]
 class ContextSnapshot:
     id: str
     created_at: float
-    data: Dict[str, Any]
+    data: Mapping[str, Any]
+    version: int = 0
+    namespace: Optional[str] = None
+    key_versions: Mapping[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class ContextChange:
+    namespace: str
+    key: str
+    version: int
+    deleted: bool = False
+
+
+@dataclass
+class ContextDelta:
+    base_id: str
+    snapshot_id: str
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
 
 
 @dataclass
@@ -162,6 +237,15 @@ class PromptPackage:
     session_id: Optional[str]
     entries: List[Dict[str, Any]]
     attachments: Optional[List[Dict[str, Any]]] = None
+    token_estimate: Optional[int] = None
+    dropped: Optional[List[str]] = None
+    truncated: Optional[List[str]] = None
+    snapshot_id: Optional[str] = None
+    base_snapshot_id: Optional[str] = None
+    removed: Optional[List[str]] = None
+    encoded_entries: Optional[List[Optional[str]]] = field(
+        default=None, repr=False, compare=False
+    )
 
 
 @dataclass
@@ -177,6 +261,23 @@ class TelemetrySink(Protocol):
         ...
 
 
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_span_id: Optional[str]
+    start_time: float
+    end_time: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
 @dataclass
 class SecurityDescriptor:
     agent_id: AgentId
@@ -187,6 +288,25 @@ class SecurityDescriptor:
     allow_network_inbound: bool = True
 
 
+@dataclass
+class AuthorizationPlan:
+    agent_id: AgentId
+    capabilities: Iterable[Capability] = ()
+    paths: Iterable[str] = ()
+    binaries: Iterable[str] = ()
+    network_outbound: bool = False
+    network_inbound: bool = False
+
+
+@dataclass(frozen=True)
+class AuthorizationToken:
+    agent_id: AgentId
+    mask: CapabilityMask
+    paths: FrozenSet[str]
+    binaries: FrozenSet[str]
+    generation: int
+
+
 @dataclass
 class IntegrationAdapter:
     name: str
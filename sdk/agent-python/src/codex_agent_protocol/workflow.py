@@ -3,25 +3,179 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
 import time
-from collections import defaultdict
-from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from collections import defaultdict, deque
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
 
+from .metrics import MetricsRegistry
+from .profiling import realized_critical_path, slot_utilization, write_chrome_trace
+from .tracing import Tracer
 from .types import (
     WorkflowContext,
     WorkflowExecutionOptions,
     WorkflowNodeDefinition,
+    WorkflowNodeTiming,
     WorkflowRunSummary,
 )
 
 EventHandler = Callable[..., None]
 
 
+class WorkflowStream:
+    """Bounded channel carrying items from a streaming node to one consumer.
+
+    ``put`` waits while the buffer is full, so a fast producer is held back
+    by its slowest consumer; ``on_wait(stream, waiting)`` is told when such a
+    wait starts and ends. ``detach`` makes further items be dropped and
+    ``abort`` makes the next ``put`` raise. Consumers read the stream with
+    ``async for``.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        maxsize: int,
+        on_wait: Optional[Callable[["WorkflowStream", bool], None]] = None,
+    ) -> None:
+        self.source = source
+        self._maxsize = max(1, maxsize)
+        self._on_wait = on_wait
+        self._items: Deque[Any] = deque()
+        self._changed = asyncio.Condition()
+        self._closed = False
+        self._detached = False
+        self._aborted: Optional[BaseException] = None
+        self._error: Optional[BaseException] = None
+
+    async def put(self, item: Any) -> None:
+        async with self._changed:
+            if self._on_wait is not None and not self._has_room():
+                self._on_wait(self, True)
+                try:
+                    await self._changed.wait_for(self._has_room)
+                finally:
+                    self._on_wait(self, False)
+            else:
+                await self._changed.wait_for(self._has_room)
+            if self._aborted is not None:
+                raise self._aborted
+            if self._detached:
+                return
+            self._items.append(item)
+            self._changed.notify_all()
+
+    @property
+    def full(self) -> bool:
+        return not self._has_room()
+
+    def _has_room(self) -> bool:
+        return self._detached or self._aborted is not None or len(self._items) < self._maxsize
+
+    async def close(self, error: Optional[BaseException] = None) -> None:
+        async with self._changed:
+            if self._closed:
+                return
+            self._closed = True
+            self._error = error
+            self._changed.notify_all()
+
+    async def detach(self) -> None:
+        async with self._changed:
+            self._detached = True
+            self._items.clear()
+            self._changed.notify_all()
+
+    async def abort(self, error: BaseException) -> None:
+        async with self._changed:
+            self._aborted = error
+            self._changed.notify_all()
+
+    def __aiter__(self) -> "WorkflowStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._items or self._closed)
+            if self._items:
+                item = self._items.popleft()
+                self._changed.notify_all()
+                return item
+        if self._error is not None:
+            raise RuntimeError(f"Upstream node {self.source} did not finish.") from self._error
+        raise StopAsyncIteration
+
+
 class WorkflowEngine:
-    """Async workflow executor with dependency tracking and rollback."""
+    """Async workflow executor with dependency tracking and rollback.
+
+    Ready nodes are dispatched by descending ``priority`` and then by the
+    longest remaining path to a sink, so long dependency chains start early
+    when ``concurrency`` is limited. Path lengths use each node's
+    ``estimated_cost_ms`` or, failing that, the durations observed by
+    previous runs on the same engine.
+
+    Nodes are bounded by their ``timeout_ms`` and the whole run by
+    ``WorkflowExecutionOptions.timeout_ms``. On terminal failure with
+    ``fail_fast`` enabled, in-flight siblings are cancelled before completed
+    nodes are rolled back. Cancellation is cooperative: synchronous handlers
+    run to completion, coroutines are interrupted at their next ``await``.
+
+    Rollback follows the dependency graph in reverse: a node is undone once
+    every completed node depending on it has been undone, and independent
+    branches roll back concurrently up to ``rollback_concurrency``.
+
+    Nodes may claim weighted ``resources`` (for example ``{"codex": 1}``);
+    a node only starts while every claimed tag stays within its entry in
+    ``WorkflowExecutionOptions.resource_limits``. Blocked nodes are skipped
+    in favour of lower-ranked ready nodes that fit; they are parked by the
+    tag and weight that blocked them and only reconsidered once that tag
+    has room, so dispatch stays logarithmic in the number of ready nodes.
+
+    A node with ``fan_out`` expands into the child nodes returned by
+    ``fan_out(result)`` once it completes; its dependents wait for every
+    child. A node with ``stream_buffer`` returns an (async) iterable whose
+    items are delivered to the nodes listing it in ``consumes`` through
+    ``context.streams[node_id]``. A consumer whose other dependencies are
+    met starts as soon as its producer does and is admitted outside the
+    concurrency and resource limits, since a blocked producer can only make
+    progress once it reads. A producer waiting on a full buffer does not
+    count against ``concurrency``, so the nodes a consumer still depends on
+    can run meanwhile. It keeps its ``resources``, so a graph in which a
+    consumer depends on a node that cannot run alongside its producer within
+    ``resource_limits`` is rejected. Once a node fails, streams to consumers
+    that were not started are detached; producers left blocked while nothing
+    else can run fail instead of waiting forever.
+
+    Every run records per-node ``timings``, the realized ``critical_path``
+    and slot ``utilization`` on its summary. With ``trace_dir`` set, a
+    Chrome trace (also readable by Perfetto) is written for each run. With
+    a ``tracer``, each node runs inside a ``workflow.node`` span parented
+    to the span active when ``run`` was called.
+    """
 
-    def __init__(self) -> None:
+    COST_SMOOTHING = 0.5
+
+    def __init__(
+        self, metrics: Optional[MetricsRegistry] = None, tracer: Optional[Tracer] = None
+    ) -> None:
         self._handlers: Dict[str, List[EventHandler]] = defaultdict(list)
+        self._observed_costs: Dict[str, float] = {}
+        self._metrics = metrics
+        self._tracer = tracer
+        if metrics is not None:
+            self._node_latency = {
+                outcome: metrics.histogram(
+                    "workflow_node_duration_ms",
+                    "Workflow node duration including retries.",
+                    {"outcome": outcome},
+                )
+                for outcome in ("completed", "failed")
+            }
+            self._node_retries = metrics.counter(
+                "workflow_node_retries_total", "Workflow node attempts after the first."
+            )
 
     async def run(
         self,
@@ -31,108 +185,320 @@ class WorkflowEngine:
     ) -> WorkflowRunSummary:
         options = options or WorkflowExecutionOptions()
         node_list = list(nodes)
-        definition_map = {node.id: node for node in node_list}
         summary = WorkflowRunSummary(started_at=time.time() * 1000)
-        remaining: Dict[str, WorkflowNodeDefinition] = dict(definition_map)
+        graph = _RunGraph(self, summary, options)
+        graph.add_nodes(node_list)
 
-        in_flight: Set[str] = set()
-        queued: Set[str] = set()
-        ready: asyncio.Queue[WorkflowNodeDefinition] = asyncio.Queue()
-
-        def dependencies_satisfied(node: WorkflowNodeDefinition) -> bool:
-            deps = node.depends_on or []
-            return all(dep in summary.completed for dep in deps)
-
-        def enqueue_ready_nodes() -> None:
-            for node in list(remaining.values()):
-                if node.id in in_flight or node.id in queued:
-                    continue
-                if node.id in summary.completed or node.id in summary.failed:
-                    continue
-                if dependencies_satisfied(node):
-                    ready.put_nowait(node)
-                    queued.add(node.id)
+        in_flight: Dict[asyncio.Future[Any], str] = {}
+        concurrency = max(1, options.concurrency)
 
         self._emit("started", node_list)
-        enqueue_ready_nodes()
 
-        async def worker() -> None:
+        loop = asyncio.get_running_loop()
+        deadline = None if options.timeout_ms is None else loop.time() + options.timeout_ms / 1000
+        try:
             while True:
+                while not summary.failed:
+                    node = graph.pop_dispatchable(len(in_flight) - graph.waiting < concurrency)
+                    if node is None:
+                        break
+                    graph.mark_started(node)
+                    task = asyncio.ensure_future(
+                        self._execute_node(
+                            node,
+                            graph.context_for(node, context),
+                            summary,
+                            options,
+                            graph.outputs_of(node.id),
+                            graph.validate,
+                        )
+                    )
+                    in_flight[task] = node.id
                 if summary.failed:
-                    return
-                if len(summary.completed) == len(definition_map):
-                    return
-                try:
-                    node = await asyncio.wait_for(ready.get(), timeout=0.1)
-                except asyncio.TimeoutError:
-                    enqueue_ready_nodes()
-                    continue
-                if node.id in summary.completed or node.id in summary.failed:
-                    continue
-                in_flight.add(node.id)
-                try:
-                    await self._execute_node(node, context, summary, options, definition_map)
-                finally:
-                    in_flight.discard(node.id)
-                    remaining.pop(node.id, None)
-                    queued.discard(node.id)
-                    enqueue_ready_nodes()
+                    await graph.detach_unstarted()
+                elif graph.stalled(len(in_flight)):
+                    await graph.abort_stalled()
+                if not in_flight:
+                    break
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                waiter = graph.wait_for_blocked_producer()
+                done, _ = await asyncio.wait(
+                    [*in_flight, *([waiter] if waiter else [])],
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if waiter is not None:
+                    waiter.cancel()
+                    if waiter in done:
+                        done.discard(waiter)
+                        if not done:
+                            continue
+                if not done:
+                    for node_id in in_flight.values():
+                        error = TimeoutError(
+                            f"Workflow deadline of {options.timeout_ms} ms exceeded."
+                        )
+                        self._fail_node(node_id, error, summary, options)
+                    await self._cancel_in_flight(in_flight, summary)
+                    break
+                for task in done:
+                    node_id = in_flight.pop(task)
+                    await graph.mark_finished(node_id)
+                    children = task.result()
+                    if node_id not in summary.completed:
+                        continue
+                    if children:
+                        try:
+                            graph.add_nodes(children, parent=node_id)
+                        except ValueError as exc:
+                            # Sibling fan-outs finishing together can still collide.
+                            summary.completed.discard(node_id)
+                            summary.completed_order.remove(node_id)
+                            self._fail_node(node_id, exc, summary, options)
+                            continue
+                    graph.release_dependents(node_id)
+                if summary.failed and options.fail_fast:
+                    await self._cancel_in_flight(in_flight, summary)
+        finally:
+            if in_flight:
+                await self._cancel_in_flight(in_flight, summary)
+            await graph.close_streams()
 
-        workers = [asyncio.create_task(worker()) for _ in range(max(1, options.concurrency))]
-        await asyncio.gather(*workers)
+        if summary.failed:
+            await self._rollback_completed(
+                context,
+                summary,
+                options,
+                graph.definitions,
+                graph.successors,
+                graph.predecessors,
+            )
 
         summary.finished_at = time.time() * 1000
+        summary.critical_path = realized_critical_path(summary.timings, graph.predecessors)
+        summary.utilization = slot_utilization(summary, concurrency)
+        if options.trace_dir:
+            summary.trace_path = write_chrome_trace(summary, options.trace_dir)
         self._emit("finished", summary)
         return summary
 
+    def estimated_cost(self, node: WorkflowNodeDefinition) -> Optional[float]:
+        """Returns the declared or learned cost of ``node`` in milliseconds."""
+
+        if node.estimated_cost_ms is not None:
+            return float(node.estimated_cost_ms)
+        return self._observed_costs.get(node.id)
+
+    def _record_cost(self, node_id: str, duration_ms: float) -> None:
+        previous = self._observed_costs.get(node_id)
+        if previous is None:
+            self._observed_costs[node_id] = duration_ms
+        else:
+            alpha = self.COST_SMOOTHING
+            self._observed_costs[node_id] = alpha * duration_ms + (1 - alpha) * previous
+
     async def _execute_node(
         self,
         node: WorkflowNodeDefinition,
         context: WorkflowContext,
         summary: WorkflowRunSummary,
         options: WorkflowExecutionOptions,
-        definition_map: Dict[str, WorkflowNodeDefinition],
-    ) -> None:
+        outputs: List[WorkflowStream],
+        validate_children: Callable[[List[WorkflowNodeDefinition]], None],
+    ) -> Optional[List[WorkflowNodeDefinition]]:
+        args = (node, context, summary, options, outputs, validate_children)
+        if self._tracer is None:
+            return await self._execute_attempts(*args)
+        with self._tracer.span("workflow.node", {"node.id": node.id}) as span:
+            try:
+                return await self._execute_attempts(*args)
+            finally:
+                span.attributes["attempts"] = summary.timings[node.id].attempts
+                error = summary.failed.get(node.id)
+                if error is not None:
+                    span.error = f"{type(error).__name__}: {error}"
+
+    async def _execute_attempts(
+        self,
+        node: WorkflowNodeDefinition,
+        context: WorkflowContext,
+        summary: WorkflowRunSummary,
+        options: WorkflowExecutionOptions,
+        outputs: List[WorkflowStream],
+        validate_children: Callable[[List[WorkflowNodeDefinition]], None],
+    ) -> Optional[List[WorkflowNodeDefinition]]:
         attempts = 0
         retry = node.retry or {}
         max_attempts = max(1, int(retry.get("attempts", 1)))
         delay_ms = float(retry.get("delayMs", 0))
 
+        timing = summary.timings[node.id]
+        first_started = time.perf_counter()
         while attempts < max_attempts:
             attempts += 1
+            timing.attempts = attempts
+            if attempts > 1 and self._metrics is not None:
+                self._node_retries.inc()
+            started = time.perf_counter()
             try:
-                result = await _maybe_await(node.run(context))
+                result = await self._run_handler(node, context, outputs)
+                children = list(node.fan_out(result)) if node.fan_out else None
+                if children:
+                    validate_children(children)
+                finished = time.perf_counter()
+                self._record_cost(node.id, (finished - started) * 1000)
+                if self._metrics is not None:
+                    self._node_latency["completed"].observe((finished - first_started) * 1000)
+                timing.finished_at = time.time() * 1000
                 summary.completed.add(node.id)
                 summary.completed_order.append(node.id)
                 if options.on_task_complete:
                     options.on_task_complete(node.id, result)
                 self._emit("taskComplete", node.id, result)
-                return
+                return children
             except Exception as exc:  # noqa: BLE001
                 if attempts >= max_attempts:
-                    summary.failed[node.id] = exc
-                    if options.on_task_error:
-                        options.on_task_error(node.id, exc)
-                    self._emit("taskFailed", node.id, exc)
-                    await self._rollback_completed(context, summary, definition_map)
-                    return
+                    if self._metrics is not None:
+                        elapsed = (time.perf_counter() - first_started) * 1000
+                        self._node_latency["failed"].observe(elapsed)
+                    timing.finished_at = time.time() * 1000
+                    self._fail_node(node.id, exc, summary, options)
+                    return None
                 if delay_ms > 0:
                     await asyncio.sleep(delay_ms / 1000)
+                    timing.retry_sleep_ms += delay_ms
+        return None
+
+    async def _run_handler(
+        self,
+        node: WorkflowNodeDefinition,
+        context: WorkflowContext,
+        outputs: List[WorkflowStream],
+    ) -> Any:
+        if node.timeout_ms is None:
+            return await self._invoke(node, context, outputs)
+        try:
+            return await asyncio.wait_for(
+                self._invoke(node, context, outputs), node.timeout_ms / 1000
+            )
+        except asyncio.TimeoutError as exc:
+            raise TimeoutError(f"Node {node.id} timed out after {node.timeout_ms} ms.") from exc
+
+    async def _invoke(
+        self,
+        node: WorkflowNodeDefinition,
+        context: WorkflowContext,
+        outputs: List[WorkflowStream],
+    ) -> Any:
+        result = await _maybe_await(node.run(context))
+        if node.stream_buffer is None:
+            return result
+        produced = 0
+        if hasattr(result, "__aiter__"):
+            async for item in result:
+                for stream in outputs:
+                    await stream.put(item)
+                produced += 1
+        else:
+            for item in result:
+                for stream in outputs:
+                    await stream.put(item)
+                produced += 1
+        return produced
+
+    def _fail_node(
+        self,
+        node_id: str,
+        error: BaseException,
+        summary: WorkflowRunSummary,
+        options: WorkflowExecutionOptions,
+    ) -> None:
+        summary.failed[node_id] = error
+        if options.on_task_error:
+            options.on_task_error(node_id, error)
+        self._emit("taskFailed", node_id, error)
+
+    async def _cancel_in_flight(
+        self,
+        in_flight: Dict[asyncio.Future[Any], str],
+        summary: WorkflowRunSummary,
+    ) -> None:
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        for task, node_id in in_flight.items():
+            timing = summary.timings[node_id]
+            if timing.finished_at is None:
+                timing.finished_at = time.time() * 1000
+            if node_id in summary.completed or node_id in summary.failed:
+                continue
+            summary.cancelled.add(node_id)
+            self._emit("taskCancelled", node_id)
+        in_flight.clear()
 
     async def _rollback_completed(
         self,
         context: WorkflowContext,
         summary: WorkflowRunSummary,
+        options: WorkflowExecutionOptions,
         definition_map: Dict[str, WorkflowNodeDefinition],
+        successors: Dict[str, List[str]],
+        predecessors: Dict[str, List[str]],
     ) -> None:
-        for node_id in reversed(summary.completed_order):
-            node = definition_map.get(node_id)
-            if not node or not node.rollback:
-                continue
-            try:
-                await _maybe_await(node.rollback(context))
-            except Exception as exc:  # noqa: BLE001
-                self._emit("taskFailed", node.id, exc)
+        completion_index = {
+            node_id: index for index, node_id in enumerate(summary.completed_order)
+        }
+        blockers = {
+            node_id: sum(1 for successor in successors[node_id] if successor in completion_index)
+            for node_id in completion_index
+        }
+        ready = [
+            (-completion_index[node_id], node_id)
+            for node_id, count in blockers.items()
+            if not count
+        ]
+        heapq.heapify(ready)
+        in_flight: Dict[asyncio.Future[None], str] = {}
+        limit = max(1, options.rollback_concurrency or options.concurrency)
+
+        while ready or in_flight:
+            while ready and len(in_flight) < limit:
+                node_id = heapq.heappop(ready)[1]
+                task = asyncio.ensure_future(
+                    self._rollback_node(definition_map[node_id], context, summary)
+                )
+                in_flight[task] = node_id
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                node_id = in_flight.pop(task)
+                task.result()
+                for predecessor in predecessors[node_id]:
+                    if predecessor not in blockers:
+                        continue
+                    blockers[predecessor] -= 1
+                    if not blockers[predecessor]:
+                        heapq.heappush(ready, (-completion_index[predecessor], predecessor))
+
+    async def _rollback_node(
+        self,
+        node: WorkflowNodeDefinition,
+        context: WorkflowContext,
+        summary: WorkflowRunSummary,
+    ) -> None:
+        if not node.rollback:
+            return
+        timing = summary.timings[node.id]
+        timing.rollback_started_at = time.time() * 1000
+        try:
+            await _maybe_await(node.rollback(context))
+        except Exception as exc:  # noqa: BLE001
+            summary.rollback_failed[node.id] = exc
+            self._emit("taskFailed", node.id, exc)
+            return
+        finally:
+            timing.rollback_finished_at = time.time() * 1000
+        summary.rolled_back.append(node.id)
+        self._emit("rolledBack", node.id)
 
     def on(self, event: str, handler: EventHandler) -> None:
         self._handlers[event].append(handler)
@@ -142,8 +508,350 @@ class WorkflowEngine:
             handler(*args)
 
 
+class _RunGraph:
+    """Dependency, stream and resource bookkeeping for a single run."""
+
+    def __init__(
+        self,
+        engine: WorkflowEngine,
+        summary: WorkflowRunSummary,
+        options: WorkflowExecutionOptions,
+    ) -> None:
+        self._engine = engine
+        self._summary = summary
+        self.definitions: Dict[str, WorkflowNodeDefinition] = {}
+        # ``dependents`` gate readiness; ``successors``/``predecessors`` also
+        # cover stream and fan-out edges and drive ranking and rollback.
+        self.dependents: Dict[str, List[str]] = {}
+        self.successors: Dict[str, List[str]] = {}
+        self.predecessors: Dict[str, List[str]] = {}
+        self._consumers: Dict[str, List[str]] = {}
+        self._streams: Dict[str, Dict[str, WorkflowStream]] = {}
+        self._pending: Dict[str, int] = {}
+        self._ranks: Dict[str, float] = {}
+        self._order: Dict[str, int] = {}
+        self._default_cost: Optional[float] = None
+        self._started: Set[str] = set()
+        self._running: Set[str] = set()
+        self._ready: List[Tuple[int, float, int, str]] = []
+        # Nodes that did not fit, keyed by the (tag, weight) that blocked them.
+        self._parked: Dict[Tuple[str, float], List[Tuple[int, float, int, str]]] = (
+            defaultdict(list)
+        )
+        self._immediate: Deque[str] = deque()
+        self._waiting_producers: Dict[str, WorkflowStream] = {}
+        self._producer_blocked: Optional[asyncio.Event] = None
+        self._resource_limits = dict(options.resource_limits or {})
+        self._resource_usage: Dict[str, float] = defaultdict(float)
+
+    def validate(self, nodes: Iterable[WorkflowNodeDefinition]) -> None:
+        """Raises ``ValueError`` if ``nodes`` cannot be added to the run."""
+
+        self._validate(list(nodes))
+
+    def add_nodes(
+        self,
+        nodes: Iterable[WorkflowNodeDefinition],
+        parent: Optional[str] = None,
+    ) -> None:
+        node_list = list(nodes)
+        self._validate(node_list)
+        inherited = list(self.dependents[parent]) if parent else []
+        for node in node_list:
+            self.definitions[node.id] = node
+            self._order[node.id] = len(self._order)
+            self.dependents[node.id] = list(inherited)
+            self.successors[node.id] = list(inherited)
+            self.predecessors[node.id] = []
+            self._consumers[node.id] = []
+            self._streams[node.id] = {}
+            self._pending[node.id] = 0
+            self._summary.timings[node.id] = WorkflowNodeTiming()
+        for dependent in inherited:
+            self._pending[dependent] += len(node_list)
+            self.predecessors[dependent].extend(node.id for node in node_list)
+        for node in node_list:
+            if parent:
+                self._link(parent, node.id)
+            for dependency in dict.fromkeys(node.depends_on or []):
+                self.dependents[dependency].append(node.id)
+                self._link(dependency, node.id)
+                if dependency not in self._summary.completed:
+                    self._pending[node.id] += 1
+            for producer in dict.fromkeys(node.consumes or []):
+                self._consumers[producer].append(node.id)
+                self._streams[producer][node.id] = WorkflowStream(
+                    producer, self.definitions[producer].stream_buffer or 1, self._on_stream_wait
+                )
+                self._link(producer, node.id)
+                self._pending[node.id] += 1
+        self._rank(node_list)
+        for node in node_list:
+            if not self._pending[node.id]:
+                self._push_ready(node.id)
+
+    def pop_dispatchable(self, has_capacity: bool) -> Optional[WorkflowNodeDefinition]:
+        if self._immediate:
+            return self.definitions[self._immediate.popleft()]
+        if not has_capacity:
+            return None
+        while True:
+            # Candidates are the unblocked heap plus every parked heap whose tag
+            # has room for its weight; each entry moves at most once per call.
+            best = self._ready if self._ready else None
+            for (tag, weight), parked in self._parked.items():
+                if not parked or self._resource_usage[tag] + weight > self._resource_limits[tag]:
+                    continue
+                if best is None or parked[0] < best[0]:
+                    best = parked
+            if best is None:
+                return None
+            entry = heapq.heappop(best)
+            node = self.definitions[entry[-1]]
+            blocking = self._blocking(node)
+            if blocking is None:
+                return node
+            heapq.heappush(self._parked[blocking], entry)
+
+    def mark_started(self, node: WorkflowNodeDefinition) -> None:
+        self._summary.timings[node.id].started_at = time.time() * 1000
+        self._started.add(node.id)
+        self._running.add(node.id)
+        for tag, weight in (node.resources or {}).items():
+            self._resource_usage[tag] += weight
+        for consumer in self._consumers[node.id]:
+            self._release(consumer)
+
+    async def mark_finished(self, node_id: str) -> None:
+        timing = self._summary.timings[node_id]
+        if timing.finished_at is None:
+            timing.finished_at = time.time() * 1000
+        self._running.discard(node_id)
+        self._waiting_producers.pop(node_id, None)
+        for tag, weight in (self.definitions[node_id].resources or {}).items():
+            self._resource_usage[tag] -= weight
+        error = self._summary.failed.get(node_id)
+        if node_id not in self._summary.completed and error is None:
+            error = RuntimeError(f"Node {node_id} was cancelled.")
+        for stream in self._streams[node_id].values():
+            await stream.close(error)
+        for producer in dict.fromkeys(self.definitions[node_id].consumes or []):
+            await self._streams[producer][node_id].detach()
+
+    @property
+    def waiting(self) -> int:
+        """Number of running producers currently blocked on a full stream."""
+
+        return len(self._waiting_producers)
+
+    def stalled(self, in_flight: int) -> bool:
+        """Whether every in-flight node is a producer stuck on a full stream."""
+
+        return (
+            0 < in_flight == len(self._waiting_producers)
+            and not self._immediate
+            and all(stream.full for stream in self._waiting_producers.values())
+        )
+
+    async def abort_stalled(self) -> None:
+        for producer, stream in list(self._waiting_producers.items()):
+            consumers = [c for c, s in self._streams[producer].items() if s is stream]
+            await stream.abort(
+                RuntimeError(
+                    f"Node {producer} is blocked on a full stream to {consumers[0]}, "
+                    "which cannot make progress."
+                )
+            )
+
+    async def detach_unstarted(self) -> None:
+        """Detaches the streams of running producers whose consumers have not started."""
+
+        for producer in self._running:
+            for consumer, stream in self._streams[producer].items():
+                if consumer not in self._started:
+                    await stream.detach()
+
+    def wait_for_blocked_producer(self) -> Optional[asyncio.Future[Any]]:
+        """Returns a future that resolves when a running producer blocks, if any can."""
+
+        if not any(self._streams[node_id] for node_id in self._running):
+            return None
+        if self._producer_blocked is None:
+            self._producer_blocked = asyncio.Event()
+        self._producer_blocked.clear()
+        return asyncio.ensure_future(self._producer_blocked.wait())
+
+    def release_dependents(self, node_id: str) -> None:
+        for dependent in self.dependents[node_id]:
+            self._release(dependent)
+
+    def context_for(
+        self, node: WorkflowNodeDefinition, context: WorkflowContext
+    ) -> WorkflowContext:
+        if not node.consumes:
+            return context
+        streams = {producer: self._streams[producer][node.id] for producer in node.consumes}
+        return replace(context, streams=streams)
+
+    def outputs_of(self, node_id: str) -> List[WorkflowStream]:
+        return list(self._streams[node_id].values())
+
+    async def close_streams(self) -> None:
+        for producer, streams in self._streams.items():
+            for stream in streams.values():
+                await stream.close(RuntimeError(f"Node {producer} did not finish."))
+
+    def _on_stream_wait(self, stream: WorkflowStream, waiting: bool) -> None:
+        if not waiting:
+            self._waiting_producers.pop(stream.source, None)
+            return
+        self._waiting_producers[stream.source] = stream
+        if self._producer_blocked is not None:
+            self._producer_blocked.set()
+
+    def _release(self, node_id: str) -> None:
+        self._pending[node_id] -= 1
+        if not self._pending[node_id]:
+            self._push_ready(node_id)
+
+    def _push_ready(self, node_id: str) -> None:
+        self._summary.timings[node_id].ready_at = time.time() * 1000
+        node = self.definitions[node_id]
+        if any(producer in self._running for producer in node.consumes or []):
+            self._immediate.append(node_id)
+            return
+        heapq.heappush(
+            self._ready, (-node.priority, -self._ranks[node_id], self._order[node_id], node_id)
+        )
+
+    def _blocking(self, node: WorkflowNodeDefinition) -> Optional[Tuple[str, float]]:
+        for tag, weight in (node.resources or {}).items():
+            limit = self._resource_limits.get(tag)
+            if limit is not None and self._resource_usage[tag] + weight > limit:
+                return tag, weight
+        return None
+
+    def _link(self, source: str, target: str) -> None:
+        self.successors[source].append(target)
+        self.predecessors[target].append(source)
+
+    def _rank(self, node_list: List[WorkflowNodeDefinition]) -> None:
+        costs = {node.id: self._engine.estimated_cost(node) for node in node_list}
+        if self._default_cost is None:
+            known = [cost for cost in costs.values() if cost is not None]
+            self._default_cost = sum(known) / len(known) if known else 1.0
+        for node in reversed(_topological_order(node_list, self.successors)):
+            cost = costs[node.id]
+            tail = max((self._ranks[child] for child in self.successors[node.id]), default=0.0)
+            self._ranks[node.id] = (self._default_cost if cost is None else cost) + tail
+
+    def _validate(self, node_list: List[WorkflowNodeDefinition]) -> None:
+        # Checked before any state changes so a rejected batch leaves the graph intact.
+        known = set(self.definitions)
+        for node in node_list:
+            if node.id in known:
+                raise ValueError(f"Duplicate workflow node {node.id}.")
+            known.add(node.id)
+        streaming = {
+            node.id for node in [*self.definitions.values(), *node_list]
+            if node.stream_buffer is not None
+        }
+        for node in node_list:
+            for dependency in node.depends_on or []:
+                if dependency not in known:
+                    raise ValueError(f"Node {node.id} depends on unknown node {dependency}.")
+            for producer in node.consumes or []:
+                if producer not in streaming:
+                    raise ValueError(f"Node {node.id} consumes non-streaming node {producer}.")
+                if producer in self._started:
+                    raise ValueError(f"Node {node.id} consumes already started node {producer}.")
+            if node.stream_buffer is not None and int((node.retry or {}).get("attempts", 1)) > 1:
+                raise ValueError(f"Streaming node {node.id} cannot be retried.")
+            for tag, weight in (node.resources or {}).items():
+                if weight < 0:
+                    raise ValueError(f"Node {node.id} claims a negative weight for resource {tag}.")
+                limit = self._resource_limits.get(tag)
+                if limit is not None and weight > limit:
+                    raise ValueError(
+                        f"Node {node.id} needs {weight} of resource {tag}, "
+                        f"but the limit is {limit}."
+                    )
+        batch = {node.id for node in node_list}
+        local: Dict[str, List[str]] = {node.id: [] for node in node_list}
+        for node in node_list:
+            for source in [*(node.depends_on or []), *(node.consumes or [])]:
+                if source in batch:
+                    local[source].append(node.id)
+        _topological_order(node_list, local)
+        definitions = {**self.definitions, **{node.id: node for node in node_list}}
+        for node in node_list:
+            if node.consumes:
+                self._check_stream_resources(node, definitions)
+
+    def _check_stream_resources(
+        self, consumer: WorkflowNodeDefinition, definitions: Dict[str, WorkflowNodeDefinition]
+    ) -> None:
+        # A blocked producer keeps its resources, so the consumer's remaining
+        # dependencies must be able to run next to it.
+        for producer in dict.fromkeys(consumer.consumes or []):
+            claims = {
+                tag: weight
+                for tag, weight in (definitions[producer].resources or {}).items()
+                if tag in self._resource_limits
+            }
+            if not claims:
+                continue
+            before_producer = _ancestors(producer, definitions)
+            for ancestor in _ancestors(consumer.id, definitions) - before_producer:
+                if ancestor == producer or ancestor in self._started:
+                    continue
+                for tag, weight in (definitions[ancestor].resources or {}).items():
+                    if tag in claims and claims[tag] + weight > self._resource_limits[tag]:
+                        raise ValueError(
+                            f"Node {consumer.id} depends on {ancestor}, which cannot run "
+                            f"while producer {producer} holds resource {tag}."
+                        )
+
+
 async def _maybe_await(value: Any) -> Any:
     if asyncio.iscoroutine(value) or isinstance(value, Awaitable):
         return await value  # type: ignore[return-value]
     return value
 
+
+def _ancestors(node_id: str, definitions: Dict[str, WorkflowNodeDefinition]) -> Set[str]:
+    seen: Set[str] = set()
+    stack = list(definitions[node_id].depends_on or [])
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        stack.extend(definitions[current].depends_on or [])
+    return seen
+
+
+def _topological_order(
+    node_list: List[WorkflowNodeDefinition],
+    successors: Dict[str, List[str]],
+) -> List[WorkflowNodeDefinition]:
+    definition_map = {node.id: node for node in node_list}
+    indegree = {node.id: 0 for node in node_list}
+    for node in node_list:
+        for successor in successors[node.id]:
+            if successor in indegree:
+                indegree[successor] += 1
+    queue = deque(node.id for node in node_list if indegree[node.id] == 0)
+    order: List[WorkflowNodeDefinition] = []
+    while queue:
+        node_id = queue.popleft()
+        order.append(definition_map[node_id])
+        for successor in successors[node_id]:
+            if successor not in indegree:
+                continue
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                queue.append(successor)
+    if len(order) != len(node_list):
+        raise ValueError("Workflow contains a dependency cycle.")
+    return order
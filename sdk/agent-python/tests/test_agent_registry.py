@@ -1,8 +1,16 @@
+import asyncio
+import time
+
+import pytest
+
 from codex_agent_protocol import (
     AgentDefinition,
+    AgentPool,
+    AgentPoolOptions,
     AgentRegistry,
     AgentStatus,
     Capability,
+    LivenessChecker,
 )
 
 
@@ -23,3 +31,159 @@ def test_register_and_update_state():
     assert events == ["assistant"]
 
 
+def test_indexed_queries_and_change_feed():
+    registry = AgentRegistry(change_log_size=3)
+    capability_sets = [[Capability.EXEC], [Capability.EXEC, Capability.READ_FS]]
+    for index, capabilities in enumerate(capability_sets):
+        registry.register(
+            AgentDefinition(
+                id=f"agent-{index}",
+                name="Worker",
+                capabilities=capabilities,
+                metadata={"tags": ["gpu"] if index else []},
+            )
+        )
+    _, version = registry.changes()
+    registry.set_status("agent-1", AgentStatus.IDLE)
+    registry.set_status("agent-0", AgentStatus.IDLE)
+
+    assert registry.pick(AgentStatus.IDLE, Capability.READ_FS).definition.id == "agent-1"
+    assert [entry.definition.id for entry in registry.find(capability=Capability.EXEC)] == [
+        "agent-0",
+        "agent-1",
+    ]
+    assert [entry.definition.id for entry in registry.find(tag="gpu")] == ["agent-1"]
+    assert registry.find(status=AgentStatus.OFFLINE) == []
+    assert registry.count(AgentStatus.IDLE) == 2
+
+    changes, latest = registry.changes(version)
+    assert [(change.kind, change.agent_id) for change in changes] == [
+        ("stateChanged", "agent-1"),
+        ("stateChanged", "agent-0"),
+    ]
+    assert changes[0].entry.state.status is AgentStatus.IDLE
+    registry.unregister("agent-1")
+    registry.unregister("agent-0")
+    with pytest.raises(ValueError):
+        registry.changes(version)
+    assert registry.changes(latest)[0][-1].kind == "unregistered"
+    assert registry.pick(capability=Capability.EXEC) is None
+
+
+def test_liveness_checker_moves_silent_agents_offline():
+    registry = AgentRegistry()
+    for agent_id in ("alive", "silent", "stopped"):
+        registry.register(AgentDefinition(id=agent_id, name=agent_id, capabilities=[]))
+        registry.set_status(agent_id, AgentStatus.RUNNING)
+    registry.set_status("stopped", AgentStatus.STOPPED)
+    changed = []
+    registry.on("stateChanged", lambda agent_id, state: changed.append((agent_id, state.status)))
+    checker = LivenessChecker(registry, timeout_ms=1000, tick_ms=100)
+    start = time.monotonic()
+
+    checker.track("alive", now=start)
+    checker.track("silent", now=start)
+    checker.track("stopped", now=start)
+    checker.track("alive", now=start + 0.8)
+
+    assert checker.advance(now=start + 0.5) == []
+    assert checker.advance(now=start + 1.2) == ["silent"]
+    assert registry.get("silent").state.status is AgentStatus.OFFLINE
+    assert changed == [("silent", AgentStatus.OFFLINE)]
+    assert checker.advance(now=start + 60) == ["alive"]
+
+    registry.heartbeat("alive")
+    assert registry.last_heartbeat("alive") is not None
+
+
+def test_liveness_checker_tracks_active_agents_and_restores_them_on_heartbeat():
+    registry = AgentRegistry()
+    checker = LivenessChecker(registry, timeout_ms=1000, tick_ms=100)
+    registry.register(AgentDefinition(id="quiet", name="quiet", capabilities=[]))
+    registry.register(AgentDefinition(id="idle", name="idle", capabilities=[]))
+    start = time.monotonic()
+    registry.set_status("quiet", AgentStatus.RUNNING)
+    registry.set_status("idle", AgentStatus.RUNNING)
+    registry.set_status("idle", AgentStatus.STOPPED)
+
+    assert checker.advance(now=start + 0.5) == []
+    assert checker.advance(now=start + 1.5) == ["quiet"]
+    assert registry.get("quiet").state.status is AgentStatus.OFFLINE
+
+    registry.heartbeat("quiet")
+    state = registry.get("quiet").state
+    assert state.status is AgentStatus.RUNNING and state.error is None
+    assert checker.advance(now=time.monotonic() + 0.5) == []
+    assert checker.advance(now=time.monotonic() + 60) == ["quiet"]
+
+
+def test_agent_pool_scales_within_max_instances():
+    registry = AgentRegistry()
+    stopped: list[str] = []
+    definition = AgentDefinition(id="coder", name="Coder", capabilities=[], max_instances=2)
+
+    async def scenario():
+        pool = AgentPool(
+            registry,
+            definition,
+            AgentPoolOptions(idle_timeout_ms=10, on_stop=stopped.append),
+        )
+        release = asyncio.Event()
+        seen: list[str] = []
+
+        async def work(instance_id: str) -> str:
+            seen.append(instance_id)
+            await release.wait()
+            return instance_id
+
+        tasks = [asyncio.create_task(pool.submit(work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert pool.stats() == {"instances": 2, "busy": 2, "in_flight": 2, "queued": 1}
+        assert registry.count(AgentStatus.RUNNING) == 2
+        release.set()
+        results = await asyncio.gather(*tasks)
+        assert sorted(set(results)) == ["coder#1", "coder#2"]
+        assert registry.count(AgentStatus.IDLE) == 2
+        await asyncio.sleep(0.05)
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert pool.stats()["instances"] == 0
+    assert sorted(stopped) == ["coder#1", "coder#2"]
+    assert registry.list() == []
+    singleton = AgentDefinition("one", "One", [], singleton=True, max_instances=4)
+    assert AgentPool(registry, singleton).max_instances == 1
+    capped = AgentDefinition("capped", "Capped", [], max_instances=2)
+    assert AgentPool(registry, capped, AgentPoolOptions(max_instances=5)).max_instances == 2
+    assert AgentPool(registry, capped, AgentPoolOptions(max_instances=1)).max_instances == 1
+    assert AgentPool(registry, capped).max_instances == 2
+
+
+def test_agent_pool_reclaims_instance_handed_to_cancelled_waiter():
+    registry = AgentRegistry()
+    definition = AgentDefinition(id="solo", name="Solo", capabilities=[], max_instances=1)
+
+    async def scenario():
+        pool = AgentPool(registry, definition)
+        release = asyncio.Event()
+
+        async def hold(instance_id: str) -> str:
+            await release.wait()
+            return instance_id
+
+        holder = asyncio.create_task(pool.submit(hold))
+        queued = asyncio.create_task(pool.submit(lambda instance_id: instance_id))
+        await asyncio.sleep(0)
+        assert pool.stats()["queued"] == 1
+        release.set()
+        await asyncio.sleep(0)
+        assert holder.done()
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert pool.stats()["in_flight"] == 0
+        result = await asyncio.wait_for(pool.submit(lambda instance_id: instance_id), 1)
+        await pool.close()
+        return result
+
+    assert asyncio.run(scenario()) == "solo#1"
@@ -1,4 +1,25 @@
-from codex_agent_protocol import InMemoryContextStore, PromptPackOptions, pack_prompt
+import asyncio
+import dataclasses
+import json
+import time
+import weakref
+
+import pytest
+
+from codex_agent_protocol import (
+    BlobRef,
+    BlobStore,
+    CodexClient,
+    CodexCommand,
+    InMemoryContextStore,
+    PromptPackOptions,
+    encode_prompt_package,
+    pack_prompt,
+)
+
+
+class Payload:
+    pass
 
 
 def test_pack_prompt_with_keys():
@@ -17,3 +38,315 @@ def test_snapshot_copies_values():
     store.set("session", "foo", 2)
     assert snapshot.data["foo"] == 1
 
+
+def test_snapshot_is_versioned_and_read_only():
+    store = InMemoryContextStore()
+    store.set("session", "foo", 1)
+    first = store.snapshot("session")
+    again = store.snapshot("session")
+    store.set("session", "bar", 2)
+    latest = store.snapshot("session")
+
+    assert first.version == again.version < latest.version == store.version("session")
+    assert dict(first.data) == {"foo": 1}
+    assert dict(latest.data) == {"foo": 1, "bar": 2}
+    with pytest.raises(TypeError):
+        first.data["foo"] = 3  # type: ignore[index]
+
+
+def test_pack_prompt_respects_token_budget():
+    calls: list[object] = []
+
+    def estimator(value: object) -> int:
+        calls.append(value)
+        return len(str(value))
+
+    store = InMemoryContextStore(token_estimator=estimator)
+    store.set("session", "old", "a" * 10)
+    store.set("session", "pinned", "b" * 10)
+    store.set("session", "huge", "c" * 50)
+    store.set("session", "new", "d" * 10)
+
+    options = PromptPackOptions(
+        namespace="session",
+        max_tokens=25,
+        priorities={"pinned": 1},
+        truncate=lambda key, value, budget: value[:budget] if key == "huge" else None,
+    )
+    package = pack_prompt(store, options)
+
+    assert [entry["key"] for entry in package.entries] == ["pinned", "new", "huge"]
+    assert package.entries[2]["value"] == "c" * 5
+    assert package.truncated == ["huge"]
+    assert package.dropped == ["old"]
+    assert package.token_estimate == 25
+
+    calls.clear()
+    pack_prompt(store, options)
+    assert calls == ["c" * 5]
+
+
+def test_pack_prompt_builds_deltas_between_snapshots():
+    store = InMemoryContextStore()
+    store.set("session", "question", "hello")
+    store.set("session", "answer", "world")
+    store.set("session", "draft", "tbd")
+    first = pack_prompt(store, PromptPackOptions(namespace="session"))
+
+    store.set("session", "answer", "there")
+    store.set("session", "followup", "why?")
+    store.delete("session", "draft")
+    delta = pack_prompt(
+        store, PromptPackOptions(namespace="session", since_snapshot=first.snapshot_id)
+    )
+
+    assert delta.base_snapshot_id == first.snapshot_id
+    assert delta.entries == [
+        {"key": "followup", "value": "why?"},
+        {"key": "answer", "value": "there"},
+    ]
+    assert delta.removed == ["draft"]
+
+    unchanged = pack_prompt(
+        store, PromptPackOptions(namespace="session", since_snapshot=delta.snapshot_id)
+    )
+    assert unchanged.entries == [] and unchanged.removed == []
+
+    fallback = pack_prompt(store, PromptPackOptions(namespace="session", since_snapshot="gone"))
+    assert fallback.base_snapshot_id is None
+    assert len(fallback.entries) == 3
+
+
+def test_pack_prompt_offers_budget_dropped_keys_again():
+    store = InMemoryContextStore()
+    store.set("session", "small", "hi")
+    first = pack_prompt(store, PromptPackOptions(namespace="session"))
+    store.set("session", "small", "hey")
+    store.set("session", "large", "x" * 400)
+
+    limited = pack_prompt(
+        store,
+        PromptPackOptions(namespace="session", since_snapshot=first.snapshot_id, max_tokens=10),
+    )
+    assert [entry["key"] for entry in limited.entries] == ["small"]
+    assert limited.dropped == ["large"]
+
+    retry = pack_prompt(
+        store, PromptPackOptions(namespace="session", since_snapshot=limited.snapshot_id)
+    )
+    assert retry.base_snapshot_id == limited.snapshot_id
+    assert [entry["key"] for entry in retry.entries] == ["large"]
+
+
+def test_snapshot_history_keeps_versions_but_not_values():
+    store = InMemoryContextStore()
+    payload = Payload()
+    collected = weakref.ref(payload)
+    store.set("session", "payload", payload)
+    first = pack_prompt(store, PromptPackOptions(namespace="session")).snapshot_id
+    del payload
+    store.set("session", "payload", "replaced")
+
+    assert collected() is None
+    delta = pack_prompt(store, PromptPackOptions(namespace="session", since_snapshot=first))
+    assert delta.base_snapshot_id == first
+    assert delta.entries == [{"key": "payload", "value": "replaced"}]
+
+
+def test_large_values_are_deduplicated_into_blobs(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"), segment_bytes=4096)
+    first = InMemoryContextStore(blob_store=blobs, blob_threshold=100)
+    second = InMemoryContextStore(blob_store=blobs, blob_threshold=100)
+    diff = "+ added line\n" * 200
+
+    first.set("session-a", "diff", diff)
+    second.set("session-b", "diff", diff)
+    first.set("session-a", "title", "small")
+
+    assert isinstance(first.snapshot("session-a").data["diff"], BlobRef)
+    assert second.get("session-b", "diff") == diff
+    assert blobs.stats()["blobs"] == 1
+
+    package = pack_prompt(
+        first,
+        PromptPackOptions(
+            namespace="session-a",
+            attachments=[{"name": "patch", "content": blobs.put(b"\x00binary")}],
+        ),
+    )
+    assert {entry["key"]: entry["value"] for entry in package.entries} == {
+        "diff": diff,
+        "title": "small",
+    }
+    assert package.attachments == [{"name": "patch", "content": b"\x00binary"}]
+
+    blobs.close()
+    reopened = BlobStore(str(tmp_path / "blobs"))
+    assert reopened.get(first.snapshot("session-a").data["diff"]) == diff
+    reopened.close()
+
+
+def test_blob_threshold_counts_bytes_and_unreferenced_blobs_are_collected(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"), segment_bytes=4096)
+    store = InMemoryContextStore(blob_store=blobs, blob_threshold=100, snapshot_history=0)
+    store.set("session", "wide", "é" * 60)
+    store.set("session", "old", "a" * 3000)
+    store.set("session", "old", "b" * 3000)
+    assert isinstance(store.snapshot("session").data["wide"], BlobRef)
+    assert blobs.stats()["blobs"] == 3
+
+    assert store.collect_blobs() > 3000
+    assert blobs.stats()["blobs"] == 2
+    assert store.get("session", "old") == "b" * 3000
+    blobs.close()
+    reopened = BlobStore(str(tmp_path / "blobs"))
+    assert reopened.stats()["blobs"] == 2
+    reopened.close()
+
+
+def test_watch_pushes_changes_and_resumes_from_version():
+    store = InMemoryContextStore(change_log_size=4)
+    seen = []
+    watch = store.watch("session", seen.extend, prefix="file:")
+    store.set("session", "file:a", 1)
+    store.set("session", "note", "ignored")
+    store.delete("session", "file:a")
+    watch.close()
+    store.set("session", "file:b", 2)
+
+    assert [(change.key, change.deleted) for change in seen] == [
+        ("file:a", False),
+        ("file:a", True),
+    ]
+
+    replayed = []
+    store.watch("session", replayed.extend, since=seen[0].version)
+    assert [change.key for change in replayed] == ["note", "file:a", "file:b"]
+
+    for index in range(4):
+        store.set("session", f"k{index}", index)
+    with pytest.raises(ValueError):
+        store.watch("session", replayed.extend, since=seen[0].version)
+
+    batches = []
+    store.watch("session", batches.append)
+    store.clear()
+    assert len(batches) == 1 and all(change.deleted for change in batches[0])
+
+
+def test_watch_async_coalesces_per_key():
+    async def scenario():
+        store = InMemoryContextStore()
+        watch = store.watch_async("session")
+        store.set("session", "draft", "v1")
+        store.set("session", "draft", "v2")
+        store.set("session", "title", "t")
+        batch = await watch.__anext__()
+
+        async def write_later():
+            await asyncio.sleep(0)
+            store.delete("session", "title")
+            watch.close()
+
+        writer = asyncio.create_task(write_later())
+        rest = [change async for change_batch in watch for change in change_batch]
+        await writer
+        return batch, rest
+
+    batch, rest = asyncio.run(scenario())
+    assert [(change.key, change.version) for change in batch] == [("draft", 2), ("title", 3)]
+    assert [(change.key, change.deleted) for change in rest] == [("title", True)]
+
+
+def test_byte_budget_evicts_least_recently_used_namespaces():
+    store = InMemoryContextStore(max_bytes=700)
+    evicted = []
+    store.watch("old", evicted.extend)
+    store.set("old", "text", "a" * 150)
+    store.set("read", "text", "b" * 150)
+    store.set("fresh", "text", "c" * 150)
+    assert store.get("read", "text") == "b" * 150
+
+    store.set("new", "text", "d" * 150)
+
+    assert sorted(store.list_namespaces()) == ["fresh", "new", "read"]
+    assert [(change.key, change.deleted) for change in evicted] == [("text", False), ("text", True)]
+    stats = store.stats()
+    assert stats["evictions"] == 1 and stats["evicted_keys"] == 1
+    assert stats["bytes"] <= 700
+
+    cyclic: dict = {}
+    cyclic["self"] = cyclic
+    unbounded = InMemoryContextStore()
+    for target in (unbounded, store):
+        target.set("odd", "tuple-keys", {(1, 2): "x"})
+        target.set("odd", "cycle", cyclic)
+        assert target.get("odd", "cycle") is cyclic
+    assert unbounded.stats()["bytes"] == 0
+
+
+def test_eviction_releases_history_of_evicted_namespaces():
+    store = InMemoryContextStore(max_bytes=700)
+    payload = Payload()
+    collected = weakref.ref(payload)
+    store.set("old", "payload", payload)
+    first = pack_prompt(store, PromptPackOptions(namespace="old")).snapshot_id
+    del payload
+    for index in range(8):
+        store.set(f"filler{index}", "text", "x" * 150)
+
+    assert "old" not in store.list_namespaces()
+    assert collected() is None
+    store.set("old", "payload", "again")
+    fallback = pack_prompt(store, PromptPackOptions(namespace="old", since_snapshot=first))
+    assert fallback.base_snapshot_id is None
+
+
+def test_namespace_ttl_expires_idle_namespaces():
+    store = InMemoryContextStore(default_ttl_ms=10_000, sweep_interval_ms=0)
+    store.set_ttl("scratch", 1)
+    store.set("scratch", "tmp", 1)
+    store.set("session", "keep", 2)
+    time.sleep(0.01)
+
+    assert store.get("scratch", "tmp") is None
+    assert store.list_namespaces() == ["session"]
+    assert store.evict_expired() == 1
+    assert store.stats()["expirations"] == 1
+    assert store.get("session", "keep") == 2
+
+
+def test_prompt_entries_are_pre_encoded_and_reused():
+    store = InMemoryContextStore()
+    store.set("session", "question", "hello")
+    store.set("session", "files", {"a.py": [1, 2]})
+    first = pack_prompt(store, PromptPackOptions(namespace="session", session_id="s1"))
+    store.set("session", "question", "updated")
+    second = pack_prompt(store, PromptPackOptions(namespace="session", session_id="s1"))
+
+    assert first.encoded_entries[1] is second.encoded_entries[1]
+    assert second.encoded_entries[0] == json.dumps({"key": "question", "value": "updated"})
+    fields = {item.name: getattr(second, item.name) for item in dataclasses.fields(second)}
+    fields.pop("encoded_entries")
+    assert encode_prompt_package(second) == json.dumps(fields)
+
+    payload = CodexClient._encode_request("req", CodexCommand(op="run", args={"prompt": second}))
+    assert json.loads(payload) == {
+        "id": "req",
+        "op": "run",
+        "args": {"prompt": fields},
+        "timeout_ms": None,
+    }
+
+
+def test_unresolved_blob_packs_do_not_reuse_resolved_fragments(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"))
+    store = InMemoryContextStore(blob_store=blobs, blob_threshold=10)
+    store.set("session", "diff", "+ line\n" * 10)
+    resolved = pack_prompt(store, PromptPackOptions(namespace="session"))
+    raw = pack_prompt(store, PromptPackOptions(namespace="session", resolve_blobs=False))
+
+    assert resolved.encoded_entries == [json.dumps(resolved.entries[0])]
+    assert isinstance(raw.entries[0]["value"], BlobRef)
+    assert raw.encoded_entries is None
+    blobs.close()
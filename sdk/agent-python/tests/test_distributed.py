@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+
+from codex_agent_protocol import (
+    DistributedWorkerOptions,
+    DistributedWorkflowEngine,
+    InMemoryContextStore,
+    WorkflowContext,
+    WorkflowExecutionOptions,
+    WorkflowNodeDefinition,
+)
+
+
+def report_pid(context: WorkflowContext) -> int:
+    return os.getpid()
+
+
+def write_marker(context: WorkflowContext) -> int:
+    context.context_store.set("ns", "k", "v")
+    return os.getpid()
+
+
+def hang(context: WorkflowContext) -> None:
+    time.sleep(60)
+
+
+def crash_once(context: WorkflowContext) -> str:
+    marker = context.metadata["marker"]
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "recovered"
+
+
+def test_distributed_engine_runs_nodes_in_workers(tmp_path):
+    engine = DistributedWorkflowEngine(
+        DistributedWorkerOptions(
+            workers=2, poll_interval_ms=5, context_store_factory=InMemoryContextStore
+        )
+    )
+    results: dict[str, object] = {}
+    lost: list[str] = []
+    engine.on("workerLost", lost.append)
+
+    try:
+        summary = asyncio.run(
+            engine.run(
+                nodes=[
+                    WorkflowNodeDefinition(id="remote", run=report_pid),
+                    WorkflowNodeDefinition(id="crash", run=crash_once, depends_on=["remote"]),
+                    WorkflowNodeDefinition(
+                        id="local", run=lambda ctx: "coordinator", depends_on=["crash"]
+                    ),
+                ],
+                context=WorkflowContext(
+                    context_store=InMemoryContextStore(),
+                    metadata={"marker": str(tmp_path / "crashed")},
+                ),
+                options=WorkflowExecutionOptions(
+                    on_task_complete=lambda node_id, result: results.update({node_id: result})
+                ),
+            )
+        )
+    finally:
+        engine.stop()
+
+    assert summary.completed == {"remote", "crash", "local"}
+    assert results["remote"] != os.getpid()
+    assert results["crash"] == "recovered"
+    assert results["local"] == "coordinator"
+    assert lost
+
+
+def test_distributed_engine_recycles_worker_of_timed_out_node():
+    engine = DistributedWorkflowEngine(
+        DistributedWorkerOptions(
+            workers=1, poll_interval_ms=5, context_store_factory=InMemoryContextStore
+        )
+    )
+    recycled: list[str] = []
+    engine.on("workerRecycled", recycled.append)
+
+    async def scenario():
+        async with engine:
+            original = engine.worker_ids()
+            summary = await engine.run(
+                nodes=[
+                    WorkflowNodeDefinition(id="hang", run=hang, timeout_ms=500, priority=1),
+                    WorkflowNodeDefinition(id="after", run=report_pid),
+                ],
+                context=WorkflowContext(context_store=InMemoryContextStore()),
+                options=WorkflowExecutionOptions(concurrency=2, fail_fast=False),
+            )
+            assert engine.worker_ids() != original
+            return summary, original
+
+    started = time.monotonic()
+    summary, original = asyncio.run(scenario())
+
+    assert isinstance(summary.failed["hang"], TimeoutError)
+    assert summary.completed == {"after"}
+    assert recycled == original
+    assert engine.worker_ids() == []
+    assert time.monotonic() - started < 30
+
+
+def test_distributed_engine_keeps_nodes_local_without_a_store_factory():
+    engine = DistributedWorkflowEngine(DistributedWorkerOptions(workers=1, poll_interval_ms=5))
+    store = InMemoryContextStore()
+    results: dict[str, object] = {}
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=[
+                WorkflowNodeDefinition(id="write", run=write_marker),
+                WorkflowNodeDefinition(
+                    id="read",
+                    run=lambda context: context.context_store.get("ns", "k"),
+                    depends_on=["write"],
+                ),
+            ],
+            context=WorkflowContext(context_store=store),
+            options=WorkflowExecutionOptions(
+                on_task_complete=lambda node_id, result: results.update({node_id: result})
+            ),
+        )
+    )
+
+    assert summary.completed == {"write", "read"}
+    assert results == {"write": os.getpid(), "read": "v"}
+    assert store.get("ns", "k") == "v"
+    assert engine.worker_ids() == []
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from codex_agent_protocol import (
+    IntegrationAdapter,
+    IntegrationHost,
+    IntegrationPolicy,
+    MetricsRegistry,
+)
+
+
+def test_invoke_applies_bulkhead_timeout_and_offload():
+    metrics = MetricsRegistry()
+    host = IntegrationHost(metrics=metrics)
+    active = 0
+    peak = 0
+
+    async def limited(args):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return args
+
+    def blocking(args):
+        time.sleep(0.01)
+        return threading.current_thread() is threading.main_thread()
+
+    async def slow(args):
+        await asyncio.sleep(1)
+
+    policies = {
+        "limited": (limited, IntegrationPolicy(max_concurrency=2)),
+        "blocking": (blocking, IntegrationPolicy(offload_sync=True)),
+        "slow": (slow, IntegrationPolicy(timeout_ms=10)),
+    }
+    for name, (invoke, policy) in policies.items():
+        host.register(IntegrationAdapter(name, [], invoke), policy)
+
+    async def scenario():
+        results = await asyncio.gather(*(host.invoke("limited", index) for index in range(5)))
+        assert results == list(range(5))
+        assert await host.invoke("blocking", None) is False
+        with pytest.raises(asyncio.TimeoutError):
+            await host.invoke("slow", None)
+
+    asyncio.run(scenario())
+    assert peak == 2
+    stats = host.stats()
+    assert stats["limited"]["calls"] == 5
+    assert stats["slow"]["timeouts"] == 1
+    assert 'adapter="slow",outcome="timeout"' in metrics.render_prometheus()
+
+
+def test_circuit_breaker_opens_and_recovers_through_half_open_probe():
+    host = IntegrationHost()
+    healthy = False
+
+    def flaky(args):
+        if not healthy:
+            raise ConnectionError("down")
+        return "ok"
+
+    policy = IntegrationPolicy(failure_threshold=2, reset_timeout_ms=20)
+    host.register(IntegrationAdapter("flaky", [], flaky), policy)
+
+    async def scenario():
+        nonlocal healthy
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await host.invoke("flaky", None)
+        with pytest.raises(RuntimeError, match="circuit open"):
+            await host.invoke("flaky", None)
+        await asyncio.sleep(0.03)
+        healthy = True
+        assert await host.invoke("flaky", None) == "ok"
+
+    asyncio.run(scenario())
+    stats = host.stats("flaky")["flaky"]
+    assert (stats["state"], stats["errors"], stats["rejected"]) == ("closed", 2, 1)
+
+
+def test_circuit_breaker_ignores_outcomes_of_calls_admitted_before_it_opened():
+    host = IntegrationHost()
+
+    async def adapter(args):
+        outcome, gate = args
+        if gate is not None:
+            await gate.wait()
+        if outcome == "fail":
+            raise ConnectionError("down")
+        return "ok"
+
+    policy = IntegrationPolicy(failure_threshold=2, reset_timeout_ms=200)
+    host.register(IntegrationAdapter("svc", [], adapter), policy)
+
+    async def scenario():
+        slow_ok, slow_fail = asyncio.Event(), asyncio.Event()
+        pending_ok = asyncio.create_task(host.invoke("svc", ("ok", slow_ok)))
+        pending_fail = asyncio.create_task(host.invoke("svc", ("fail", slow_fail)))
+        await asyncio.sleep(0)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await host.invoke("svc", ("fail", None))
+        opened = time.monotonic()
+
+        slow_ok.set()
+        assert await pending_ok == "ok"
+        assert host.stats("svc")["svc"]["state"] == "open"
+        await asyncio.sleep(0.12)
+        slow_fail.set()
+        with pytest.raises(ConnectionError):
+            await pending_fail
+        await asyncio.sleep(max(0.0, opened + 0.22 - time.monotonic()))
+        assert await host.invoke("svc", ("ok", None)) == "ok"
+
+    asyncio.run(scenario())
+    stats = host.stats("svc")["svc"]
+    assert (stats["state"], stats["errors"]) == ("closed", 3)
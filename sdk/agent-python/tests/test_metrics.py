@@ -0,0 +1,62 @@
+import asyncio
+import urllib.request
+
+import pytest
+
+from codex_agent_protocol import (
+    InMemoryContextStore,
+    MessageBus,
+    MetricsRegistry,
+    SessionStore,
+    WorkflowContext,
+    WorkflowEngine,
+    WorkflowNodeDefinition,
+)
+from codex_agent_protocol.metrics import Histogram
+
+
+def test_histogram_buckets_bound_relative_error():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.observe(value)
+
+    assert histogram.count == 1000
+    assert 500 <= histogram.quantile(0.5) <= 500 * 1.125
+    assert 990 <= histogram.quantile(0.99) <= 990 * 1.125
+
+
+def test_components_report_to_registry(tmp_path):
+    metrics = MetricsRegistry()
+    bus = MessageBus(metrics=metrics)
+    bus.subscribe("topic", lambda envelope: None)
+    bus.publish("topic", {})
+    sessions = SessionStore(metrics=metrics)
+    sessions.create()
+    store = InMemoryContextStore(metrics=metrics)
+    store.set("session", "key", "value")
+    engine = WorkflowEngine(metrics=metrics)
+    nodes = [WorkflowNodeDefinition(id="a", run=lambda context: None)]
+    asyncio.run(engine.run(nodes, WorkflowContext(context_store=store)))
+
+    text = metrics.render_prometheus()
+    assert 'codex_bus_dispatch_duration_ms_count{type="broadcast"} 1' in text
+    assert "codex_sessions 1" in text
+    assert "codex_context_namespaces 1" in text
+    assert 'codex_workflow_node_duration_ms_count{outcome="completed"} 1' in text
+    with pytest.raises(ValueError):
+        SessionStore(metrics=metrics)
+    with pytest.raises(ValueError):
+        InMemoryContextStore(metrics=metrics)
+    WorkflowEngine(metrics=metrics)
+
+    path = tmp_path / "codex.prom"
+    metrics.write_prometheus(str(path))
+    assert path.read_text() == text
+
+    server = metrics.serve_prometheus()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert b"# TYPE codex_sessions gauge" in response.read()
+    finally:
+        server.shutdown()
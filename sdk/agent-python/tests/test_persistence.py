@@ -0,0 +1,22 @@
+from codex_agent_protocol import PromptPackOptions, SqliteContextStore, pack_prompt
+
+
+def test_sqlite_context_store_persists_across_instances(tmp_path):
+    path = str(tmp_path / "context.sqlite3")
+    store = SqliteContextStore(path, cache_size=2, batch_size=10)
+    store.set("session", "question", "hello")
+    store.set("session", "answer", {"text": "world"})
+    store.set("other", "flag", True)
+    store.delete("other", "flag")
+
+    assert store.get("session", "answer") == {"text": "world"}
+    snapshot = store.snapshot("session")
+    assert dict(snapshot.data) == {"question": "hello", "answer": {"text": "world"}}
+    assert snapshot.version == store.version("session") > 0
+    store.close()
+
+    reopened = SqliteContextStore(path)
+    assert reopened.list_namespaces() == ["session"]
+    package = pack_prompt(reopened, PromptPackOptions(namespace="session", keys=["question"]))
+    assert package.entries == [{"key": "question", "value": "hello"}]
+    reopened.close()
@@ -3,7 +3,13 @@ import tempfile
 
 import pytest
 
-from codex_agent_protocol import Capability, SecurityDescriptor, SecurityGuard
+from codex_agent_protocol import (
+    AuthorizationPlan,
+    Capability,
+    CapabilityMask,
+    SecurityDescriptor,
+    SecurityGuard,
+)
 
 
 def test_security_guard_enforces_fs_allowlist():
@@ -21,3 +27,86 @@ def test_security_guard_enforces_fs_allowlist():
         with pytest.raises(PermissionError):
             guard.assert_fs_access("agent", "/etc/passwd")
 
+
+def test_fs_allowlist_matches_whole_path_components(tmp_path):
+    repo = tmp_path / "repo"
+    evil = tmp_path / "repo-evil"
+    repo.mkdir()
+    evil.mkdir()
+    guard = SecurityGuard(decision_cache_size=2)
+    guard.register(
+        SecurityDescriptor(
+            agent_id="agent",
+            capabilities=[Capability.READ_FS, Capability.EXEC],
+            fs_allow_list=[str(repo)],
+            exec_allow_list=[str(repo / "tool")],
+        )
+    )
+    paths = [str(repo), str(repo / "src" / "a.py"), str(evil / "a.py"), str(repo / ".." / "x")]
+
+    assert guard.check_paths("agent", paths) == dict(zip(paths, [True, True, False, False]))
+    assert guard.check_paths("agent", paths[:1]) == {paths[0]: True}
+    guard.assert_exec("agent", str(repo / "tool"))
+    with pytest.raises(PermissionError):
+        guard.assert_exec("agent", str(evil / "tool"))
+
+    guard.register(
+        SecurityDescriptor(
+            agent_id="agent", capabilities=[Capability.READ_FS], fs_allow_list=[str(evil)]
+        )
+    )
+    assert guard.check_paths("agent", paths[:3]) == dict(zip(paths, [False, False, True]))
+
+
+def test_cached_decisions_follow_retargeted_symlinks(tmp_path):
+    repo = tmp_path / "repo"
+    outside = tmp_path / "outside"
+    repo.mkdir()
+    outside.mkdir()
+    (repo / "real").mkdir()
+    link = repo / "link"
+    link.symlink_to(repo / "real")
+    guard = SecurityGuard()
+    guard.register(
+        SecurityDescriptor(
+            agent_id="agent", capabilities=[Capability.READ_FS], fs_allow_list=[str(repo)]
+        )
+    )
+    guard.assert_fs_access("agent", str(link))
+
+    link.unlink()
+    link.symlink_to(outside)
+    with pytest.raises(PermissionError):
+        guard.assert_fs_access("agent", str(link))
+
+
+def test_authorization_plan_validates_once_and_issues_token(tmp_path):
+    guard = SecurityGuard()
+    guard.register(
+        SecurityDescriptor(
+            agent_id="agent",
+            capabilities=(c for c in [Capability.READ_FS, Capability.NET_OUTBOUND]),
+            fs_allow_list=[str(tmp_path)],
+        )
+    )
+    assert guard.capability_mask("agent") == CapabilityMask.READ_FS | CapabilityMask.NET_OUTBOUND
+    guard.assert_capability("agent", Capability.READ_FS)
+    guard.assert_capability("agent", Capability.READ_FS)
+
+    with pytest.raises(PermissionError) as denied:
+        guard.authorize(
+            AuthorizationPlan(agent_id="agent", paths=["/etc/passwd"], binaries=["/bin/sh"])
+        )
+    assert "EXEC" in str(denied.value) and "/etc/passwd" in str(denied.value)
+
+    target = str(tmp_path / "notes.txt")
+    token = guard.authorize(
+        AuthorizationPlan(agent_id="agent", paths=[target], network_outbound=True)
+    )
+    guard.check(token, capability=Capability.NET_OUTBOUND, path=target)
+    with pytest.raises(PermissionError):
+        guard.check(token, capability=Capability.EXEC)
+
+    guard.register(SecurityDescriptor(agent_id="agent", capabilities=[Capability.READ_FS]))
+    with pytest.raises(PermissionError):
+        guard.check(token, path=target)
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+
+from codex_agent_protocol import Telemetry, TelemetryOptions
+
+
+class RecordingSink:
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event):
+        self.events.append(event.name)
+
+
+class SlowBatchSink:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+
+    def handle_batch(self, events):
+        self.release.wait(1)
+        self.batches.append([event.name for event in events])
+
+
+def test_disabled_levels_skip_sinks():
+    sink = RecordingSink()
+    telemetry = Telemetry(
+        TelemetryOptions(level="WARNING", sinks=[sink], logger=logging.getLogger("t.levels"))
+    )
+    telemetry.debug("noise")
+    telemetry.error("boom")
+    telemetry.child({"agent": "a"}).info("child-noise")
+
+    assert sink.events == ["boom"]
+
+
+def test_async_dispatch_batches_and_counts_drops():
+    sink = SlowBatchSink()
+    telemetry = Telemetry(
+        TelemetryOptions(
+            sinks=[sink],
+            logger=logging.getLogger("t.async"),
+            async_dispatch=True,
+            buffer_size=4,
+            batch_size=4,
+            flush_interval_ms=1,
+        )
+    )
+    telemetry.info("first")
+    while telemetry.stats()["queued"]:
+        time.sleep(0.001)
+    for index in range(6):
+        telemetry.info(f"event-{index}")
+    sink.release.set()
+    assert telemetry.flush(timeout=2)
+
+    stats = telemetry.stats()
+    assert stats["dropped"] == 2 and stats["dispatched"] == 5
+    assert [name for batch in sink.batches for name in batch] == [
+        "first",
+        "event-0",
+        "event-1",
+        "event-2",
+        "event-3",
+    ]
+    telemetry.close()
+
+
+def test_rate_limits_keep_rules_and_suppressed_summary():
+    sink = RecordingSink()
+    telemetry = Telemetry(
+        TelemetryOptions(
+            level="DEBUG",
+            sinks=[sink],
+            logger=logging.getLogger("t.sampling"),
+            sample_rates={"sampled": 0.0},
+            rate_limits={"message": 2},
+            summary_interval_ms=0,
+            keep_slower_than_ms=100,
+        )
+    )
+    child = telemetry.child({"agent": "a"})
+    for _ in range(5):
+        child.debug("message")
+    telemetry.debug("sampled", {"duration_ms": 5})
+    telemetry.debug("sampled", {"duration_ms": 250})
+    telemetry.error("sampled")
+    telemetry.info("unrelated")
+
+    assert sink.events.count("message") == 2
+    assert sink.events.count("sampled") == 2
+    assert "unrelated" in sink.events
+    assert "telemetry.suppressed" in sink.events
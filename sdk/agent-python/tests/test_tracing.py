@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from codex_agent_protocol import (
+    CodexClient,
+    CodexCommand,
+    InMemoryContextStore,
+    MessageBus,
+    OtlpJsonFileSink,
+    Tracer,
+    WorkflowContext,
+    WorkflowEngine,
+    WorkflowNodeDefinition,
+    current_span_context,
+)
+
+
+def test_trace_context_flows_through_bus_codex_and_workflow(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer([OtlpJsonFileSink(str(path))])
+    bus = MessageBus(tracer=tracer)
+    seen = {}
+
+    def handler(envelope):
+        seen["headers"] = envelope.headers
+        seen["payload"] = json.loads(CodexClient._encode_request("r", CodexCommand(op="ping")))
+
+    bus.subscribe("topic", handler)
+
+    def publish(context):
+        bus.publish("topic", {})
+
+    engine = WorkflowEngine(tracer=tracer)
+    with tracer.span("request") as root:
+        asyncio.run(
+            engine.run(
+                [WorkflowNodeDefinition(id="node", run=publish)],
+                WorkflowContext(context_store=InMemoryContextStore()),
+            )
+        )
+    assert current_span_context() is None
+
+    spans = [
+        span
+        for line in path.read_text().splitlines()
+        for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+    by_name = {span["name"]: span for span in spans}
+    assert {span["traceId"] for span in spans} == {root.context.trace_id}
+    assert by_name["workflow.node"]["parentSpanId"] == root.context.span_id
+    assert by_name["bus.dispatch"]["parentSpanId"] == by_name["workflow.node"]["spanId"]
+    assert seen["headers"]["traceparent"].split("-")[2] == by_name["workflow.node"]["spanId"]
+    assert seen["payload"]["traceparent"].split("-")[2] == by_name["bus.dispatch"]["spanId"]
@@ -1,4 +1,8 @@
 import asyncio
+import json
+import time
+
+import pytest
 
 from codex_agent_protocol import (
     InMemoryContextStore,
@@ -6,7 +10,10 @@ from codex_agent_protocol import (
     WorkflowEngine,
     WorkflowExecutionOptions,
     WorkflowNodeDefinition,
+    WorkflowNodeTiming,
+    WorkflowRunSummary,
 )
+from codex_agent_protocol.profiling import slot_utilization
 
 
 def test_workflow_runs_in_order():
@@ -63,3 +70,459 @@ def test_workflow_rolls_back_on_failure():
     assert "task" in summary.failed
     assert rollback_called == ["run"]
 
+
+def test_workflow_starts_critical_path_first():
+    store = InMemoryContextStore()
+    engine = WorkflowEngine()
+    order: list[str] = []
+
+    def record(node_id: str):
+        def task(context: WorkflowContext) -> str:
+            order.append(node_id)
+            return node_id
+
+        return task
+
+    nodes = [
+        WorkflowNodeDefinition(id="short-1", run=record("short-1")),
+        WorkflowNodeDefinition(id="short-2", run=record("short-2")),
+        WorkflowNodeDefinition(id="chain-1", run=record("chain-1")),
+        WorkflowNodeDefinition(id="chain-2", run=record("chain-2"), depends_on=["chain-1"]),
+        WorkflowNodeDefinition(id="chain-3", run=record("chain-3"), depends_on=["chain-2"]),
+        WorkflowNodeDefinition(
+            id="urgent", run=record("urgent"), priority=1, estimated_cost_ms=1
+        ),
+    ]
+
+    summary = asyncio.run(engine.run(nodes=nodes, context=WorkflowContext(context_store=store)))
+
+    assert len(summary.completed) == 6
+    assert order[:2] == ["urgent", "chain-1"]
+
+
+def test_workflow_rejects_unknown_dependencies():
+    engine = WorkflowEngine()
+    nodes = [WorkflowNodeDefinition(id="a", run=lambda ctx: None, depends_on=["missing"])]
+
+    with pytest.raises(ValueError):
+        asyncio.run(
+            engine.run(nodes=nodes, context=WorkflowContext(context_store=InMemoryContextStore()))
+        )
+
+
+def test_workflow_cancels_siblings_and_enforces_timeouts():
+    store = InMemoryContextStore()
+    engine = WorkflowEngine()
+    attempts: list[str] = []
+
+    async def hang(context: WorkflowContext) -> None:
+        await asyncio.sleep(10)
+
+    async def slow(context: WorkflowContext) -> None:
+        attempts.append("slow")
+        await asyncio.sleep(10)
+
+    started = time.monotonic()
+    summary = asyncio.run(
+        engine.run(
+            nodes=[
+                WorkflowNodeDefinition(id="hang", run=hang),
+                WorkflowNodeDefinition(
+                    id="slow", run=slow, timeout_ms=20, retry={"attempts": 2}
+                ),
+            ],
+            context=WorkflowContext(context_store=store),
+            options=WorkflowExecutionOptions(concurrency=2),
+        )
+    )
+
+    assert time.monotonic() - started < 1
+    assert attempts == ["slow", "slow"]
+    assert isinstance(summary.failed["slow"], TimeoutError)
+    assert summary.cancelled == {"hang"}
+
+
+def test_workflow_run_deadline():
+    engine = WorkflowEngine()
+
+    async def hang(context: WorkflowContext) -> None:
+        await asyncio.sleep(10)
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=[WorkflowNodeDefinition(id="hang", run=hang)],
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(timeout_ms=20),
+        )
+    )
+
+    assert isinstance(summary.failed["hang"], TimeoutError)
+    assert summary.finished_at - summary.started_at < 1000
+
+
+def test_workflow_rolls_back_independent_branches_concurrently():
+    engine = WorkflowEngine()
+    events: list[str] = []
+
+    def complete(context: WorkflowContext) -> None:
+        return None
+
+    def undo(node_id: str):
+        async def rollback(context: WorkflowContext) -> None:
+            events.append(f"start:{node_id}")
+            await asyncio.sleep(0.01)
+            events.append(f"end:{node_id}")
+            if node_id == "right-leaf":
+                raise RuntimeError("cleanup failed")
+
+        return rollback
+
+    async def fail(context: WorkflowContext) -> None:
+        raise RuntimeError("boom")
+
+    nodes = [
+        WorkflowNodeDefinition(id="left-root", run=complete, rollback=undo("left-root")),
+        WorkflowNodeDefinition(
+            id="left-leaf", run=complete, rollback=undo("left-leaf"), depends_on=["left-root"]
+        ),
+        WorkflowNodeDefinition(id="right-leaf", run=complete, rollback=undo("right-leaf")),
+        WorkflowNodeDefinition(id="fail", run=fail, depends_on=["left-leaf", "right-leaf"]),
+    ]
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=nodes,
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(rollback_concurrency=2),
+        )
+    )
+
+    assert events.index("end:left-leaf") < events.index("start:left-root")
+    assert events.index("start:right-leaf") < events.index("end:left-leaf")
+    assert set(summary.rolled_back) == {"left-root", "left-leaf"}
+    assert isinstance(summary.rollback_failed["right-leaf"], RuntimeError)
+
+
+def test_workflow_enforces_resource_limits():
+    engine = WorkflowEngine()
+    active = {"codex": 0, "cheap": 0, "total": 0}
+    peaks = {"codex": 0, "cheap": 0, "total": 0}
+
+    def make_task(tag: str):
+        async def task(context: WorkflowContext) -> None:
+            for key in (tag, "total"):
+                active[key] += 1
+                peaks[key] = max(peaks[key], active[key])
+            await asyncio.sleep(0.01)
+            for key in (tag, "total"):
+                active[key] -= 1
+
+        return task
+
+    nodes = [
+        WorkflowNodeDefinition(id=f"codex-{i}", run=make_task("codex"), resources={"codex": 1})
+        for i in range(6)
+    ] + [
+        WorkflowNodeDefinition(id=f"cheap-{i}", run=make_task("cheap"), resources={"cpu": 1})
+        for i in range(6)
+    ]
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=nodes,
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(
+                concurrency=8, resource_limits={"codex": 2, "cpu": 8}
+            ),
+        )
+    )
+
+    assert len(summary.completed) == 12
+    assert peaks["codex"] == 2
+    assert peaks["total"] == 8
+
+
+def test_workflow_admits_lighter_nodes_past_parked_heavy_ones():
+    engine = WorkflowEngine()
+    started: list[str] = []
+
+    def make_task(node_id: str, delay: float):
+        async def task(context: WorkflowContext) -> None:
+            started.append(node_id)
+            await asyncio.sleep(delay)
+
+        return task
+
+    nodes = [
+        WorkflowNodeDefinition(
+            id="first", run=make_task("first", 0.05), resources={"codex": 1}, priority=3
+        ),
+        WorkflowNodeDefinition(
+            id="heavy", run=make_task("heavy", 0), resources={"codex": 2}, priority=2
+        ),
+        WorkflowNodeDefinition(
+            id="light", run=make_task("light", 0), resources={"codex": 1}, priority=1
+        ),
+    ]
+    summary = asyncio.run(
+        engine.run(
+            nodes=nodes,
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(concurrency=4, resource_limits={"codex": 2}),
+        )
+    )
+
+    assert len(summary.completed) == 3
+    assert started == ["first", "light", "heavy"]
+
+
+def test_workflow_fans_out_children_before_dependents():
+    engine = WorkflowEngine()
+    reviewed: list[str] = []
+
+    def review(path: str):
+        def task(context: WorkflowContext) -> None:
+            reviewed.append(path)
+
+        return task
+
+    def expand(paths: list[str]) -> list[WorkflowNodeDefinition]:
+        return [WorkflowNodeDefinition(id=f"review:{path}", run=review(path)) for path in paths]
+
+    nodes = [
+        WorkflowNodeDefinition(id="diff", run=lambda ctx: ["a.py", "b.py"], fan_out=expand),
+        WorkflowNodeDefinition(
+            id="report", run=lambda ctx: reviewed.append("report"), depends_on=["diff"]
+        ),
+    ]
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=nodes,
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(concurrency=2),
+        )
+    )
+
+    assert summary.completed == {"diff", "review:a.py", "review:b.py", "report"}
+    assert sorted(reviewed[:2]) == ["a.py", "b.py"]
+    assert reviewed[-1] == "report"
+
+
+def test_workflow_fails_fan_out_with_invalid_children_without_completing_it():
+    engine = WorkflowEngine()
+    rolled_back: list[str] = []
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=[
+                WorkflowNodeDefinition(
+                    id="diff",
+                    run=lambda ctx: None,
+                    fan_out=lambda result: [WorkflowNodeDefinition(id="diff", run=print)],
+                    rollback=lambda ctx: rolled_back.append("diff"),
+                ),
+            ],
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+        )
+    )
+
+    assert isinstance(summary.failed["diff"], ValueError)
+    assert summary.completed == set()
+    assert rolled_back == []
+
+
+def test_workflow_streams_items_with_backpressure():
+    engine = WorkflowEngine()
+    events: list[str] = []
+
+    async def produce(context: WorkflowContext):
+        for index in range(4):
+            events.append(f"put:{index}")
+            yield index
+
+    async def consume(context: WorkflowContext) -> int:
+        total = 0
+        async for item in context.streams["produce"]:
+            events.append(f"get:{item}")
+            total += item
+        return total
+
+    results: dict[str, object] = {}
+    summary = asyncio.run(
+        engine.run(
+            nodes=[
+                WorkflowNodeDefinition(id="produce", run=produce, stream_buffer=1),
+                WorkflowNodeDefinition(id="consume", run=consume, consumes=["produce"]),
+            ],
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(
+                on_task_complete=lambda node_id, result: results.update({node_id: result})
+            ),
+        )
+    )
+
+    assert summary.completed == {"produce", "consume"}
+    assert results == {"produce": 4, "consume": 6}
+    assert events.index("get:0") < events.index("put:3")
+
+
+def test_workflow_runs_consumer_dependencies_while_producer_is_blocked():
+    engine = WorkflowEngine()
+
+    def produce(context: WorkflowContext):
+        return iter(range(3))
+
+    async def consume(context: WorkflowContext) -> int:
+        return sum([item async for item in context.streams["produce"]])
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=[
+                WorkflowNodeDefinition(id="produce", run=produce, stream_buffer=1, priority=1),
+                WorkflowNodeDefinition(id="setup", run=lambda context: None),
+                WorkflowNodeDefinition(
+                    id="consume", run=consume, consumes=["produce"], depends_on=["setup"]
+                ),
+            ],
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(concurrency=1, timeout_ms=2000),
+        )
+    )
+
+    assert summary.completed == {"produce", "setup", "consume"}
+
+
+def test_workflow_detaches_streams_of_consumers_that_cannot_start():
+    engine = WorkflowEngine()
+
+    def fail(context: WorkflowContext) -> None:
+        raise RuntimeError("boom")
+
+    async def consume(context: WorkflowContext) -> int:
+        return sum([item async for item in context.streams["produce"]])
+
+    summary = asyncio.run(
+        asyncio.wait_for(
+            engine.run(
+                nodes=[
+                    WorkflowNodeDefinition(
+                        id="produce", run=lambda context: iter(range(5)), stream_buffer=1
+                    ),
+                    WorkflowNodeDefinition(id="fail", run=fail),
+                    WorkflowNodeDefinition(
+                        id="consume", run=consume, consumes=["produce"], depends_on=["fail"]
+                    ),
+                ],
+                context=WorkflowContext(context_store=InMemoryContextStore()),
+                options=WorkflowExecutionOptions(concurrency=2, fail_fast=False),
+            ),
+            5,
+        )
+    )
+
+    assert summary.completed == {"produce"}
+    assert set(summary.failed) == {"fail"}
+    assert summary.timings["consume"].started_at is None
+
+
+def test_workflow_rejects_or_fails_producers_holding_resources_their_consumers_need():
+    engine = WorkflowEngine()
+
+    async def consume(context: WorkflowContext) -> int:
+        (stream,) = context.streams.values()
+        return sum([item async for item in stream])
+
+    def graph(limit: int) -> list[WorkflowNodeDefinition]:
+        nodes = [
+            WorkflowNodeDefinition(
+                id="setup", run=lambda context: None, resources={"git": 1}, priority=-1
+            )
+        ]
+        for index in range(limit):
+            nodes += [
+                WorkflowNodeDefinition(
+                    id=f"produce{index}",
+                    run=lambda context: iter(range(5)),
+                    stream_buffer=1,
+                    resources={"git": 1},
+                ),
+                WorkflowNodeDefinition(
+                    id=f"consume{index}",
+                    run=consume,
+                    consumes=[f"produce{index}"],
+                    depends_on=["setup"],
+                ),
+            ]
+        return nodes
+
+    def run(limit: int):
+        return asyncio.run(
+            asyncio.wait_for(
+                engine.run(
+                    nodes=graph(limit),
+                    context=WorkflowContext(context_store=InMemoryContextStore()),
+                    options=WorkflowExecutionOptions(
+                        concurrency=3, resource_limits={"git": limit}
+                    ),
+                ),
+                5,
+            )
+        )
+
+    with pytest.raises(ValueError, match="holds resource git"):
+        run(1)
+
+    summary = run(2)
+    assert set(summary.failed) == {"produce0", "produce1"}
+    assert all(isinstance(error, RuntimeError) for error in summary.failed.values())
+    assert summary.timings["setup"].started_at is None
+
+
+def test_workflow_records_timings_and_writes_chrome_trace(tmp_path):
+    engine = WorkflowEngine()
+    failures = {"flaky": 1}
+
+    async def step(context: WorkflowContext) -> None:
+        await asyncio.sleep(0.005)
+
+    def flaky(context: WorkflowContext) -> None:
+        if failures["flaky"]:
+            failures["flaky"] -= 1
+            raise RuntimeError("transient")
+
+    summary = asyncio.run(
+        engine.run(
+            nodes=[
+                WorkflowNodeDefinition(id="a", run=step),
+                WorkflowNodeDefinition(id="b", run=step, depends_on=["a"]),
+                WorkflowNodeDefinition(
+                    id="flaky", run=flaky, retry={"attempts": 2, "delayMs": 1}
+                ),
+            ],
+            context=WorkflowContext(context_store=InMemoryContextStore()),
+            options=WorkflowExecutionOptions(concurrency=2, trace_dir=str(tmp_path)),
+        )
+    )
+
+    assert summary.critical_path == ["a", "b"]
+    assert summary.timings["flaky"].attempts == 2
+    assert summary.timings["flaky"].retry_sleep_ms == 1
+    assert 0 < summary.utilization <= 1
+    with open(summary.trace_path, encoding="utf-8") as handle:
+        trace = json.load(handle)
+    spans = {event["name"] for event in trace["traceEvents"] if event["ph"] == "X"}
+    assert spans == {"a", "b", "flaky"}
+
+
+def test_slot_utilization_ignores_rollback_and_unslotted_consumers():
+    summary = WorkflowRunSummary(started_at=0.0, finished_at=1000.0)
+    summary.timings["produce"] = WorkflowNodeTiming(started_at=0.0, finished_at=100.0)
+    summary.timings["consume"] = WorkflowNodeTiming(
+        started_at=0.0,
+        finished_at=100.0,
+        rollback_started_at=100.0,
+        rollback_finished_at=1000.0,
+    )
+
+    assert slot_utilization(summary, concurrency=1) == 1.0